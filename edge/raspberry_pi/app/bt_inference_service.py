@@ -1,19 +1,43 @@
 import os
 import sys
-import serial
 import time
 import json
+import logging
+import threading
 from collections import deque
-
-import numpy as np
-import joblib
+from time import perf_counter
 
 BASE_DIR = os.path.dirname(os.path.dirname(__file__))  # .../edge/raspberry_pi
 if BASE_DIR not in sys.path:
     sys.path.insert(0, BASE_DIR)
 
+from core.checkpoint import CHECKPOINT_SECONDS, MAX_AGE_SECONDS, Checkpointer
+from core.line_framer import LineFramer
+from core.log import get_logger, setup_logging
+from core.metrics import ServiceMetrics, start_metrics_server
+from core.model_manager import POLL_SECONDS, ModelManager
+from core.pipeline import BLOCK, StageQueue
+from core.settings import as_list, get_section, load_settings
+from core.startup import BackgroundLoader
+from core.telemetry_store import SYNC_SECONDS, TelemetryStore, gateway_dir
+from core.uploader import uploader_from_settings
+from core.telemetry import is_telemetry_line, parse_telemetry_bytes
+
+# NumPy (core.dose_model, core.rolling_window) and pyserial are imported where
+# they are first needed, so --fast-start can answer the gateway before they load.
+
 MODEL_DIR = os.path.join(BASE_DIR, "model")
 DOSE_DIR = os.path.join(MODEL_DIR, "dose")
+DOSE_MODEL_PATHS = (
+    os.path.join(DOSE_DIR, "rf_dose_regressor_prod.npz"),
+    os.path.join(DOSE_DIR, "rf_dose_regressor_prod.joblib"),
+)
+DOSE_FEATURES_PATH = os.path.join(DOSE_DIR, "rf_dose_features_prod.json")
+DOSE_STALE_SECONDS = 2.0  # .joblib this much newer than the .npz = compiled forest is stale
+TELEMETRY_DIR = os.path.join(BASE_DIR, "data", "telemetry")
+UPLOAD_QUEUE_PATH = os.path.join(BASE_DIR, "data", "uploader", "thingspeak_queue.sqlite3")
+CHECKPOINT_DIR = os.path.join(BASE_DIR, "data", "state")
+SHADOW_DIR = os.path.join(BASE_DIR, "data", "shadow")
 
 # Bluetooth SPP reader + telemetry parser + decision + (optional) dose inference.
 # It reads from /dev/rfcomm0 (ESP32 SPP), parses lines like:
@@ -22,18 +46,65 @@ DOSE_DIR = os.path.join(MODEL_DIR, "dose")
 # Production approach (robust + explainable):
 # - ON/OFF decision: rule-based gating with hysteresis (HIGH = dry, LOW = wet)
 # - Dose (seconds): RandomForest regressor (shadow mode until we enable actuation)
-#   (This file loads the joblib model + feature contract JSON directly.)
+#   (This file loads the compiled .npz forest, or the joblib model when there is
+#    no .npz or the .joblib is newer, plus the feature contract JSON directly.)
+#
+# The per-gateway control logic lives in GatewayController so the same code
+# drives this single-port loop and the asyncio multi-gateway service
+# (app/multi_gateway_service.py).
 
 PORT = "/dev/rfcomm0"
 BAUDRATE = 9600  # symbolic for SPP, required by pyserial
 TIMEOUT = 5.0  # seconds (avoid partial reads on slow/fragmented SPP delivery)
 
+# --- Rule-based ON/OFF gating with hysteresis (data-driven thresholds) ---
+# Confirmed by real watering test: higher raw readings mean drier soil.
+# We gate on soil_avg to avoid uneven wetting between sensors.
+# Thresholds derived from your real pump dataset around irrigation events:
+# - DRY ~ 75th percentile of soil_avg during the 60 minutes before irrigation
+# - WET ~ conservative stop threshold (hysteresis) so we don't flap
+SOIL_AVG_DRY = 500.0
+SOIL_AVG_WET = 460.0
+
+SIMULATE_DRY = False
+SIM_DRY_VALUE = 530.0
+
+# --- Rolling window for dose features (PRE window) ---
+# The production dose model expects 29 features built from a PRE window.
+# We use the last PRE_N samples to compute mean/std/min/max.
+SAMPLE_MINUTES = 3
+PRE_MINUTES = 30
+PRE_N = PRE_MINUTES // SAMPLE_MINUTES  # 10
+
+ALLOWED_SECONDS = [8.0, 14.0, 18.0, 24.0]
+
+# Set to False if you want to disable actuation path while keeping inference running.
+SEND_COMMANDS = True
+
+# --- Single-port pipeline (see SerialPipeline) ---
+# Reader thread -> RX_QUEUE_LINES framed lines -> inference worker ->
+# TX_QUEUE_COMMANDS commands -> TX thread. PIPELINED = False runs the
+# original single-threaded read/handle/write loop.
+PIPELINED = True
+READ_SIZE = 256
+RX_QUEUE_LINES = 1024
+RX_QUEUE_POLICY = BLOCK
+TX_QUEUE_COMMANDS = 64
+TX_QUEUE_POLICY = BLOCK
+
+# Per-sample tracing ([BT], [PARSED]) is DEBUG; decisions, dose and TX are INFO.
+# Output goes through core.log's background writer (see setup_logging in main).
+log = get_logger("service")
+
 
 def parse_telemetry(line: str):
     """
     Parse a telemetry line like:
       S1:802.0,S2:822.0,T:21.7,H:69.6,L:202
     into a dictionary with numeric values.
+
+    String-level parser kept for tooling and old callers; the service itself
+    uses core.telemetry.parse_telemetry_bytes on raw framed bytes.
     """
     parts = line.split(",")
     data = {}
@@ -58,13 +129,44 @@ def parse_telemetry(line: str):
     return data
 
 
-def main():
-    print("[INFO] Opening Bluetooth serial port:", PORT)
+def snap_seconds(x, allowed):
+    return float(min(allowed, key=lambda a: abs(a - x)))
 
-    dose_model_path = os.path.join(DOSE_DIR, "rf_dose_regressor_prod.joblib")
-    dose_features_path = os.path.join(DOSE_DIR, "rf_dose_features_prod.json")
 
-    dose_model = joblib.load(dose_model_path)
+def pick_dose_model_path(paths=DOSE_MODEL_PATHS) -> str:
+    """
+    Prefer the compiled forest (NumPy only, no scikit-learn import); fall back
+    to the joblib pickle if it has not been exported yet, or if the pickle is
+    newer (export_rpi_compatible_dose_model.py only writes the .joblib, so the
+    .npz would be a stale model and a hot swap would reload the old forest).
+    Files written together (git checkout, a copied model directory) are within
+    DOSE_STALE_SECONDS of each other and keep the compiled forest.
+    """
+    compiled_path, joblib_path = paths
+    if not os.path.exists(compiled_path):
+        return joblib_path
+    try:
+        stale = os.stat(joblib_path).st_mtime - os.stat(compiled_path).st_mtime > DOSE_STALE_SECONDS
+    except OSError:
+        return compiled_path
+    if stale:
+        log.warning(
+            "[DOSE] %s is newer than %s; loading the joblib model "
+            "(re-run scripts/export_compiled_dose_model.py to refresh the compiled forest)",
+            os.path.basename(joblib_path), os.path.basename(compiled_path),
+        )
+        return joblib_path
+    return compiled_path
+
+
+def load_dose_artifacts():
+    """Load the production dose model and its feature contract."""
+    from core.dose_model import load_dose_model
+
+    dose_model_path = pick_dose_model_path()
+    dose_features_path = DOSE_FEATURES_PATH
+
+    dose_model = load_dose_model(dose_model_path)
 
     with open(dose_features_path, "r", encoding="utf-8") as f:
         dose_features_obj = json.load(f)
@@ -76,227 +178,670 @@ def main():
         # Backward compatibility: allow a plain list of feature names
         dose_feature_names = dose_features_obj
 
-    allowed_seconds = [8.0, 14.0, 18.0, 24.0]
+    log.info("[DOSE] Dose model loaded (shadow mode): %s", os.path.basename(dose_model_path))
+    log.info("[DOSE] Features contract: %d features", len(dose_feature_names))
 
-    print("[DOSE] Dose model loaded (shadow mode)")
-    print(f"[DOSE] Features contract: {len(dose_feature_names)} features")
+    return dose_model, dose_feature_names
 
-    # --- Rule-based ON/OFF gating with hysteresis (data-driven thresholds) ---
-    # Confirmed by real watering test: higher raw readings mean drier soil.
-    # We gate on soil_avg to avoid uneven wetting between sensors.
-    # Thresholds derived from your real pump dataset around irrigation events:
-    # - DRY ~ 75th percentile of soil_avg during the 60 minutes before irrigation
-    # - WET ~ conservative stop threshold (hysteresis) so we don't flap
-    SOIL_AVG_DRY = 500.0
-    SOIL_AVG_WET = 460.0
 
-    SIMULATE_DRY = False
-    SIM_DRY_VALUE = 530.0
+# Golden input for reloaded dose models: a PRE window just past the DRY
+# threshold (what the service sees when watering starts). A candidate must
+# accept the feature contract and give a finite dose in [0, MAX_DOSE_SECONDS].
+GOLDEN_PRE_WINDOW = tuple(
+    (s1, s2, 0.5 * (s1 + s2), abs(s1 - s2), 20.0 + 0.1 * i, 60.0 - 0.5 * i)
+    for i, (s1, s2) in enumerate(zip(range(480, 500, 2), range(515, 535, 2)))
+)
+MAX_DOSE_SECONDS = 120.0
 
-    watering_state = False
 
-    # --- Rolling window for dose features (PRE window) ---
-    # The production dose model expects 29 features built from a PRE window.
-    # We use the last PRE_N samples to compute mean/std/min/max.
-    SAMPLE_MINUTES = 3
-    PRE_MINUTES = 30
-    PRE_N = PRE_MINUTES // SAMPLE_MINUTES  # 10
+def validate_dose_artifacts(artifacts):
+    """Check a (dose_model, feature_names) pair before it goes live; returns a short summary."""
+    import math
 
-    window = deque(
-        maxlen=PRE_N
-    )  # each item: dict with s1,s2,soil_avg,soil_diff,temp,hum
+    from core.rolling_window import RollingWindow
 
-    ser = None
-    rx_buffer = ""
-
-    def _stats(values):
-        arr = np.asarray(values, dtype=float)
-        return (
-            float(arr.mean()),
-            float(arr.std(ddof=0)),
-            float(arr.min()),
-            float(arr.max()),
+    dose_model, names = artifacts
+    window = RollingWindow(PRE_N, names)  # unsupported feature names -> ValueError
+
+    n_in = getattr(dose_model, "n_features_in_", None)
+    if n_in is not None and int(n_in) != len(names):
+        raise ValueError(f"model expects {n_in} features, contract lists {len(names)}")
+    model_names = getattr(dose_model, "feature_names", None)
+    if model_names is None:
+        model_names = getattr(dose_model, "feature_names_in_", None)
+    if model_names is not None and list(model_names) != list(names):
+        raise ValueError("model feature order does not match the features contract")
+
+    for sample in GOLDEN_PRE_WINDOW:
+        window.append(*sample)
+    pred = float(dose_model.predict(window.features())[0])
+    if not math.isfinite(pred) or not 0.0 <= pred <= MAX_DOSE_SECONDS:
+        raise ValueError(f"golden input predicted {pred!r} s")
+    return f"golden input -> {pred:.2f} s"
+
+
+class GatewayController:
+    """
+    Control state for one ESP32 gateway: hysteresis gate, PRE window and
+    dose inference. Feed it complete lines; it returns the `CMD:` reply
+    to send back on the same link (or None when the line is skipped).
+    """
+
+    def __init__(
+        self,
+        dose_model=None,
+        dose_feature_names=None,
+        name: str = "",
+        profiler=None,
+        dose_loader=None,
+        store=None,
+        uploader=None,
+        checkpointer=None,
+        model_manager=None,
+        shadow=None,
+    ):
+        self.name = name
+        self.dose_model = None
+        self.window = None
+        self.watering_state = False
+
+        # core.prediction_cache.PredictionCache in front of the dose model
+        # (created with the first model); _episode holds its (hits, misses)
+        # when the current watering episode started.
+        self.dose_cache = None
+        self._episode = (0, 0)
+
+        # Optional per-stage timing sink: anything with record(stage, seconds)
+        # (e.g. core.stage_timer.StageRecorder). None = no timing overhead.
+        self.profiler = profiler
+
+        # Fast start: the dose model arrives later from a BackgroundLoader.
+        # Samples seen meanwhile are kept (last PRE_N) and replayed into the
+        # window once it exists, so the PRE window is not delayed.
+        self._dose_loader = dose_loader
+        self._pending = deque(maxlen=PRE_N)
+
+        # Optional core.telemetry_store.TelemetryStore: every parsed sample
+        # with the decision and the seconds sent is appended to it.
+        self.store = store
+        # Optional core.uploader.ThingSpeakUploader (non-blocking submit).
+        self.uploader = uploader
+
+        # Optional core.checkpoint.Checkpointer: hysteresis state, PRE window
+        # and last command survive restarts (restored here when recent enough).
+        self.checkpointer = checkpointer
+        self.last_cmd = None
+        self._checkpoint_now = False
+
+        # Optional core.model_manager.ModelManager publishing validated dose
+        # model reloads; switched to between two samples (see _poll_models).
+        # _previous_dose is kept to roll back if the new model fails live.
+        self.model_manager = model_manager
+        self._model_generation = 0
+        self._previous_dose = None
+
+        # Optional core.shadow.ShadowEvaluator: candidate models get every
+        # sample on a worker pool; the command sent never depends on them.
+        self.shadow = shadow
+        if shadow is not None and shadow.profiler is None:
+            shadow.profiler = profiler
+
+        # Multi-gateway mode tags every log line with the port it came from.
+        self.log = get_logger("gateway", gateway=name)
+
+        if dose_model is not None:
+            self.attach_dose(dose_model, dose_feature_names)
+
+        if checkpointer is not None:
+            state = checkpointer.load()
+            if state is not None:
+                self.restore_state(state)
+
+    def attach_dose(self, dose_model, dose_feature_names):
+        from core.prediction_cache import PredictionCache
+        from core.rolling_window import RollingWindow
+
+        self.dose_model = dose_model
+        if self.dose_cache is None:
+            self.dose_cache = PredictionCache()
+        else:
+            self.dose_cache.invalidate()
+        # Preallocated ring buffers with running sums + monotonic min/max queues:
+        # O(1) per sample, and the feature row comes out in contract order.
+        self.window = RollingWindow(PRE_N, dose_feature_names)
+        for sample in self._pending:
+            self.window.append(*sample)
+        self._pending.clear()
+
+    def _poll_dose_loader(self):
+        loader = self._dose_loader
+        if loader is None or not loader.done():
+            return
+        self._dose_loader = None
+        try:
+            dose_model, dose_feature_names = loader.result()
+        except Exception as e:
+            self.log.error("[ERROR] Dose model failed to load, dose stays at 0 s: %s", e)
+            return
+        self.attach_dose(dose_model, dose_feature_names)
+        self.log.info(
+            "[DOSE] Dose model ready after %.2f s (%d buffered samples)",
+            loader.seconds,
+            len(self.window),
+        )
+
+    def swap_dose(self, dose_model, dose_feature_names):
+        """Switch to another dose model, keeping the PRE window samples."""
+        from core.rolling_window import RollingWindow
+
+        if self.window is None:
+            self.attach_dose(dose_model, dose_feature_names)
+            return
+        if list(dose_feature_names) != self.window.feature_names:
+            window = RollingWindow(PRE_N, dose_feature_names)
+            window.restore(self.window.snapshot())
+            self.window = window
+        self.dose_model = dose_model  # the prediction cache drops entries on model change
+
+    def _poll_models(self):
+        mgr = self.model_manager
+        generation, artifacts = mgr.current()
+        self._model_generation = generation
+        if artifacts is None:
+            return
+        if self.window is None:
+            # Fast start still loading the startup model: the reload supersedes it.
+            self._dose_loader = None
+        else:
+            self._previous_dose = (self.dose_model, self.window.feature_names)
+        self.swap_dose(*artifacts)
+        self.log.info(
+            "[MODEL] Dose model generation %d active (PRE window %d/%d kept)",
+            generation,
+            len(self.window),
+            PRE_N,
         )
 
-    def build_dose_features(win, at_event):
-        """Build the 29-feature dict expected by rf_dose_features_prod.json."""
-        # Extract series
-        s1s = [r["soil1"] for r in win]
-        s2s = [r["soil2"] for r in win]
-        avgs = [r["soil_avg"] for r in win]
-        diffs = [r["soil_diff"] for r in win]
-        temps = [r["temperature"] for r in win]
-        hums = [r["humidity"] for r in win]
-
-        s1_mean, s1_std, s1_min, s1_max = _stats(s1s)
-        s2_mean, s2_std, s2_min, s2_max = _stats(s2s)
-        avg_mean, avg_std, avg_min, avg_max = _stats(avgs)
-        diff_mean, diff_std, diff_min, diff_max = _stats(diffs)
-        t_mean, t_std, t_min, t_max = _stats(temps)
-        h_mean, h_std, h_min, h_max = _stats(hums)
-
-        feats = {
-            "soil1_pre_mean": s1_mean,
-            "soil1_pre_std": s1_std,
-            "soil1_pre_min": s1_min,
-            "soil1_pre_max": s1_max,
-            "soil2_pre_mean": s2_mean,
-            "soil2_pre_std": s2_std,
-            "soil2_pre_min": s2_min,
-            "soil2_pre_max": s2_max,
-            "soil_avg_pre_mean": avg_mean,
-            "soil_avg_pre_std": avg_std,
-            "soil_avg_pre_min": avg_min,
-            "soil_avg_pre_max": avg_max,
-            "soil_diff_pre_mean": diff_mean,
-            "soil_diff_pre_std": diff_std,
-            "soil_diff_pre_min": diff_min,
-            "soil_diff_pre_max": diff_max,
-            "temperature_pre_mean": t_mean,
-            "temperature_pre_std": t_std,
-            "temperature_pre_min": t_min,
-            "temperature_pre_max": t_max,
-            "humidity_pre_mean": h_mean,
-            "humidity_pre_std": h_std,
-            "humidity_pre_min": h_min,
-            "humidity_pre_max": h_max,
-            "delta_soil_avg_min_vs_pre_mean": float(avg_min - avg_mean),
-            "soil_avg_at_event": float(at_event["soil_avg"]),
-            "soil_diff_at_event": float(at_event["soil_diff"]),
-            "temp_at_event": float(at_event["temperature"]),
-            "humidity_at_event": float(at_event["humidity"]),
+    def _rollback_dose(self, error):
+        model, names = self._previous_dose
+        self._previous_dose = None
+        self.log.error("[MODEL] New dose model failed (%s: %s), rolled back", type(error).__name__, error)
+        self.swap_dose(model, names)
+
+    def checkpoint_state(self) -> dict:
+        samples = self.window.snapshot() if self.window is not None else list(self._pending)
+        return {
+            "gateway": self.name,
+            "watering_state": self.watering_state,
+            "last_cmd": self.last_cmd,
+            "samples": samples,
         }
-        return feats
 
-    def snap_seconds(x, allowed):
-        return float(min(allowed, key=lambda a: abs(a - x)))
+    def restore_state(self, state: dict):
+        """Apply a checkpoint_state() dict (warm restart)."""
+        try:
+            samples = [tuple(float(x) for x in sample) for sample in state.get("samples") or []]
+            if any(len(sample) != 6 for sample in samples):  # core.rolling_window.CHANNELS
+                raise ValueError("bad sample size")
+        except (TypeError, ValueError) as e:
+            self.log.warning("[WARN] Ignoring checkpoint with invalid PRE window: %s", e)
+            return
+
+        samples = samples[-PRE_N:]
+        if self.window is not None:
+            self.window.restore(samples)
+        else:
+            self._pending.clear()
+            self._pending.extend(samples)
+        self.watering_state = bool(state.get("watering_state"))
+        self.last_cmd = state.get("last_cmd")
+        if self.watering_state:
+            self._start_episode()
+
+        self.log.info(
+            "[STATE] Restored checkpoint from %.0f s ago: %s, PRE window %d/%d, last %s",
+            state.get("age", 0.0),
+            "WATER_ON" if self.watering_state else "WATER_OFF",
+            len(samples),
+            PRE_N,
+            self.last_cmd,
+        )
+
+    def maybe_checkpoint(self, force: bool = False):
+        """Save the checkpoint after an ON/OFF transition, every interval, or when forced."""
+        cp = self.checkpointer
+        if cp is None or not (force or self._checkpoint_now or cp.due()):
+            return
+        self._checkpoint_now = False
+
+        prof = self.profiler
+        if prof is not None:
+            t0 = perf_counter()
+        cp.save(self.checkpoint_state())
+        if prof is not None:
+            prof.record("checkpoint", perf_counter() - t0)
+
+    def _start_episode(self):
+        cache = self.dose_cache
+        self._episode = (cache.hits, cache.misses) if cache is not None else (0, 0)
+
+    def _end_episode(self):
+        cache = self.dose_cache
+        if cache is None:
+            return
+        hits = cache.hits - self._episode[0]
+        misses = cache.misses - self._episode[1]
+        if hits + misses:
+            self.log.info(
+                "[DOSE] Watering episode over: %d predictions, %d served from cache",
+                hits + misses,
+                hits,
+                extra={"fields": {"dose_predictions": hits + misses, "dose_cache_hits": hits}},
+            )
+
+    def handle_line(self, line):
+        """
+        Process one line without its trailing newline: bytes/bytearray/memoryview
+        straight from the LineFramer, or str.
+        """
+        if isinstance(line, str):
+            line = line.encode("utf-8", errors="replace")
+
+        prof = self.profiler
+        if prof is not None:
+            t0 = perf_counter()
+
+        data = parse_telemetry_bytes(line)
+
+        if prof is not None:
+            prof.record("parse", perf_counter() - t0)
+
+        if data is None:
+            text = bytes(line).decode("utf-8", errors="replace").strip().strip("\r")
+            if not text:
+                if prof is not None:
+                    prof.count("line_empty")
+                return None
+
+            # Optional hard filter: ignore any non-telemetry lines
+            # Telemetry must contain S1: and S2: at minimum.
+            if not is_telemetry_line(line):
+                if prof is not None:
+                    prof.count("line_non_telemetry")
+                self.log.warning("[WARN] Non-telemetry line, skipping: raw=%r", text)
+                return None
+
+            if prof is not None:
+                prof.count("line_partial")
+            self.log.debug("[BT] Raw line: %r", text)
+            self.log.warning("[WARN] Incomplete telemetry, skipping: raw=%r", text)
+            return None
+
+        if prof is not None:
+            prof.count("line_telemetry")
+
+        if self.log.isEnabledFor(logging.DEBUG):
+            text = bytes(line).decode("utf-8", errors="replace").strip().strip("\r")
+            self.log.debug("[BT] Raw line: %r", text)
+            self.log.debug(
+                "[PARSED] S1=%.1f, S2=%.1f, T=%.1f°C, H=%.1f%%, L=%.0f",
+                data.s1,
+                data.s2,
+                data.temperature,
+                data.humidity,
+                data.light,
+            )
+
+        # --- Decision (ON/OFF) ---
+        if prof is not None:
+            t0 = perf_counter()
+
+        s1 = data.s1
+        s2 = data.s2
+        soil_avg = 0.5 * (s1 + s2)
+        soil_diff = abs(s1 - s2)
+
+        soil_avg_for_decision = SIM_DRY_VALUE if SIMULATE_DRY else soil_avg
+
+        if not self.watering_state:
+            # Start watering if average soil reading is dry enough
+            if soil_avg_for_decision >= SOIL_AVG_DRY:
+                self.watering_state = True
+                self._checkpoint_now = True
+                self._start_episode()
+        else:
+            # Stop watering only when the soil is wet enough
+            if soil_avg_for_decision <= SOIL_AVG_WET:
+                self.watering_state = False
+                self._checkpoint_now = True
+                self._end_episode()
+
+        decision = "WATER_ON" if self.watering_state else "WATER_OFF"
+
+        if prof is not None:
+            prof.record("decision", perf_counter() - t0)
+
+        if SIMULATE_DRY:
+            self.log.info(
+                "[DECISION] %s (rule-based, soil_avg=%.1f, used=%.1f)",
+                decision,
+                soil_avg,
+                soil_avg_for_decision,
+                extra={"fields": {"decision": decision, "soil_avg": soil_avg}},
+            )
+        else:
+            self.log.info(
+                "[DECISION] %s (rule-based, soil_avg=%.1f)",
+                decision,
+                soil_avg,
+                extra={"fields": {"decision": decision, "soil_avg": soil_avg}},
+            )
+
+        # Update rolling window (always)
+        if prof is not None:
+            t0 = perf_counter()
+
+        mgr = self.model_manager
+        if mgr is not None and mgr.generation != self._model_generation:
+            self._poll_models()
+        if self.window is None:
+            self._poll_dose_loader()
+
+        sample = (s1, s2, soil_avg, soil_diff, data.temperature, data.humidity)
+        if self.window is not None:
+            self.window.append(*sample)
+        else:
+            self._pending.append(sample)
+
+        if prof is not None and decision != "WATER_ON":
+            prof.record("dose_features", perf_counter() - t0)
+
+        # --- Dose (shadow mode) ---
+        sec = 0.0
+        row = None  # the PRE-window feature row, when the dose was predicted
+        if decision == "WATER_ON":
+            if self.window is None:
+                if prof is not None:
+                    prof.record("dose_features", perf_counter() - t0)
+                self.log.info("[DOSE] Dose model still loading, sending SEC:0")
+            elif len(self.window) < PRE_N:
+                if prof is not None:
+                    prof.record("dose_features", perf_counter() - t0)
+                self.log.info(
+                    "[DOSE] Not enough samples yet for PRE window: %d/%d", len(self.window), PRE_N
+                )
+            else:
+                # Newest sample doubles as the at-event snapshot
+                X = self.window.features()
+
+                if prof is not None:
+                    t1 = perf_counter()
+                    prof.record("dose_features", t1 - t0)
+
+                cache = self.dose_cache
+                hits = cache.hits
+                try:
+                    pred_cont = cache.predict(self.dose_model, X)
+                except Exception as e:
+                    if self._previous_dose is None:
+                        raise
+                    self._rollback_dose(e)
+                    X = self.window.features()
+                    pred_cont = cache.predict(self.dose_model, X)
+                pred_snap = snap_seconds(pred_cont, ALLOWED_SECONDS)
+                sec = pred_snap
+                row = X
+
+                if prof is not None:
+                    prof.record("predict", perf_counter() - t1)
+                    prof.count("dose_predictions")
+                    prof.count("dose_cache_hits" if cache.hits != hits else "dose_cache_misses")
+
+                self.log.info(
+                    "[DOSE] Predicted=%.3fs -> snapped=%.1fs",
+                    pred_cont,
+                    pred_snap,
+                    extra={"fields": {"dose_pred": pred_cont, "dose_sec": pred_snap}},
+                )
+
+        # --- Shadow evaluation (off the critical path) ---
+        if self.shadow is not None:
+            X = names = None
+            if self.watering_state and self.shadow.wants_features and self.window is not None and self.window.is_full:
+                if row is None:
+                    row = self.window.features()
+                X = row.copy()  # the row buffer is reused by the window
+                names = self.window.feature_names
+            self.shadow.submit(
+                time.time(),
+                (s1, s2, data.temperature, data.humidity, data.light),
+                self.watering_state,
+                int(sec),
+                X,
+                names,
+            )
+
+        # --- On-device history ---
+        if self.store is not None:
+            if prof is not None:
+                t0 = perf_counter()
+            try:
+                self.store.append(
+                    time.time(),
+                    s1,
+                    s2,
+                    data.temperature,
+                    data.humidity,
+                    data.light,
+                    self.watering_state,
+                    int(sec),
+                )
+            except (OSError, RuntimeError, ValueError) as e:
+                # History is best effort: never let it stop the control loop.
+                self.log.error("[ERROR] Telemetry store disabled: %s", e)
+                self.store = None
+            if prof is not None:
+                prof.record("store", perf_counter() - t0)
+
+        if self.uploader is not None:
+            self.uploader.submit(
+                time.time(),
+                s1,
+                s2,
+                data.temperature,
+                data.humidity,
+                data.light,
+                self.watering_state,
+                int(sec),
+            )
+
+        # --- Command back to ESP32/Arduino ---
+        if prof is not None:
+            prof.count(f"cmd_{decision}")
+        self.last_cmd = f"CMD:{decision};SEC:{int(sec)}"
+        return self.last_cmd + "\n"
+
+
+def send_command(ser, cmd: str, profiler=None):
+    if SEND_COMMANDS and ser is not None and ser.is_open:
+        try:
+            if profiler is not None:
+                t0 = perf_counter()
+            ser.write(cmd.encode("utf-8"))
+            ser.flush()
+            if profiler is not None:
+                profiler.record("tx", perf_counter() - t0)
+            log.info("[TX] %s", cmd.strip())
+        except Exception as tx_err:
+            if profiler is not None:
+                profiler.count("tx_errors")
+            log.warning("[WARN] TX failed, command not sent: %s", tx_err)
+    else:
+        log.info("[TX-DISABLED] %s", cmd.strip())
+
+
+def open_telemetry_store(settings: dict, gateway: str = ""):
+    """
+    TelemetryStore from the `telemetry_store:` section of settings.yaml
+    (dir, enabled, sync_seconds). Returns None when disabled or unavailable.
+    """
+    cfg = (settings or {}).get("telemetry_store") or {}
+    if cfg.get("enabled") is False:
+        return None
+    root = cfg.get("dir") or TELEMETRY_DIR
+    sync_seconds = cfg.get("sync_seconds")
+    try:
+        store = TelemetryStore(
+            root, gateway, sync_seconds=float(sync_seconds) if sync_seconds is not None else SYNC_SECONDS
+        )
+    except OSError as e:
+        log.warning("[WARN] Telemetry store disabled (%s): %s", root, e)
+        return None
+    log.info("[INFO] Telemetry store: %s", store.dir)
+    return store
 
-    while True:
+
+def open_checkpointer(settings: dict, gateway: str = ""):
+    """
+    Checkpointer from the `checkpoint:` section of settings.yaml (dir, enabled,
+    interval, max_age), one state file per gateway. None when disabled.
+    """
+    cfg = (settings or {}).get("checkpoint") or {}
+    if cfg.get("enabled") is False:
+        return None
+    path = gateway_dir(cfg.get("dir") or CHECKPOINT_DIR, gateway) + ".json"
+    interval = cfg.get("interval")
+    max_age = cfg.get("max_age")
+    return Checkpointer(
+        path,
+        interval=float(interval) if interval is not None else CHECKPOINT_SECONDS,
+        max_age=float(max_age) if max_age is not None else MAX_AGE_SECONDS,
+    )
+
+
+def open_shadow(settings: dict, gateway: str = ""):
+    """
+    ShadowEvaluator from the `shadow:` section of settings.yaml (models,
+    workers, max_pending, dir). None when no candidate models are configured.
+    """
+    from core.shadow import MAX_PENDING, WORKERS, ShadowEvaluator
+
+    cfg = (settings or {}).get("shadow") or {}
+    specs = as_list(cfg.get("models"))
+    if not specs or cfg.get("enabled") is False:
+        return None
+    workers = cfg.get("workers")
+    max_pending = cfg.get("max_pending")
+    log.info("[INFO] Shadow evaluation: %s", ", ".join(specs))
+    return ShadowEvaluator(
+        specs,
+        cfg.get("dir") or SHADOW_DIR,
+        gateway,
+        workers=int(workers) if workers is not None else WORKERS,
+        max_pending=int(max_pending) if max_pending is not None else MAX_PENDING,
+    )
+
+
+def model_manager_from_settings(settings: dict):
+    """
+    ModelManager for the dose artefacts from the `model_reload:` section of
+    settings.yaml (enabled, poll_seconds). Not started; None when disabled.
+    """
+    cfg = (settings or {}).get("model_reload") or {}
+    if cfg.get("enabled") is False:
+        return None
+    poll = cfg.get("poll_seconds")
+    return ModelManager(
+        DOSE_MODEL_PATHS + (DOSE_FEATURES_PATH,),
+        load_dose_artifacts,
+        validate_dose_artifacts,
+        poll_seconds=float(poll) if poll is not None else POLL_SECONDS,
+        name="dose model",
+    )
+
+
+def pipeline_from_settings(settings: dict) -> dict:
+    """
+    run() keyword arguments from the `pipeline:` section of settings.yaml
+    (enabled, rx_queue, tx_queue, rx_policy); unset keys keep the defaults.
+    """
+    cfg = (settings or {}).get("pipeline") or {}
+    opts = {}
+    if cfg.get("enabled") is False:
+        opts["pipelined"] = False
+    if cfg.get("rx_queue") is not None:
+        opts["rx_queue"] = int(cfg["rx_queue"])
+    if cfg.get("tx_queue") is not None:
+        opts["tx_queue"] = int(cfg["tx_queue"])
+    if cfg.get("rx_policy"):
+        opts["rx_policy"] = str(cfg["rx_policy"])
+    return opts
+
+
+def start_dose_loader(startup=None) -> BackgroundLoader:
+    """Load NumPy + the dose artifacts on a background thread (fast start)."""
+    on_done = (lambda: startup.mark("dose_ready")) if startup is not None else None
+    return BackgroundLoader(load_dose_artifacts, name="dose-loader", on_done=on_done)
+
+
+def _run_inline(controller, port: str, timeout: float, stop_event=None, startup=None):
+    """Single-threaded loop: read, frame, handle and write on the caller's thread."""
+    import serial
+
+    profiler = controller.profiler
+    ser = None
+    framer = LineFramer()
+    dropped_seen = 0
+
+    while stop_event is None or not stop_event.is_set():
         try:
             if ser is None or not ser.is_open:
-                print("[INFO] Connecting to Bluetooth serial...")
-                ser = serial.Serial(PORT, BAUDRATE, timeout=TIMEOUT)
+                log.info("[INFO] Connecting to Bluetooth serial...")
+                ser = serial.Serial(port, BAUDRATE, timeout=timeout)
+                if startup is not None:
+                    startup.mark("serial_open")
                 time.sleep(1)
 
             # Read chunks and reconstruct full lines. Bluetooth SPP can fragment messages.
-            chunk = ser.read(256)
+            chunk = ser.read(READ_SIZE)
             if not chunk:
                 time.sleep(0.1)
                 continue
 
-            rx_buffer += chunk.decode("utf-8", errors="replace")
+            if profiler is not None:
+                t_chunk = perf_counter()
+                busy = 0.0
 
             # Process all complete lines currently in the buffer
-            while "\n" in rx_buffer:
-                line, rx_buffer = rx_buffer.split("\n", 1)
-                text = line.strip().strip("\r")
-                if not text:
-                    continue
+            for line in framer.feed(chunk):
+                if profiler is not None:
+                    t0 = perf_counter()
 
-                # Optional hard filter: ignore any non-telemetry lines
-                # Telemetry must contain S1: and S2: at minimum.
-                if "S1:" not in text or "S2:" not in text:
-                    print(f"[WARN] Non-telemetry line, skipping: raw={text!r}")
-                    continue
+                cmd = controller.handle_line(line)
+                if cmd is not None:
+                    send_command(ser, cmd, profiler)
+                    if startup is not None:
+                        startup.mark("first_reply")
+                        startup.report()
+                        startup = None
 
-                print(f"[BT] Raw line: {text!r}")
+                if profiler is not None:
+                    busy += perf_counter() - t0
 
-                data = parse_telemetry(text)
-                if data is None:
-                    print(f"[WARN] Incomplete telemetry, skipping: raw={text!r}")
-                    continue
+            if profiler is not None:
+                # Framing = time spent in the framer itself, per read chunk
+                profiler.record("framing", perf_counter() - t_chunk - busy)
+                if framer.dropped_bytes != dropped_seen:
+                    profiler.count("dropped_bytes", framer.dropped_bytes - dropped_seen)
+                    dropped_seen = framer.dropped_bytes
 
-                print(
-                    "[PARSED] "
-                    f"S1={data['S1']:.1f}, "
-                    f"S2={data['S2']:.1f}, "
-                    f"T={data['T']:.1f}°C, "
-                    f"H={data['H']:.1f}%, "
-                    f"L={data['L']:.0f}"
-                )
-
-                # --- Decision (ON/OFF) ---
-                s1 = float(data["S1"])
-                s2 = float(data["S2"])
-                soil_avg = 0.5 * (s1 + s2)
-                soil_diff = abs(s1 - s2)
-
-                soil_avg_for_decision = SIM_DRY_VALUE if SIMULATE_DRY else soil_avg
-
-                if not watering_state:
-                    # Start watering if average soil reading is dry enough
-                    if soil_avg_for_decision >= SOIL_AVG_DRY:
-                        watering_state = True
-                else:
-                    # Stop watering only when the soil is wet enough
-                    if soil_avg_for_decision <= SOIL_AVG_WET:
-                        watering_state = False
-
-                decision = "WATER_ON" if watering_state else "WATER_OFF"
-                if SIMULATE_DRY:
-                    print(
-                        f"[DECISION] {decision} (rule-based, soil_avg={soil_avg:.1f}, used={soil_avg_for_decision:.1f})"
-                    )
-                else:
-                    print(
-                        f"[DECISION] {decision} (rule-based, soil_avg={soil_avg:.1f})"
-                    )
-                # Update rolling window (always)
-                window.append(
-                    {
-                        "soil1": s1,
-                        "soil2": s2,
-                        "soil_avg": soil_avg,
-                        "soil_diff": soil_diff,
-                        "temperature": float(data["T"]),
-                        "humidity": float(data["H"]),
-                    }
-                )
-
-                # --- Dose (shadow mode) ---
-                sec = 0.0
-                if decision == "WATER_ON":
-                    if len(window) < PRE_N:
-                        print(
-                            f"[DOSE] Not enough samples yet for PRE window: {len(window)}/{PRE_N}"
-                        )
-                    else:
-                        at_event = {
-                            "soil_avg": soil_avg,
-                            "soil_diff": soil_diff,
-                            "temperature": float(data["T"]),
-                            "humidity": float(data["H"]),
-                        }
-                        feat_dict = build_dose_features(window, at_event)
-                        X = np.array(
-                            [[feat_dict[name] for name in dose_feature_names]],
-                            dtype=float,
-                        )
-                        pred_cont = float(dose_model.predict(X)[0])
-                        pred_snap = snap_seconds(pred_cont, allowed_seconds)
-                        sec = pred_snap
-                        print(
-                            f"[DOSE] Predicted={pred_cont:.3f}s -> snapped={pred_snap:.1f}s"
-                        )
-
-                # --- Command back to ESP32/Arduino ---
-                # Set to False if you want to disable actuation path while keeping inference running.
-                SEND_COMMANDS = True
-
-                cmd = f"CMD:{decision};SEC:{int(sec)}\n"
-
-                if SEND_COMMANDS and ser is not None and ser.is_open:
-                    try:
-                        ser.write(cmd.encode("utf-8"))
-                        ser.flush()
-                        print(f"[TX] {cmd.strip()}")
-                    except Exception as tx_err:
-                        print(f"[WARN] TX failed, command not sent: {tx_err}")
-                else:
-                    print(f"[TX-DISABLED] {cmd.strip()}")
+            # After the replies: a checkpoint write never delays a CMD
+            controller.maybe_checkpoint()
 
         except serial.SerialException as e:
-            print(f"[WARN] Serial error: {e}")
+            if profiler is not None:
+                profiler.count("reconnects")
+            log.warning("[WARN] Serial error: %s", e)
             try:
                 if ser:
                     ser.close()
@@ -306,9 +851,307 @@ def main():
             time.sleep(2)
 
         except Exception as e:
-            print(f"[ERROR] Unexpected error: {e}")
+            log.error("[ERROR] Unexpected error: %s", e)
             time.sleep(1)
 
+    if ser is not None:
+        ser.close()
+
+
+class SerialPipeline:
+    """
+    Single-port service split over three threads, so a burst of lines is
+    read off the link while inference (or a slow write) is still running:
+
+      reader (caller's thread): ser.read + LineFramer -> rx queue
+      inference worker:         GatewayController.handle_line -> tx queue
+      TX thread:                ser.write + flush
+
+    Lines are handled strictly in arrival order by the one worker, so the CMD
+    stream is the same as the inline loop's. Backpressure (core/pipeline.py)
+    is blocking end to end by default: a stalled write fills the tx queue and
+    pauses the worker, a slow worker fills the rx queue and pauses the reader,
+    and the link buffers the rest; nothing is dropped. rx_policy="drop_oldest"
+    keeps the freshest samples instead (dropped lines get no reply).
+    """
+
+    def __init__(
+        self,
+        controller,
+        port: str = PORT,
+        timeout: float = TIMEOUT,
+        rx_size: int = RX_QUEUE_LINES,
+        rx_policy: str = RX_QUEUE_POLICY,
+        tx_size: int = TX_QUEUE_COMMANDS,
+        tx_policy: str = TX_QUEUE_POLICY,
+        startup=None,
+    ):
+        self.controller = controller
+        self.port = port
+        self.timeout = timeout
+        self.startup = startup
+        prof = controller.profiler
+        self.rx = StageQueue(rx_size, rx_policy, name="rx", profiler=prof)
+        self.tx = StageQueue(tx_size, tx_policy, name="tx", profiler=prof)
+        self.ser = None  # owned by the reader; the TX thread only writes to it
+
+    def run(self, stop_event=None):
+        """Blocks until `stop_event` is set; queued lines are handled before returning."""
+        worker = threading.Thread(target=self._infer_loop, name="bt-infer", daemon=True)
+        sender = threading.Thread(target=self._tx_loop, name="bt-tx", daemon=True)
+        worker.start()
+        sender.start()
+        try:
+            self._read_loop(stop_event)
+        finally:
+            # Drain in order: remaining lines, then their commands, then close.
+            self.rx.close()
+            worker.join()
+            self.tx.close()
+            sender.join()
+            if self.ser is not None:
+                self.ser.close()
+                self.ser = None
+
+    def _read_loop(self, stop_event):
+        import serial
+
+        prof = self.controller.profiler
+        framer = LineFramer()
+        dropped_seen = 0
+        t_chunk = 0.0
+
+        while stop_event is None or not stop_event.is_set():
+            try:
+                if self.ser is None or not self.ser.is_open:
+                    log.info("[INFO] Connecting to Bluetooth serial...")
+                    self.ser = serial.Serial(self.port, BAUDRATE, timeout=self.timeout)
+                    if self.startup is not None:
+                        self.startup.mark("serial_open")
+                    time.sleep(1)
+
+                # Whatever has arrived (at least one byte, waiting up to the
+                # timeout): a burst is taken off the port in one read.
+                chunk = self.ser.read(self.ser.in_waiting or 1)
+                if not chunk:
+                    time.sleep(0.1)
+                    continue
+
+                if prof is not None:
+                    t_chunk = perf_counter()
+
+                # Lines are copied out of the framer buffer before queueing.
+                # Framing here includes the put (a blocked put is backpressure,
+                # counted as rx_queue_full).
+                self.rx.put_many([(bytes(line), t_chunk) for line in framer.feed(chunk)])
+
+                if prof is not None:
+                    prof.record("framing", perf_counter() - t_chunk)
+                    if framer.dropped_bytes != dropped_seen:
+                        prof.count("dropped_bytes", framer.dropped_bytes - dropped_seen)
+                        dropped_seen = framer.dropped_bytes
+
+            except (serial.SerialException, OSError) as e:
+                # in_waiting is an ioctl: a dropped link raises a bare OSError (EIO)
+                if prof is not None:
+                    prof.count("reconnects")
+                log.warning("[WARN] Serial error: %s", e)
+                ser, self.ser = self.ser, None
+                try:
+                    if ser:
+                        ser.close()
+                except Exception:
+                    pass
+                time.sleep(2)
+
+            except Exception as e:
+                log.error("[ERROR] Unexpected error: %s", e)
+                time.sleep(1)
+
+    def _infer_loop(self):
+        controller = self.controller
+        prof = controller.profiler
+        while True:
+            batch = self.rx.get_batch()
+            if not batch:
+                return
+            cmds = []
+            for line, t_read in batch:
+                try:
+                    if prof is not None:
+                        # rx_wait = read -> start of handling (queueing delay)
+                        prof.record("rx_wait", perf_counter() - t_read)
+                    cmd = controller.handle_line(line)
+                    if cmd is not None:
+                        cmds.append(cmd)
+                except Exception as e:
+                    log.error("[ERROR] Unexpected error: %s", e)
+            self.tx.put_many(cmds)
+            # After the replies: a checkpoint write never delays a CMD
+            controller.maybe_checkpoint()
+
+    def _tx_loop(self):
+        prof = self.controller.profiler
+        while True:
+            cmds = self.tx.get_batch()
+            if not cmds:
+                return
+            for cmd in cmds:
+                ser = self.ser
+                if SEND_COMMANDS and (ser is None or not ser.is_open):
+                    # Link down (the reader is reconnecting): stale once it is back.
+                    if prof is not None:
+                        prof.count("tx_errors")
+                    log.warning("[WARN] TX failed, command not sent: serial port not open")
+                    continue
+                send_command(ser, cmd, prof)
+                if self.startup is not None:
+                    self.startup.mark("first_reply")
+                    self.startup.report()
+                    self.startup = None
+
+
+def run(
+    port: str = PORT,
+    timeout: float = TIMEOUT,
+    profiler=None,
+    stop_event=None,
+    fast_start: bool = False,
+    startup=None,
+    metrics=None,
+    store=None,
+    uploader=None,
+    checkpointer=None,
+    model_manager=None,
+    shadow=None,
+    pipelined: bool = PIPELINED,
+    rx_queue: int = RX_QUEUE_LINES,
+    rx_policy: str = RX_QUEUE_POLICY,
+    tx_queue: int = TX_QUEUE_COMMANDS,
+):
+    """
+    Blocking single-gateway loop. Runs until `stop_event` (threading.Event)
+    is set, or forever when it is None.
+
+    metrics: optional core.metrics.ServiceMetrics; used as the profiler when
+    no explicit one is given.
+    store: optional core.telemetry_store.TelemetryStore (closed on exit).
+    uploader: optional core.uploader.ThingSpeakUploader (started by the caller).
+    checkpointer: optional core.checkpoint.Checkpointer (warm restart; saved on exit).
+    model_manager: optional core.model_manager.ModelManager (started by the caller).
+    shadow: optional core.shadow.ShadowEvaluator (closed on exit).
+
+    fast_start: open the port and answer with the rule-based ON/OFF decision
+    right away; the dose model is attached when its background load finishes.
+    startup: optional core.startup.StartupReport, printed after the first reply.
+
+    pipelined: reader / inference / TX threads with bounded queues
+    (SerialPipeline: rx_queue lines with rx_policy, tx_queue commands);
+    False = the single-threaded loop.
+    """
+    log.info("[INFO] Opening Bluetooth serial port: %s", port)
+
+    if profiler is None and metrics is not None:
+        profiler = metrics.gateway()
+
+    if fast_start:
+        controller = GatewayController(
+            profiler=profiler,
+            dose_loader=start_dose_loader(startup),
+            store=store,
+            uploader=uploader,
+            checkpointer=checkpointer,
+            model_manager=model_manager,
+            shadow=shadow,
+        )
+    else:
+        dose_model, dose_feature_names = load_dose_artifacts()
+        controller = GatewayController(
+            dose_model,
+            dose_feature_names,
+            profiler=profiler,
+            store=store,
+            uploader=uploader,
+            checkpointer=checkpointer,
+            model_manager=model_manager,
+            shadow=shadow,
+        )
+        if startup is not None:
+            startup.mark("dose_ready")
+
+    if pipelined:
+        SerialPipeline(
+            controller,
+            port,
+            timeout,
+            rx_size=rx_queue,
+            rx_policy=rx_policy,
+            tx_size=tx_queue,
+            startup=startup,
+        ).run(stop_event)
+    else:
+        _run_inline(controller, port, timeout, stop_event, startup)
+
+    controller.maybe_checkpoint(force=True)
+    if controller.store is not None:
+        controller.store.close()
+    if controller.shadow is not None:
+        controller.shadow.close()
+
+
+def main(fast_start: bool = False, startup=None, port: str = None):
+    # Level/format/rate limits from the `logging:` section of settings.yaml
+    # (LOG_LEVEL, LOG_FORMAT); SIGUSR1 toggles DEBUG tracing at runtime.
+    settings = load_settings()
+    logs = setup_logging(settings=settings)
+    logs.install_signal_toggle()
+
+    # Stage histograms + line/command/reconnect counters on
+    # http://127.0.0.1:9108/metrics (settings.yaml `metrics:`; port 0 = off).
+    # Started off the startup path so it never delays opening the port.
+    metrics = ServiceMetrics()
+    server = BackgroundLoader(
+        lambda: start_metrics_server(metrics, settings, log=log), name="metrics-start"
+    )
+
+    # Batched ThingSpeak upload from the Pi (only when thingspeak.url/api_key are set).
+    uploader = uploader_from_settings(settings, UPLOAD_QUEUE_PATH)
+    if uploader is not None:
+        uploader.start()
+
+    # New files in model/dose/ are validated in the background and swapped
+    # in between two samples (no restart, the serial link stays up).
+    models = model_manager_from_settings(settings)
+    if models is not None:
+        models.start()
+
+    try:
+        run(
+            # --port, else `serial.port` in settings.yaml (SERIAL_PORT), else /dev/rfcomm0
+            port=port or get_section(settings, "serial").get("port") or PORT,
+            fast_start=fast_start,
+            startup=startup,
+            metrics=metrics,
+            store=open_telemetry_store(settings),
+            uploader=uploader,
+            checkpointer=open_checkpointer(settings),
+            model_manager=models,
+            shadow=open_shadow(settings),
+            **pipeline_from_settings(settings),
+        )
+    finally:
+        if models is not None:
+            models.stop()
+        if uploader is not None:
+            uploader.stop()
+        if server.done() and server.result() is not None:
+            server.result().stop()
+        logs.stop()
+
 
 if __name__ == "__main__":
-    main()
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Single-gateway Bluetooth inference service")
+    parser.add_argument("--port", default=None, help=f"Serial/rfcomm device. Default: settings.yaml / {PORT}")
+    main(port=parser.parse_args().port)
@@ -1,4 +1,36 @@
-from bt_inference_service import main
+"""
+systemd entrypoint (system/edge-ai.service).
+
+  --fast-start     open the port and answer with the rule-based ON/OFF decision
+                   immediately; NumPy and the dose model load in the background
+                   (also: EDGE_FAST_START=1)
+  --import-report  print the cold-start timeline and an `-X importtime` style
+                   breakdown after the first reply (also: EDGE_IMPORT_REPORT=1)
+"""
+
+import os
+import sys
+from time import perf_counter
+
+T_START = perf_counter()
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # .../edge/raspberry_pi
+if BASE_DIR not in sys.path:
+    sys.path.insert(0, BASE_DIR)
+
+from core.startup import StartupReport  # noqa: E402
+
+FAST_START = "--fast-start" in sys.argv[1:] or os.environ.get("EDGE_FAST_START") == "1"
+IMPORT_REPORT = "--import-report" in sys.argv[1:] or os.environ.get("EDGE_IMPORT_REPORT") == "1"
+
+startup = StartupReport(T_START) if IMPORT_REPORT else None
+if startup is not None:
+    startup.install()
+
+from bt_inference_service import main  # noqa: E402
+
+if startup is not None:
+    startup.mark("imports")
 
 if __name__ == "__main__":
-    main()
+    main(fast_start=FAST_START, startup=startup)
@@ -0,0 +1,332 @@
+import argparse
+import asyncio
+import errno
+import os
+import signal
+import sys
+import termios
+import tty
+from time import perf_counter
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # .../edge/raspberry_pi
+APP_DIR = os.path.join(BASE_DIR, "app")
+for _p in (BASE_DIR, APP_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+from bt_inference_service import (  # noqa: E402
+    BAUDRATE,
+    PORT,
+    SEND_COMMANDS,
+    GatewayController,
+    load_dose_artifacts,
+    model_manager_from_settings,
+    open_checkpointer,
+    open_shadow,
+    open_telemetry_store,
+)
+from core.line_framer import LineFramer  # noqa: E402
+from core.log import get_logger, setup_logging  # noqa: E402
+from core.metrics import ServiceMetrics, start_metrics_server  # noqa: E402
+from core.settings import as_list, get_section, load_settings  # noqa: E402
+
+# asyncio multi-gateway mode for the Bluetooth inference service.
+# One Pi process serves N ESP32 gateways (one rfcomm/serial device each):
+# - every port is opened non-blocking and read from the event loop,
+# - each port has its own line buffer, hysteresis state and PRE window
+#   (a GatewayController), and `CMD:` replies go back on the same port,
+# - a port that drops (rfcomm disconnect, EIO) is reopened on its own without
+#   affecting the others.
+#
+# Ports come from --port (repeatable) or `serial.ports` in config/settings.yaml.
+# Any character device works, so local pty pairs can stand in for rfcomm
+# devices (see tools/multi_gateway_pty_check.py).
+
+READ_SIZE = 4096
+RECONNECT_DELAY = 2.0  # seconds
+
+log = get_logger("multi")
+
+
+def open_serial_fd(path: str, baudrate: int = BAUDRATE) -> int:
+    """Open a tty non-blocking in raw mode (no echo, no line discipline)."""
+    fd = os.open(path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+    try:
+        tty.setraw(fd)
+        speed = getattr(termios, f"B{int(baudrate)}", termios.B9600)
+        attrs = termios.tcgetattr(fd)
+        attrs[4] = speed  # ispeed
+        attrs[5] = speed  # ospeed
+        attrs[2] |= termios.CLOCAL | termios.CREAD
+        termios.tcsetattr(fd, termios.TCSANOW, attrs)
+    except Exception:
+        os.close(fd)
+        raise
+    return fd
+
+
+class GatewayPort:
+    """One serial/rfcomm link driven by the event loop."""
+
+    def __init__(self, path: str, controller: GatewayController, baudrate: int = BAUDRATE):
+        self.path = path
+        self.controller = controller
+        self.baudrate = baudrate
+
+        self._fd = None
+        self._rx = LineFramer()
+        self._tx = bytearray()
+        self._closed = None
+
+    # ------------------------------------------------------------------ #
+    async def run(self, stop: asyncio.Event):
+        loop = asyncio.get_running_loop()
+        log = self.controller.log
+
+        while not stop.is_set():
+            try:
+                log.info("[INFO] Connecting to serial port %s...", self.path)
+                self._fd = open_serial_fd(self.path, self.baudrate)
+            except OSError as e:
+                self._count("reconnects")
+                log.warning("[WARN] Serial error: %s", e)
+                await self._sleep_or_stop(stop, RECONNECT_DELAY)
+                continue
+
+            self._rx.clear()
+            self._tx.clear()
+            self._closed = loop.create_future()
+            loop.add_reader(self._fd, self._on_readable)
+
+            stop_wait = asyncio.ensure_future(stop.wait())
+            try:
+                await asyncio.wait(
+                    {self._closed, stop_wait}, return_when=asyncio.FIRST_COMPLETED
+                )
+            finally:
+                stop_wait.cancel()
+                self._teardown()
+
+            if not stop.is_set():
+                await self._sleep_or_stop(stop, RECONNECT_DELAY)
+
+    @staticmethod
+    async def _sleep_or_stop(stop: asyncio.Event, delay: float):
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
+
+    def _teardown(self):
+        if self._fd is None:
+            return
+        loop = asyncio.get_running_loop()
+        loop.remove_reader(self._fd)
+        loop.remove_writer(self._fd)
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+        self._fd = None
+
+    def _mark_closed(self, reason: str):
+        if self._closed is not None and not self._closed.done():
+            self._count("reconnects")
+            self.controller.log.warning("[WARN] Serial error: %s", reason)
+            self._closed.set_result(reason)
+
+    def _count(self, event: str, n: int = 1):
+        prof = self.controller.profiler
+        if prof is not None:
+            prof.count(event, n)
+
+    # ------------------------------------------------------------------ #
+    def _on_readable(self):
+        try:
+            chunk = os.read(self._fd, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            # EIO: pty peer / rfcomm link went away
+            self._mark_closed(str(e))
+            return
+
+        if not chunk:
+            self._mark_closed("port closed (EOF)")
+            return
+
+        prof = self.controller.profiler
+        if prof is None:
+            # Process all complete lines currently in the buffer
+            for line in self._rx.feed(chunk):
+                cmd = self.controller.handle_line(line)
+                if cmd is not None:
+                    self._send(cmd)
+            self.controller.maybe_checkpoint()
+            return
+
+        # Same loop with timing: framing = chunk time minus line handling
+        t_chunk = perf_counter()
+        busy = 0.0
+        dropped = self._rx.dropped_bytes
+        for line in self._rx.feed(chunk):
+            t0 = perf_counter()
+            cmd = self.controller.handle_line(line)
+            if cmd is not None:
+                self._send(cmd)
+            busy += perf_counter() - t0
+        prof.record("framing", perf_counter() - t_chunk - busy)
+        if self._rx.dropped_bytes != dropped:
+            prof.count("dropped_bytes", self._rx.dropped_bytes - dropped)
+        self.controller.maybe_checkpoint()
+
+    def _send(self, cmd: str):
+        if not SEND_COMMANDS or self._fd is None:
+            self.controller.log.info("[TX-DISABLED] %s", cmd.strip())
+            return
+
+        prof = self.controller.profiler
+        if prof is not None:
+            t0 = perf_counter()
+        pending = bool(self._tx)
+        self._tx += cmd.encode("utf-8")
+        if not pending:
+            self._flush_tx()
+        if prof is not None:
+            prof.record("tx", perf_counter() - t0)
+        self.controller.log.info("[TX] %s", cmd.strip())
+
+    def _flush_tx(self):
+        loop = asyncio.get_running_loop()
+        try:
+            while self._tx:
+                n = os.write(self._fd, self._tx)
+                del self._tx[:n]
+        except BlockingIOError:
+            loop.add_writer(self._fd, self._flush_tx)
+            return
+        except OSError as e:
+            if e.errno != errno.EAGAIN:
+                self._tx.clear()
+                self._count("tx_errors")
+                self.controller.log.warning("[WARN] TX failed, command not sent: %s", e)
+                self._mark_closed(str(e))
+            return
+        loop.remove_writer(self._fd)
+
+
+def port_label(path: str) -> str:
+    """Short log tag: /dev/rfcomm1 -> rfcomm1, /dev/pts/3 -> pts/3."""
+    if path.startswith("/dev/"):
+        return path[len("/dev/"):]
+    return os.path.basename(path) or path
+
+
+async def serve(
+    ports,
+    baudrate: int = BAUDRATE,
+    stop: asyncio.Event = None,
+    profiler=None,
+    metrics=None,
+    settings=None,
+    model_manager=None,
+):
+    """
+    Run one GatewayPort per path until `stop` is set. With `metrics`
+    (core.metrics.ServiceMetrics) each port records under its own gateway label.
+    With `settings`, each port also gets its own telemetry store directory,
+    warm-restart checkpoint and (when configured) shadow evaluator. A
+    `model_manager` (core.model_manager) is shared by all ports: each switches
+    to a reloaded dose model between samples.
+    """
+    if not ports:
+        raise ValueError("No serial ports configured")
+
+    dose_model, dose_feature_names = load_dose_artifacts()
+
+    gateways = [
+        GatewayPort(
+            path,
+            GatewayController(
+                dose_model,
+                dose_feature_names,
+                name=port_label(path),
+                profiler=metrics.gateway(port_label(path)) if metrics is not None else profiler,
+                store=open_telemetry_store(settings, port_label(path)) if settings is not None else None,
+                checkpointer=open_checkpointer(settings, port_label(path)) if settings is not None else None,
+                model_manager=model_manager,
+                shadow=open_shadow(settings, port_label(path)) if settings is not None else None,
+            ),
+            baudrate,
+        )
+        for path in ports
+    ]
+
+    stop = stop or asyncio.Event()
+    log.info("[INFO] Serving %d gateway(s): %s", len(gateways), ", ".join(ports))
+    try:
+        await asyncio.gather(*(g.run(stop) for g in gateways))
+    finally:
+        for g in gateways:
+            g.controller.maybe_checkpoint(force=True)
+            if g.controller.store is not None:
+                g.controller.store.close()
+            if g.controller.shadow is not None:
+                g.controller.shadow.close()
+
+
+def resolve_ports(cli_ports):
+    if cli_ports:
+        return list(cli_ports)
+
+    serial_cfg = get_section(load_settings(), "serial")
+    ports = as_list(serial_cfg.get("ports"))
+    if not ports and serial_cfg.get("port"):
+        ports = [serial_cfg["port"]]
+    return ports or [PORT]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Multi-gateway Bluetooth inference service")
+    parser.add_argument(
+        "--port",
+        action="append",
+        help="Serial/rfcomm device (repeat for each gateway). Default: settings.yaml",
+    )
+    parser.add_argument("--baud", type=int, default=None)
+    parser.add_argument("--log-level", default=None, help="Default: settings.yaml / INFO")
+    parser.add_argument("--log-format", choices=("text", "json"), default=None)
+    parser.add_argument("--metrics-port", type=int, default=None, help="Default: settings.yaml / 9108 (0 = off)")
+    args = parser.parse_args(argv)
+
+    settings = load_settings()
+    logs = setup_logging(level=args.log_level, fmt=args.log_format, settings=settings)
+    metrics = ServiceMetrics()
+    server = start_metrics_server(metrics, settings, port=args.metrics_port, log=log)
+
+    ports = resolve_ports(args.port)
+    baud = args.baud or get_section(settings, "serial").get("baud") or BAUDRATE
+
+    async def _run():
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        loop.add_signal_handler(signal.SIGUSR1, logs.toggle_verbose)
+        await serve(ports, int(baud), stop, metrics=metrics, settings=settings, model_manager=models)
+
+    models = model_manager_from_settings(settings)
+    if models is not None:
+        models.start()
+    try:
+        asyncio.run(_run())
+    finally:
+        if models is not None:
+            models.stop()
+        if server is not None:
+            server.stop()
+        logs.stop()
+
+
+if __name__ == "__main__":
+    main()
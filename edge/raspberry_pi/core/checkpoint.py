@@ -0,0 +1,99 @@
+import json
+import os
+import time
+from typing import Optional
+
+from core.log import get_logger
+
+# Warm-restart checkpoint for one gateway's control state: hysteresis
+# (watering_state), the PRE window samples and the last command sent.
+#
+# Without it a restart (systemd Restart=on-failure, reboot, serial crash)
+# starts with watering_state=False and an empty window, and no dose can be
+# predicted for PRE_N samples (~30 min). The state is a few hundred bytes of
+# JSON, written atomically (temp file + fsync + rename), so a crash mid-write
+# leaves the previous checkpoint intact.
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SECONDS = 60.0  # save at most this often (and on every ON/OFF transition)
+MAX_AGE_SECONDS = 15 * 60.0  # older checkpoints no longer describe the PRE window
+
+log = get_logger("checkpoint")
+
+
+def write_atomic(path: str, data: bytes):
+    """Replace `path` with `data` so readers see either the old or the new file."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    tmp = f"{path}.tmp"
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, data)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp, path)
+    # Persist the rename itself (directory entry)
+    dir_fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
+
+
+class Checkpointer:
+    """Periodic, atomic save/load of a controller's checkpoint_state() dict."""
+
+    def __init__(
+        self,
+        path: str,
+        interval: float = CHECKPOINT_SECONDS,
+        max_age: float = MAX_AGE_SECONDS,
+    ):
+        self.path = path
+        self.interval = float(interval)
+        self.max_age = float(max_age)
+        self.saves = 0
+        self._last_save = 0.0  # monotonic
+
+    def load(self) -> Optional[dict]:
+        """The saved state, or None when missing, unreadable or older than max_age."""
+        try:
+            with open(self.path, "rb") as f:
+                state = json.loads(f.read())
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            log.warning("[WARN] Ignoring unreadable checkpoint %s: %s", self.path, e)
+            return None
+
+        if not isinstance(state, dict) or state.get("version") != CHECKPOINT_VERSION:
+            log.warning("[WARN] Ignoring checkpoint with unknown format: %s", self.path)
+            return None
+
+        try:
+            age = time.time() - float(state.get("saved_at", 0.0))
+        except (TypeError, ValueError) as e:
+            log.warning("[WARN] Ignoring unreadable checkpoint %s: saved_at %s", self.path, e)
+            return None
+        if not 0 <= age <= self.max_age:  # also rejects NaN
+            log.info("[STATE] Checkpoint is %.0f s old (max %.0f s), starting cold", age, self.max_age)
+            return None
+        state["age"] = age
+        return state
+
+    def save(self, state: dict) -> bool:
+        payload = dict(state, version=CHECKPOINT_VERSION, saved_at=time.time())
+        try:
+            write_atomic(self.path, json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        except OSError as e:
+            log.warning("[WARN] Checkpoint not saved (%s): %s", self.path, e)
+            return False
+        finally:
+            # Failed saves are retried at the next interval, not on every sample.
+            self._last_save = time.monotonic()
+        self.saves += 1
+        return True
+
+    def due(self) -> bool:
+        return time.monotonic() - self._last_save >= self.interval
@@ -2,9 +2,9 @@ import json
 from dataclasses import dataclass
 from typing import Dict, List
 
-import joblib
 import numpy as np
 
+from core.prediction_cache import CACHE_SIZE, PredictionCache
 
 ALLOWED_SECONDS = np.array([8.0, 14.0, 18.0, 24.0], dtype=float)
 
@@ -15,15 +15,95 @@ class DosePrediction:
     snapped_seconds: float
 
 
+class CompiledForest:
+    """
+    NumPy-only evaluator for a RandomForestRegressor flattened by
+    scripts/export_compiled_dose_model.py (.npz).
+
+    All trees live in contiguous node arrays (feature, threshold, left,
+    right, value). Leaves point to themselves with an +inf threshold, so every
+    tree can be walked in lock-step for `max_depth` steps without branching.
+    Split semantics follow sklearn: X is cast to float32 and a sample goes
+    left when X[feature] <= threshold.
+    """
+
+    def __init__(self, path: str):
+        with np.load(path, allow_pickle=False) as data:
+            self.feature = np.ascontiguousarray(data["feature"], dtype=np.intp)
+            self.threshold = np.ascontiguousarray(data["threshold"], dtype=np.float64)
+            self.left = np.ascontiguousarray(data["left"], dtype=np.intp)
+            self.right = np.ascontiguousarray(data["right"], dtype=np.intp)
+            self.value = np.ascontiguousarray(data["value"], dtype=np.float64)
+            self.roots = np.ascontiguousarray(data["roots"], dtype=np.intp)
+            self.max_depth = int(data["max_depth"])
+            self.n_features_in_ = int(data["n_features"])
+            self.feature_names: List[str] = [str(n) for n in data["feature_names"]]
+
+        self.n_estimators = int(self.roots.shape[0])
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, but the forest expects {self.n_features_in_}"
+            )
+
+        feature = self.feature
+        threshold = self.threshold
+        left = self.left
+        right = self.right
+
+        if X.shape[0] == 1:
+            # Single-row fast path: one gather per level across all trees.
+            x = X[0]
+            idx = self.roots
+            for _ in range(self.max_depth):
+                idx = np.where(x[feature[idx]] <= threshold[idx], left[idx], right[idx])
+            return self.value[idx].sum(keepdims=True) / self.n_estimators
+
+        rows = np.arange(X.shape[0])[:, None]
+        idx = np.broadcast_to(self.roots, (X.shape[0], self.n_estimators))
+        for _ in range(self.max_depth):
+            go_left = X[rows, feature[idx]] <= threshold[idx]
+            idx = np.where(go_left, left[idx], right[idx])
+        return self.value[idx].sum(axis=1) / self.n_estimators
+
+
+def load_dose_model(model_path: str):
+    """
+    Load a dose regressor artefact.
+
+    `.npz` files are compiled forests (NumPy only); anything else is treated as
+    a joblib pickle, which imports scikit-learn on load.
+    """
+    if model_path.endswith(".npz"):
+        return CompiledForest(model_path)
+
+    import joblib
+
+    return joblib.load(model_path)
+
+
 class DoseRegressor:
-    def __init__(self, model_path: str, features_path: str):
-        self.model = joblib.load(model_path)
+    def __init__(self, model_path: str, features_path: str, cache_size: int = CACHE_SIZE):
+        self.model = load_dose_model(model_path)
+        # Repeated feature rows skip the forest (cache_size=0 disables it).
+        # Entries are tied to self.model: assigning a new model invalidates them.
+        self.cache = PredictionCache(cache_size) if cache_size else None
 
         with open(features_path, "r", encoding="utf-8") as f:
             payload = json.load(f)
 
         self.feature_names: List[str] = payload["features"]
 
+        compiled_names = getattr(self.model, "feature_names", None)
+        if compiled_names and list(compiled_names) != self.feature_names:
+            raise ValueError(
+                "Compiled dose model feature order does not match the features contract"
+            )
+
     @staticmethod
     def snap_to_allowed(y_pred: float) -> float:
         idx = int(np.argmin(np.abs(ALLOWED_SECONDS - y_pred)))
@@ -38,7 +118,10 @@ class DoseRegressor:
             [[float(features[name]) for name in self.feature_names]], dtype=float
         )
 
-        pred = float(self.model.predict(row)[0])
+        if self.cache is not None:
+            pred = self.cache.predict(self.model, row)
+        else:
+            pred = float(self.model.predict(row)[0])
         snapped = self.snap_to_allowed(pred)
 
         return DosePrediction(continuous_seconds=pred, snapped_seconds=snapped)
@@ -1,3 +1,4 @@
+import json
 import os
 import numpy as np
 from joblib import load
@@ -19,8 +20,19 @@ class EdgeIrrigationModel:
     It loads:
       - a MinMaxScaler saved as joblib (trained on 6 features)
       - a TFLite model (binary classifier: 0 = no irrigation, 1 = irrigation)
+
+    The scaler is applied as a precomputed float32 affine transform
+    (x * scale_ + min_), so sklearn is not called per prediction.
+
+    Full-integer models from tools/convert_to_tflite.py --mode int8 are
+    supported too: int8 inputs/outputs are (de)quantized here, and when the
+    model's sidecar JSON (<model>.json) says the scaler is folded into the
+    graph, raw features go in as they are (no scaler file needed).
     """
 
+    # Largest batch handed to a single invoke() by predict_batch
+    MAX_BATCH = 4096
+
     def __init__(
         self,
         model_path: str = "model/model.tflite",
@@ -31,10 +43,20 @@ class EdgeIrrigationModel:
         project_root = os.path.dirname(base_dir)
 
         model_full = os.path.join(project_root, model_path)
-        scaler_full = os.path.join(project_root, scaler_path)
 
-        print(f"[MODEL] Loading scaler from: {scaler_full}")
-        self.scaler = load(scaler_full)
+        self.meta = {}
+        meta_path = os.path.splitext(model_full)[0] + ".json"
+        if os.path.exists(meta_path):
+            with open(meta_path, "r", encoding="utf-8") as f:
+                self.meta = json.load(f)
+
+        self.scaler = None
+        if scaler_path and not self.meta.get("scaler_folded"):
+            scaler_full = os.path.join(project_root, scaler_path)
+            print(f"[MODEL] Loading scaler from: {scaler_full}")
+            self.scaler = load(scaler_full)
+        elif self.meta.get("scaler_folded"):
+            print("[MODEL] Scaler folded into the model: raw features in")
 
         print(f"[MODEL] Loading TFLite model from: {model_full}")
         self.interpreter = TFLITE_INTERPRETER(model_path=model_full)
@@ -46,6 +68,59 @@ class EdgeIrrigationModel:
         print(f"[MODEL] Input details: {self.input_details}")
         print(f"[MODEL] Output details: {self.output_details}")
 
+        # MinMaxScaler.transform(X) == X * scale_ + min_ (then clipped to
+        # feature_range when clip=True).
+        self.n_features = int(self.input_details[0]["shape"][-1])
+        self._scale = self._offset = self._clip = None
+        if self.scaler is not None:
+            self._scale = np.asarray(self.scaler.scale_, dtype=np.float32)
+            self._offset = np.asarray(self.scaler.min_, dtype=np.float32)
+            self._clip = (
+                tuple(float(v) for v in self.scaler.feature_range)
+                if getattr(self.scaler, "clip", False)
+                else None
+            )
+        self._batch_rows = int(self.input_details[0]["shape"][0])
+
+        # Quantized I/O (full-integer models): real = (q - zero_point) * scale
+        self._in_dtype = self.input_details[0]["dtype"]
+        self._in_q = self.input_details[0]["quantization"]
+        self._out_q = self.output_details[0]["quantization"]
+        self._out_quantized = self.output_details[0]["dtype"] != np.float32
+
+    def _scale_features(self, x: np.ndarray) -> np.ndarray:
+        if self._scale is None:
+            x_scaled = x
+        else:
+            x_scaled = x * self._scale
+            x_scaled += self._offset
+            if self._clip is not None:
+                np.clip(x_scaled, self._clip[0], self._clip[1], out=x_scaled)
+        if self._in_dtype == np.float32:
+            return x_scaled
+
+        scale, zero_point = self._in_q
+        info = np.iinfo(self._in_dtype)
+        q = np.round(x_scaled / scale) + zero_point
+        return np.clip(q, info.min, info.max).astype(self._in_dtype)
+
+    def _dequantize(self, out: np.ndarray) -> np.ndarray:
+        if not self._out_quantized:
+            return out
+        scale, zero_point = self._out_q
+        return (out.astype(np.float32) - zero_point) * scale
+
+    def _ensure_rows(self, rows: int):
+        """Resize the interpreter input to `rows` samples (no-op if unchanged)."""
+        if rows == self._batch_rows:
+            return
+        input_index = self.input_details[0]["index"]
+        self.interpreter.resize_tensor_input(input_index, [rows, self.n_features])
+        self.interpreter.allocate_tensors()
+        self.input_details = self.interpreter.get_input_details()
+        self.output_details = self.interpreter.get_output_details()
+        self._batch_rows = rows
+
     def predict(self, raw_features):
         """
         Run inference on a single sample.
@@ -60,19 +135,61 @@ class EdgeIrrigationModel:
         x = np.array(raw_features, dtype=np.float32).reshape(1, -1)
 
         # Scale features using the same MinMaxScaler used in training.
-        x_scaled = self.scaler.transform(x)
+        x_scaled = self._scale_features(x)
 
         # Set input tensor
+        self._ensure_rows(1)
         self.interpreter.set_tensor(self.input_details[0]["index"], x_scaled)
 
         # Run inference
         self.interpreter.invoke()
 
         # Read output tensor
-        output_data = self.interpreter.get_tensor(self.output_details[0]["index"])
+        output_data = self._dequantize(self.interpreter.get_tensor(self.output_details[0]["index"]))
         prob = float(output_data[0][0])
 
         # Simple threshold at 0.5 (can be adjusted based on evaluation)
         label = 1 if prob >= 0.5 else 0
 
         return prob, label
+
+    def predict_batch(self, raw_features, threshold: float = 0.5):
+        """
+        Run inference on N samples with as few invokes as possible.
+
+        raw_features: array-like of shape (N, 6), same column order as predict().
+
+        Returns:
+          probs: np.ndarray (N,) float32 in [0, 1]
+          labels: np.ndarray (N,) int (0 = WATER_OFF, 1 = WATER_ON)
+        """
+        x = np.asarray(raw_features, dtype=np.float32).reshape(-1, self.n_features)
+        n = x.shape[0]
+        probs = np.empty(n, dtype=np.float32)
+        if n == 0:
+            return probs, probs.astype(int)
+
+        x_scaled = self._scale_features(x)
+
+        # One input shape for every chunk: the tail is zero-padded instead of
+        # triggering another resize + allocate_tensors().
+        rows = min(n, self.MAX_BATCH)
+        self._ensure_rows(rows)
+        input_index = self.input_details[0]["index"]
+        output_index = self.output_details[0]["index"]
+
+        for start in range(0, n, rows):
+            chunk = x_scaled[start : start + rows]
+            m = chunk.shape[0]
+            if m < rows:
+                padded = np.zeros((rows, self.n_features), dtype=chunk.dtype)
+                padded[:m] = chunk
+                chunk = padded
+
+            self.interpreter.set_tensor(input_index, np.ascontiguousarray(chunk))
+            self.interpreter.invoke()
+            out = self._dequantize(self.interpreter.get_tensor(output_index))
+            probs[start : start + m] = out[:m, 0]
+
+        labels = (probs >= threshold).astype(int)
+        return probs, labels
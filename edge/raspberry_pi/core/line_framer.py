@@ -0,0 +1,71 @@
+from typing import Iterator
+
+# Guard against a peer that never sends a newline (corrupted stream, wrong
+# baud rate): a partial line longer than this is discarded.
+MAX_LINE_BYTES = 4096
+
+
+class LineFramer:
+    """
+    Newline framer for a byte stream (Bluetooth SPP delivers arbitrary chunks).
+
+    Chunks are appended to one bytearray; complete lines are located with
+    bytearray.find() from a moving offset and handed out as memoryview slices,
+    so a burst of N lines costs O(N) instead of re-splitting (and re-copying)
+    the remaining buffer for every line. Consumed bytes are dropped once per
+    feed() call.
+
+    Yielded views are only valid inside the loop body; they are released
+    before the next line is produced. Copy with bytes(view) to keep one.
+    """
+
+    def __init__(self, max_line: int = MAX_LINE_BYTES):
+        self.max_line = int(max_line)
+        self._buf = bytearray()
+
+        # Counters (read by the metrics / benchmark tooling)
+        self.lines = 0
+        self.dropped_bytes = 0
+
+    def __len__(self) -> int:
+        """Bytes of the pending (incomplete) line."""
+        return len(self._buf)
+
+    def clear(self):
+        self._buf = bytearray()
+
+    def feed(self, chunk) -> Iterator[memoryview]:
+        buf = self._buf
+        buf += chunk
+
+        start = 0
+        mv = memoryview(buf)
+        try:
+            while True:
+                end = buf.find(b"\n", start)
+                if end < 0:
+                    break
+
+                line = mv[start:end]
+                start = end + 1
+                self.lines += 1
+                try:
+                    yield line
+                finally:
+                    line.release()
+        finally:
+            mv.release()
+            self._compact(start)
+
+    def _compact(self, start: int):
+        buf = self._buf
+        try:
+            if start:
+                del buf[:start]
+        except BufferError:
+            # A caller kept a derived view alive: leave that object to it.
+            buf = self._buf = bytearray(buf[start:])
+
+        if len(buf) > self.max_line:
+            self.dropped_bytes += len(buf)
+            buf.clear()
@@ -0,0 +1,343 @@
+import atexit
+import io
+import json
+import logging
+import logging.handlers
+import queue
+import re
+import sys
+import threading
+import time
+from typing import Optional
+
+# Logging for the edge services, off the control loop:
+# - callers log through the "edge" logger tree (get_logger); messages keep the
+#   existing "[TAG] text" style and use %-args so formatting happens later,
+# - a RateLimiter drops floods of the same message (per template and gateway)
+#   before a LogRecord is even built,
+# - a QueueHandler hands records to a background listener that writes them,
+#   buffered, as text or JSON lines, and flushes whenever the queue drains.
+# Nothing is written until setup_logging() is called by an entrypoint.
+
+LOGGER_NAME = "edge"
+
+DEFAULT_LEVEL = "INFO"
+DEFAULT_FORMAT = "text"  # text | json
+DEFAULT_RATE = 5.0  # messages per second per message template (burst below)
+DEFAULT_BURST = 20
+DEFAULT_DEBUG_SAMPLE = 1  # keep 1 of every N DEBUG records per template
+QUEUE_SIZE = 10000
+NOTICE_POLL = 1.0  # seconds; how soon the listener reports a level change made from a signal
+WRITE_BUFFER = 64 * 1024
+
+_TAG_RE = re.compile(r"^\[([A-Z][A-Z_-]*)\]\s*")
+
+logging.getLogger(LOGGER_NAME).addHandler(logging.NullHandler())
+
+
+class RateLimiter:
+    """
+    Token bucket per (logger, gateway, message template). ERROR and above are
+    never dropped. admit() returns None to drop, otherwise how many similar
+    messages were suppressed since the last one that got through.
+    """
+
+    MAX_KEYS = 1024
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST, debug_sample: int = DEFAULT_DEBUG_SAMPLE):
+        self.rate = float(rate)
+        self.burst = float(max(1, burst))
+        self.debug_sample = max(1, int(debug_sample))
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def admit(self, key, levelno: int) -> Optional[int]:
+        if levelno >= logging.ERROR:
+            return 0
+
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.MAX_KEYS:
+                    self._buckets.clear()
+                # [tokens, last refill, suppressed, debug counter]
+                bucket = self._buckets[key] = [self.burst, now, 0, 0]
+
+            if levelno < logging.INFO and self.debug_sample > 1:
+                bucket[3] += 1
+                if bucket[3] % self.debug_sample:
+                    return None
+
+            if self.rate > 0:
+                tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+                bucket[1] = now
+                if tokens < 1.0:
+                    bucket[0] = tokens
+                    bucket[2] += 1
+                    return None
+                bucket[0] = tokens - 1.0
+
+            suppressed = bucket[2]
+            bucket[2] = 0
+        return suppressed
+
+
+# Installed by setup_logging(); None = no rate limiting.
+_limiter: Optional[RateLimiter] = None
+
+
+class GatewayAdapter(logging.LoggerAdapter):
+    """
+    Adds the gateway name to every record (text prefix / JSON field) and
+    applies the rate limiter before the record is created.
+    """
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        limiter = _limiter
+        extra = self.extra
+        if limiter is not None:
+            suppressed = limiter.admit((self.logger.name, extra["gateway"], msg), level)
+            if suppressed is None:
+                return
+            if suppressed:
+                extra = {**extra, "suppressed": suppressed}
+        more = kwargs.get("extra")
+        if more:
+            extra = {**extra, **more}
+        exc_info = kwargs.get("exc_info")
+        if exc_info and not isinstance(exc_info, tuple):
+            exc_info = sys.exc_info()
+        # makeRecord + handle instead of Logger.log: skips the caller lookup
+        # (a stack walk per call) since the records carry no file/line fields.
+        record = self.logger.makeRecord(
+            self.logger.name, level, "", 0, msg, args, exc_info or None, extra=extra
+        )
+        self.logger.handle(record)
+
+
+def get_logger(name: str = "", gateway: str = "") -> GatewayAdapter:
+    logger = logging.getLogger(f"{LOGGER_NAME}.{name}" if name else LOGGER_NAME)
+    return GatewayAdapter(logger, {"gateway": gateway})
+
+
+class TextFormatter(logging.Formatter):
+    """`[gateway][TAG] text` -- the same lines the services used to print."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        gateway = getattr(record, "gateway", "")
+        line = f"[{gateway}]{record.getMessage()}" if gateway else record.getMessage()
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            line += f" (+{suppressed} similar suppressed)"
+        if record.exc_text:
+            line += "\n" + record.exc_text
+        return line
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """One compact JSON object per record; the leading [TAG] becomes a field."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        msg = record.getMessage()
+        out = {"ts": round(record.created, 3), "level": record.levelname}
+        m = _TAG_RE.match(msg)
+        if m:
+            out["tag"] = m.group(1)
+            msg = msg[m.end():]
+        gateway = getattr(record, "gateway", "")
+        if gateway:
+            out["gateway"] = gateway
+        out["msg"] = msg
+        fields = getattr(record, "fields", None)
+        if fields:
+            out.update(fields)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            out["suppressed"] = suppressed
+        if record.exc_text:
+            out["exc"] = record.exc_text
+        return json.dumps(out, separators=(",", ":"), default=str)
+
+
+class _LazyQueueHandler(logging.handlers.QueueHandler):
+    """
+    Enqueue records without formatting them (the stock QueueHandler formats in
+    the caller's thread) and never block: a full queue drops and counts.
+    """
+
+    def __init__(self, q):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record):
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _BufferedStreamHandler(logging.StreamHandler):
+    """StreamHandler that leaves flushing to the listener (once per drained queue)."""
+
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class _DrainingListener(logging.handlers.QueueListener):
+    def __init__(self, q, queue_handler, *handlers):
+        super().__init__(q, *handlers, respect_handler_level=False)
+        self._queue_handler = queue_handler
+        self._reported_drops = 0
+        # Set (plain assignment) from a signal handler; written by this thread.
+        self.notice: Optional[str] = None
+
+    def _warn(self, msg: str):
+        record = logging.makeLogRecord(
+            {"name": LOGGER_NAME, "levelno": logging.WARNING, "levelname": "WARNING", "msg": msg}
+        )
+        self.handle(record)
+
+    def _drained(self):
+        dropped = self._queue_handler.dropped
+        if dropped != self._reported_drops:
+            self._warn(f"[WARN] Log queue full, dropped {dropped - self._reported_drops} records")
+            self._reported_drops = dropped
+        notice, self.notice = self.notice, None
+        if notice:
+            self._warn(notice)
+        for handler in self.handlers:
+            handler.flush()
+
+    def dequeue(self, block):
+        if not block:
+            return self.queue.get(False)
+        if self.queue.empty():
+            self._drained()
+        while True:
+            try:
+                return self.queue.get(timeout=NOTICE_POLL)
+            except queue.Empty:
+                if self.notice:
+                    self._drained()
+
+
+def _open_stream(path: Optional[str]):
+    if path:
+        return open(path, "a", encoding="utf-8", buffering=WRITE_BUFFER)
+    # Own buffered writer on fd 1: PYTHONUNBUFFERED only affects sys.stdout.
+    raw = io.FileIO(1, "w", closefd=False)
+    return io.TextIOWrapper(io.BufferedWriter(raw, WRITE_BUFFER), encoding="utf-8", errors="backslashreplace")
+
+
+class AsyncLogging:
+    """Handle returned by setup_logging(): level control and shutdown."""
+
+    def __init__(self, level: int, queue_handler, listener, stream, owns_stream: bool):
+        self.level = level
+        self.queue_handler = queue_handler
+        self.listener = listener
+        self._stream = stream
+        self._owns_stream = owns_stream
+        self._stopped = False
+
+    def set_level(self, level):
+        logging.getLogger(LOGGER_NAME).setLevel(level)
+
+    def _flip_verbose(self) -> str:
+        logger = logging.getLogger(LOGGER_NAME)
+        verbose = logger.level != logging.DEBUG
+        logger.setLevel(logging.DEBUG if verbose else self.level)
+        return f"[LOG] Verbose tracing {'ON' if verbose else 'OFF'}"
+
+    def toggle_verbose(self, *_):
+        """Switch between the configured level and DEBUG (e.g. loop.add_signal_handler(SIGUSR1, ...))."""
+        logging.getLogger(LOGGER_NAME).warning(self._flip_verbose())
+
+    def _toggle_from_signal(self, *_):
+        # Runs inside a signal.signal handler, possibly while this thread holds
+        # the log queue's mutex: only flip the level and leave the message to
+        # the listener thread.
+        self.listener.notice = self._flip_verbose()
+
+    def install_signal_toggle(self, signum=None):
+        """SIGUSR1 (or signum) toggles verbose tracing for a service without an event loop."""
+        import signal
+
+        signal.signal(signum or signal.SIGUSR1, self._toggle_from_signal)
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        logging.getLogger(LOGGER_NAME).removeHandler(self.queue_handler)
+        self.listener.stop()
+        self._stream.flush()
+        if self._owns_stream:
+            self._stream.close()
+
+
+def setup_logging(
+    level=None,
+    fmt: Optional[str] = None,
+    rate: Optional[float] = None,
+    burst: Optional[int] = None,
+    debug_sample: Optional[int] = None,
+    path: Optional[str] = None,
+    settings: Optional[dict] = None,
+) -> AsyncLogging:
+    """
+    Start the background log writer for the "edge" logger tree.
+
+    Explicit arguments win over the `logging:` section of settings.yaml
+    (level, format, rate, burst, debug_sample, path), then module defaults.
+    """
+    cfg = (settings or {}).get("logging") or {}
+
+    def pick(value, key, default):
+        return value if value is not None else (cfg.get(key) if cfg.get(key) is not None else default)
+
+    level = pick(level, "level", DEFAULT_LEVEL)
+    if isinstance(level, str):
+        level = logging.getLevelName(level.upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+    fmt = str(pick(fmt, "format", DEFAULT_FORMAT)).lower()
+    path = pick(path, "path", None)
+
+    global _limiter
+    _limiter = RateLimiter(
+        rate=float(pick(rate, "rate", DEFAULT_RATE)),
+        burst=int(pick(burst, "burst", DEFAULT_BURST)),
+        debug_sample=int(pick(debug_sample, "debug_sample", DEFAULT_DEBUG_SAMPLE)),
+    )
+
+    q = queue.Queue(QUEUE_SIZE)
+    queue_handler = _LazyQueueHandler(q)
+
+    stream = _open_stream(path)
+    out = _BufferedStreamHandler(stream)
+    out.setFormatter(JsonLinesFormatter() if fmt == "json" else TextFormatter())
+
+    listener = _DrainingListener(q, queue_handler, out)
+    listener.start()
+
+    logger = logging.getLogger(LOGGER_NAME)
+    logger.setLevel(level)
+    logger.propagate = False
+    logger.addHandler(queue_handler)
+
+    runtime = AsyncLogging(level, queue_handler, listener, stream, owns_stream=bool(path))
+    atexit.register(runtime.stop)
+    return runtime
@@ -0,0 +1,233 @@
+import bisect
+import threading
+import time
+from typing import Dict, List, Optional
+
+from core.stage_timer import STAGES
+
+# In-process metrics for the inference loop, exported in Prometheus text format.
+#
+# GatewayMetrics has the same record(stage, seconds) interface as
+# core.stage_timer.StageRecorder (plus count(event, n) and gauge(name, value)),
+# so it plugs into GatewayController as its profiler. Updates are plain
+# list/dict writes without locks: each stage/event is written by one thread
+# (the event loop, or one stage of the single-port pipeline); the HTTP
+# endpoint only reads them from its own thread, so the serial loop never
+# waits on a scrape.
+
+# Latency buckets (seconds): 10 us .. 1 s, Prometheus `le` upper bounds.
+LATENCY_BUCKETS = (
+    10e-6, 25e-6, 50e-6, 100e-6, 250e-6, 500e-6,
+    1e-3, 2.5e-3, 5e-3, 10e-3, 25e-3, 50e-3, 100e-3, 250e-3, 1.0,
+)
+
+METRICS_HOST = "127.0.0.1"
+METRICS_PORT = 9108
+
+# count(event) name -> (metric, label, help)
+EVENTS = {
+    "line_telemetry": ("edge_lines_total", 'kind="telemetry"', "Framed lines by outcome"),
+    "line_partial": ("edge_lines_total", 'kind="partial"', "Framed lines by outcome"),
+    "line_non_telemetry": ("edge_lines_total", 'kind="non_telemetry"', "Framed lines by outcome"),
+    "line_empty": ("edge_lines_total", 'kind="empty"', "Framed lines by outcome"),
+    "dropped_bytes": ("edge_dropped_bytes_total", "", "Bytes discarded by the line framer (over-long lines)"),
+    "cmd_WATER_ON": ("edge_commands_total", 'decision="WATER_ON"', "CMD replies by decision"),
+    "cmd_WATER_OFF": ("edge_commands_total", 'decision="WATER_OFF"', "CMD replies by decision"),
+    "dose_predictions": ("edge_dose_predictions_total", "", "Dose model predictions"),
+    "dose_cache_hits": ("edge_dose_cache_total", 'result="hit"', "Dose predictions by prediction cache outcome"),
+    "dose_cache_misses": ("edge_dose_cache_total", 'result="miss"', "Dose predictions by prediction cache outcome"),
+    "tx_errors": ("edge_tx_errors_total", "", "Failed CMD writes"),
+    "reconnects": ("edge_reconnects_total", "", "Serial port (re)open attempts after an error"),
+    "shadow_skipped": ("edge_shadow_skipped_total", "", "Samples not shadow-evaluated (too many in flight)"),
+    "shadow_errors": ("edge_shadow_errors_total", "", "Shadow candidate prediction failures"),
+    "rx_queue_full": ("edge_queue_full_total", 'queue="rx"', "Puts that found a pipeline queue full (backpressure)"),
+    "tx_queue_full": ("edge_queue_full_total", 'queue="tx"', "Puts that found a pipeline queue full (backpressure)"),
+    "rx_queue_dropped": ("edge_queue_dropped_total", 'queue="rx"', "Items discarded by a full pipeline queue"),
+    "tx_queue_dropped": ("edge_queue_dropped_total", 'queue="tx"', "Items discarded by a full pipeline queue"),
+}
+
+# gauge(name) name -> (metric, label, help); exported once set.
+GAUGES = {
+    "rx_queue_depth": ("edge_queue_depth", 'queue="rx"', "Items waiting in a pipeline queue (core/pipeline.py)"),
+    "tx_queue_depth": ("edge_queue_depth", 'queue="tx"', "Items waiting in a pipeline queue (core/pipeline.py)"),
+    "rx_queue_depth_max": ("edge_queue_depth_max", 'queue="rx"', "High-water mark of a pipeline queue"),
+    "tx_queue_depth_max": ("edge_queue_depth_max", 'queue="tx"', "High-water mark of a pipeline queue"),
+}
+
+
+class Histogram:
+    """Fixed-bucket histogram (non-cumulative counts; cumulated on export)."""
+
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds=LATENCY_BUCKETS):
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)  # last = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class GatewayMetrics:
+    """Per-gateway stage histograms and event counters (profiler interface)."""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.stages: Dict[str, Histogram] = {stage: Histogram() for stage in STAGES}
+        self.events: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float):
+        hist = self.stages.get(stage)
+        if hist is None:
+            hist = self.stages[stage] = Histogram()
+        hist.observe(seconds)
+
+    def count(self, event: str, n: int = 1):
+        self.events[event] = self.events.get(event, 0) + n
+
+    def gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+
+def _labels(*parts: str) -> str:
+    parts = [p for p in parts if p]
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class ServiceMetrics:
+    """Registry of GatewayMetrics plus the Prometheus text rendering."""
+
+    def __init__(self):
+        self.start_time = time.time()
+        self._gateways: Dict[str, GatewayMetrics] = {}
+        self._lock = threading.Lock()
+
+    def gateway(self, name: str = "") -> GatewayMetrics:
+        with self._lock:
+            gw = self._gateways.get(name)
+            if gw is None:
+                gw = self._gateways[name] = GatewayMetrics(name)
+            return gw
+
+    def render(self) -> str:
+        with self._lock:
+            gateways = list(self._gateways.values())
+
+        out: List[str] = [
+            "# HELP edge_start_time_seconds Service start time (unix seconds)",
+            "# TYPE edge_start_time_seconds gauge",
+            f"edge_start_time_seconds {self.start_time:.3f}",
+            "# HELP edge_stage_seconds Latency of each stage of the receive -> decide -> reply loop",
+            "# TYPE edge_stage_seconds histogram",
+        ]
+
+        for gw in gateways:
+            gw_label = f'gateway="{gw.name}"' if gw.name else ""
+            for stage, hist in list(gw.stages.items()):
+                counts = list(hist.counts)
+                total, acc = sum(counts), 0
+                base = f'stage="{stage}"'
+                for bound, n in zip(hist.bounds, counts):
+                    acc += n
+                    le = 'le="%g"' % bound
+                    out.append(f"edge_stage_seconds_bucket{_labels(gw_label, base, le)} {acc}")
+                le = 'le="+Inf"'
+                out.append(f"edge_stage_seconds_bucket{_labels(gw_label, base, le)} {total}")
+                out.append(f"edge_stage_seconds_sum{_labels(gw_label, base)} {hist.sum:.9f}")
+                out.append(f"edge_stage_seconds_count{_labels(gw_label, base)} {total}")
+
+        # Counters: every known event is exported (as 0 until it happens), so
+        # rate() and absence alerts work from the first scrape.
+        by_metric: Dict[str, List[str]] = {}
+        helps: Dict[str, str] = {}
+        for gw in gateways:
+            gw_label = f'gateway="{gw.name}"' if gw.name else ""
+            events = dict(gw.events)
+            for event in {**dict.fromkeys(EVENTS), **events}:
+                metric, label, help_text = EVENTS.get(event, (f"edge_{event}_total", "", event))
+                helps[metric] = help_text
+                by_metric.setdefault(metric, []).append(
+                    f"{metric}{_labels(gw_label, label)} {events.get(event, 0)}"
+                )
+
+        for metric, lines in by_metric.items():
+            out.append(f"# HELP {metric} {helps[metric]}")
+            out.append(f"# TYPE {metric} counter")
+            out.extend(lines)
+
+        by_metric, helps = {}, {}
+        for gw in gateways:
+            gw_label = f'gateway="{gw.name}"' if gw.name else ""
+            for name, value in dict(gw.gauges).items():
+                metric, label, help_text = GAUGES.get(name, (f"edge_{name}", "", name))
+                helps[metric] = help_text
+                by_metric.setdefault(metric, []).append(f"{metric}{_labels(gw_label, label)} {value:g}")
+
+        for metric, lines in by_metric.items():
+            out.append(f"# HELP {metric} {helps[metric]}")
+            out.append(f"# TYPE {metric} gauge")
+            out.extend(lines)
+
+        return "\n".join(out) + "\n"
+
+
+class MetricsServer:
+    """GET /metrics on a daemon thread (localhost by default)."""
+
+    def __init__(self, metrics: ServiceMetrics, host: str = METRICS_HOST, port: int = METRICS_PORT):
+        # http.server pulls in email/html (~50 ms): only imported when serving.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?", 1)[0] not in ("/metrics", "/"):
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):  # keep scrapes out of the service log
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.httpd.daemon_threads = True
+        self.address = self.httpd.server_address
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics-http", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def start_metrics_server(metrics: ServiceMetrics, settings: Optional[dict] = None, port: Optional[int] = None, log=None):
+    """
+    Start the endpoint from the `metrics:` section of settings.yaml (host, port;
+    port 0 disables it). Returns the server, or None when disabled/unavailable.
+    """
+    cfg = (settings or {}).get("metrics") or {}
+    host = cfg.get("host") or METRICS_HOST
+    if port is None:
+        port = cfg.get("port")
+    try:
+        port = METRICS_PORT if port is None else int(port)
+        if port <= 0:
+            return None
+        server = MetricsServer(metrics, host, port)
+    except (OSError, ValueError) as e:
+        # Metrics are optional: never keep the control loop from starting.
+        if log is not None:
+            log.warning("[WARN] Metrics endpoint disabled (%s:%s): %s", host, port, e)
+        return None
+    if log is not None:
+        log.info("[INFO] Metrics: http://%s:%d/metrics", host, port)
+    return server
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from typing import Callable, Optional, Sequence, Tuple
+
+from core.log import get_logger
+
+# Hot swap of model artefacts without stopping the serial loop.
+#
+# A daemon thread polls the watched files (size + mtime; inotify is not in
+# the standard library and mtime polling also works on network mounts).
+# Once a change has settled (no further writes for `settle_seconds`, so a
+# half-copied file is not loaded), it calls `load()` and `validate()` on the
+# same background thread. Only a candidate that passes both is published:
+# `generation` is bumped and `current()` returns it. Controllers compare
+# `generation` between samples and switch on their own thread, so a sample is
+# always handled by exactly one model.
+#
+# A candidate that fails to load or validate is dropped and the running model
+# stays (it is retried once the files change again).
+
+POLL_SECONDS = 5.0
+SETTLE_SECONDS = 2.0
+
+log = get_logger("models")
+
+Signature = Tuple[Tuple[str, Optional[int], Optional[int]], ...]
+
+
+def file_signature(paths: Sequence[str]) -> Signature:
+    """(path, size, mtime_ns) per file; (path, None, None) when missing."""
+    out = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+        except OSError:
+            out.append((path, None, None))
+        else:
+            out.append((path, st.st_size, st.st_mtime_ns))
+    return tuple(out)
+
+
+class ModelManager:
+    """Watches artefact files and publishes validated reloads (see module comment)."""
+
+    def __init__(
+        self,
+        paths: Sequence[str],
+        load: Callable[[], object],
+        validate: Optional[Callable[[object], object]] = None,
+        poll_seconds: float = POLL_SECONDS,
+        settle_seconds: float = SETTLE_SECONDS,
+        name: str = "model",
+    ):
+        self.paths = list(paths)
+        self.load = load
+        self.validate = validate
+        self.poll_seconds = float(poll_seconds)
+        self.settle_seconds = float(settle_seconds)
+        self.name = name
+
+        # generation 0 = whatever the service loaded at startup
+        self.generation = 0
+        self.reloads = 0
+        self.rejected = 0
+        self._artifact = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self._loaded_sig = file_signature(self.paths)
+        self._seen_sig = self._loaded_sig
+        self._changed_at = 0.0
+
+    def current(self):
+        """(generation, artifact) of the latest validated reload (artifact None at generation 0)."""
+        with self._lock:
+            return self.generation, self._artifact
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=f"{self.name}-watch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def check(self, now: Optional[float] = None) -> bool:
+        """One poll step; True when a new generation was published."""
+        now = time.monotonic() if now is None else now
+        sig = file_signature(self.paths)
+        if sig == self._loaded_sig:
+            self._seen_sig = sig
+            return False
+        if sig != self._seen_sig:
+            # Still being written (or just changed): wait for it to settle.
+            self._seen_sig = sig
+            self._changed_at = now
+            return False
+        if now - self._changed_at < self.settle_seconds:
+            return False
+
+        self._loaded_sig = sig
+        t0 = time.perf_counter()
+        try:
+            artifact = self.load()
+            detail = self.validate(artifact) if self.validate is not None else None
+        except Exception as e:
+            self.rejected += 1
+            log.error(
+                "[MODEL] Rejected new %s (%s: %s); keeping generation %d",
+                self.name, type(e).__name__, e, self.generation,
+            )
+            return False
+
+        with self._lock:
+            self._artifact = artifact
+            self.generation += 1
+            self.reloads += 1
+            generation = self.generation
+        log.info(
+            "[MODEL] New %s validated in %.2f s -> generation %d%s",
+            self.name, time.perf_counter() - t0, generation,
+            f" ({detail})" if detail else "",
+        )
+        return True
+
+    def _run(self):
+        while not self._stop.wait(self.poll_seconds):
+            try:
+                self.check()
+            except Exception as e:  # never let the watcher die silently
+                log.error("[MODEL] Watcher error: %s", e)
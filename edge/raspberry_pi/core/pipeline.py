@@ -0,0 +1,124 @@
+import threading
+from collections import deque
+
+# Bounded hand-off queue between the threads of the single-port service
+# (reader -> inference worker -> TX), with an explicit overflow policy:
+#
+# - "block": the producer waits for room. For the line queue this is the
+#   lossless choice: the reader stops reading, so the burst stays in the
+#   rfcomm/kernel buffers and Bluetooth flow control slows the ESP32 down.
+# - "drop_oldest": the oldest queued item is discarded to make room, so the
+#   consumer always works on the freshest data (e.g. when live samples matter
+#   more than a backlog; a dropped line never gets its CMD reply).
+#
+# Items move in batches (put_many / get_batch): one lock round trip and one
+# thread wake-up per read chunk rather than per line.
+#
+# Depth is reported as gauges ("<name>_queue_depth" and the high-water mark
+# "<name>_queue_depth_max"), overflows as the counters "<name>_queue_full"
+# (producer found the queue full) and "<name>_queue_dropped" (items discarded).
+
+BLOCK = "block"
+DROP_OLDEST = "drop_oldest"
+POLICIES = (BLOCK, DROP_OLDEST)
+
+
+class StageQueue:
+    """Single-producer / single-consumer bounded queue (see module comment)."""
+
+    def __init__(self, maxsize: int, policy: str = BLOCK, name: str = "rx", profiler=None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r} (expected one of {POLICIES})")
+        if maxsize < 1:
+            raise ValueError("maxsize must be >= 1")
+        self.maxsize = int(maxsize)
+        self.policy = policy
+        self.name = name
+        self.profiler = profiler
+
+        self.closed = False
+        self.depth_max = 0
+        self.full = 0
+        self.dropped = 0
+
+        self._items = deque()
+        lock = threading.Lock()
+        self._not_empty = threading.Condition(lock)
+        self._not_full = threading.Condition(lock)
+
+    def __len__(self):
+        return len(self._items)
+
+    def put(self, item) -> bool:
+        """Queue `item`; False when the queue was closed while waiting for room."""
+        return self.put_many((item,))
+
+    def put_many(self, items) -> bool:
+        """
+        Queue `items` in order with a single wake-up of the consumer (one read
+        chunk of lines). False when the queue was closed while waiting for room.
+        """
+        prof = self.profiler
+        put = 0
+        with self._not_full:
+            for item in items:
+                if len(self._items) >= self.maxsize:
+                    self.full += 1
+                    if prof is not None:
+                        prof.count(f"{self.name}_queue_full")
+                    if self.policy == DROP_OLDEST:
+                        self._items.popleft()
+                        self.dropped += 1
+                        if prof is not None:
+                            prof.count(f"{self.name}_queue_dropped")
+                    else:
+                        self._track(len(self._items))
+                        if put:
+                            self._not_empty.notify()  # let the consumer make room
+                            put = 0
+                        while len(self._items) >= self.maxsize and not self.closed:
+                            self._not_full.wait()
+                if self.closed:
+                    return False
+                self._items.append(item)
+                put += 1
+            self._track(len(self._items))
+            if put:
+                self._not_empty.notify()
+        return True
+
+    def get_batch(self, limit: int = 0) -> list:
+        """
+        Every queued item (at most `limit` when > 0), waiting for at least one;
+        [] once the queue is closed and drained.
+        """
+        with self._not_empty:
+            while not self._items:
+                if self.closed:
+                    return []
+                self._not_empty.wait()
+            items = self._items
+            if limit <= 0 or len(items) <= limit:
+                batch = list(items)
+                items.clear()
+            else:
+                batch = [items.popleft() for _ in range(limit)]
+            self._not_full.notify()
+            self._track(len(items))
+        return batch
+
+    def _track(self, depth: int):
+        prof = self.profiler
+        if prof is None:
+            return
+        prof.gauge(f"{self.name}_queue_depth", depth)
+        if depth > self.depth_max:
+            self.depth_max = depth
+            prof.gauge(f"{self.name}_queue_depth_max", depth)
+
+    def close(self):
+        """No more puts; get_batch() drains what is left, then returns []."""
+        with self._not_empty:
+            self.closed = True
+            self._not_empty.notify_all()
+            self._not_full.notify_all()
@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+
+# Memoization in front of the dose regressor.
+#
+# While watering_state stays True the service predicts on every sample, and
+# the PRE window often barely moves between consecutive samples. The
+# continuous prediction is cached per key with bounded LRU eviction.
+#
+# For tree ensembles (the compiled forest, a scikit-learn forest) the key is
+# the split cell of the row: per feature, which side of each of the model's
+# thresholds the value falls on. Rows in the same cell take the same path
+# through every tree, so a cached answer is exactly the forest's own while
+# rows far apart in value still share entries (the prod forest splits each
+# feature at no more than a handful of thresholds). Other models fall back to
+# snapping every value to a multiple of `quantum`, which only merges rows that
+# differ by rounding noise.
+#
+# Entries belong to one model object: predict() with a different model (hot
+# swap, late load) drops them first.
+
+CACHE_SIZE = 256
+QUANTUM = 1e-3
+
+
+def split_edges(model) -> Optional[np.ndarray]:
+    """
+    Split thresholds per feature as an (n_features, k) float32 array padded
+    with +inf, or None when `model` is not a tree ensemble we can read.
+    """
+    if hasattr(model, "threshold") and hasattr(model, "feature") and hasattr(model, "n_features_in_"):
+        # core.dose_model.CompiledForest: leaves carry an +inf threshold
+        pairs = [(model.feature, model.threshold)]
+        n_features = model.n_features_in_
+    elif hasattr(model, "estimators_") and hasattr(model, "n_features_in_"):
+        trees = [getattr(est, "tree_", None) for est in model.estimators_]
+        if any(tree is None for tree in trees):
+            return None
+        pairs = [(tree.feature, tree.threshold) for tree in trees]
+        n_features = model.n_features_in_
+    else:
+        return None
+
+    per_feature = [[] for _ in range(int(n_features))]
+    for feature, threshold in pairs:
+        feature = np.asarray(feature)
+        threshold = np.asarray(threshold, dtype=np.float64)
+        split = (feature >= 0) & np.isfinite(threshold)
+        for j, t in zip(feature[split], threshold[split]):
+            per_feature[j].append(t)
+    uniq = [np.unique(ts) for ts in per_feature]
+    edges = np.full((len(uniq), max((len(u) for u in uniq), default=0)), np.inf)
+    for j, u in enumerate(uniq):
+        edges[j, : len(u)] = u
+    # Inputs are float32: x <= t exactly when x <= the largest float32 <= t,
+    # and a float32 comparison needs no casting buffer.
+    edges32 = edges.astype(np.float32)
+    above = edges32 > edges
+    edges32[above] = np.nextafter(edges32[above], np.float32(-np.inf))
+    return edges32
+
+
+class PredictionCache:
+    """Bounded LRU of model.predict(row)[0] keyed on the row's split cell (or quantized row)."""
+
+    def __init__(self, maxsize: int = CACHE_SIZE, quantum: float = QUANTUM):
+        if maxsize <= 0:
+            raise ValueError("Cache size must be positive")
+        if quantum <= 0:
+            raise ValueError("Quantum must be positive")
+        self.maxsize = int(maxsize)
+        self.quantum = float(quantum)
+        self._inv = 1.0 / self.quantum
+        self._entries = OrderedDict()
+        self._model = None
+        self._edges = None  # split_edges() of _model
+        self._cell_scratch = None
+        self._scratch = None
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def key(self, X) -> bytes:
+        """Split cell (or quantized values) of one feature row ((n,) or (1, n)) as bytes."""
+        edges = self._edges
+        if edges is not None:
+            # Trees compare the float32 value with `value <= threshold`, so the
+            # outcome against every threshold of its feature is the cell (NaN
+            # always goes right, like in the trees). The buffers are
+            # preallocated: a broadcasting comparison allocates on every call.
+            column, values, cell = self._cell_scratch
+            np.copyto(column, np.reshape(X, (-1, 1)), casting="same_kind")
+            np.copyto(values, column)
+            np.less_equal(values, edges, out=cell)
+            return cell.tobytes()
+
+        X = np.asarray(X, dtype=float)
+        scratch = self._scratch
+        if scratch is None or scratch.shape != X.shape:
+            scratch = self._scratch = np.empty(X.shape, dtype=float)
+        np.multiply(X, self._inv, out=scratch)
+        np.rint(scratch, out=scratch)
+        scratch += 0.0  # -0.0 -> 0.0, same key
+        return scratch.tobytes()
+
+    def invalidate(self):
+        """Forget every entry (the model they came from is gone)."""
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._model = None
+        self._edges = None
+
+    def predict(self, model, X) -> float:
+        """model.predict(X)[0] for a single row, served from the cache when possible."""
+        if model is not self._model:
+            self.invalidate()
+            self._model = model
+            edges = self._edges = split_edges(model)
+            if edges is not None:
+                self._cell_scratch = (
+                    np.empty((edges.shape[0], 1), dtype=np.float32),
+                    np.empty(edges.shape, dtype=np.float32),
+                    np.empty(edges.shape, dtype=bool),
+                )
+
+        key = self.key(X)
+        entries = self._entries
+        value = entries.get(key)
+        if value is not None:
+            entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        value = float(model.predict(X)[0])
+        entries[key] = value
+        if len(entries) > self.maxsize:
+            entries.popitem(last=False)
+            self.evictions += 1
+        return value
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -0,0 +1,235 @@
+import math
+from collections import deque
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+# Channels kept in the PRE window, in the order used by the feature contract.
+CHANNELS = ("soil1", "soil2", "soil_avg", "soil_diff", "temperature", "humidity")
+
+# Snapshot features read from the newest sample ("*_at_event" in the contract).
+AT_EVENT_CHANNELS = {
+    "soil_avg_at_event": "soil_avg",
+    "soil_diff_at_event": "soil_diff",
+    "temp_at_event": "temperature",
+    "humidity_at_event": "humidity",
+}
+
+# Plan opcodes (one per output column)
+_OP_MEAN, _OP_STD, _OP_MIN, _OP_MAX, _OP_AT_EVENT, _OP_DELTA = range(6)
+
+# Running moments are recomputed from the ring buffer every RESYNC_WRAPS full
+# passes so floating point drift cannot accumulate on long-running services.
+RESYNC_WRAPS = 64
+
+
+class RollingWindow:
+    """
+    Fixed-size PRE window with O(1) updates for the dose model features.
+
+    Each channel keeps a preallocated ring buffer, a running mean and sum of
+    squared deviations (rolling Welford), and monotonic index queues for
+    min/max. `features()` fills
+    a preallocated (1, n_features) float array in the exact order given by the
+    feature contract (rf_dose_features_prod.json), so the hot path does not
+    build dicts, lists or NumPy arrays per sample.
+
+    Statistics match build_training_set.py (population std, ddof=0).
+    """
+
+    def __init__(self, size: int, feature_names: Sequence[str]):
+        if size <= 0:
+            raise ValueError("Window size must be positive")
+
+        self.size = int(size)
+        self.feature_names: List[str] = list(feature_names)
+
+        n_ch = len(CHANNELS)
+        self._buf = [[0.0] * self.size for _ in range(n_ch)]
+        self._run_mean = [0.0] * n_ch
+        self._m2 = [0.0] * n_ch
+        self._minq = [deque() for _ in range(n_ch)]
+        self._maxq = [deque() for _ in range(n_ch)]
+        self._seq = 0  # total number of samples appended
+        self._resync_every = self.size * RESYNC_WRAPS
+
+        # Per-call scratch (reused, never reallocated)
+        self._mean = [0.0] * n_ch
+        self._std = [0.0] * n_ch
+        self._min = [0.0] * n_ch
+        self._max = [0.0] * n_ch
+
+        self._plan = self._compile(self.feature_names)
+        self._row = np.zeros((1, len(self.feature_names)), dtype=float)
+        self._flat = self._row.reshape(-1)
+
+    # ------------------------------------------------------------------ #
+    @staticmethod
+    def _compile(feature_names):
+        """Translate feature names into (opcode, channel index) pairs."""
+        ch_index = {name: i for i, name in enumerate(CHANNELS)}
+        ops = {
+            "mean": _OP_MEAN,
+            "std": _OP_STD,
+            "min": _OP_MIN,
+            "max": _OP_MAX,
+        }
+
+        plan = []
+        unknown = []
+        for name in feature_names:
+            if name in AT_EVENT_CHANNELS:
+                plan.append((_OP_AT_EVENT, ch_index[AT_EVENT_CHANNELS[name]]))
+                continue
+            if name == "delta_soil_avg_min_vs_pre_mean":
+                plan.append((_OP_DELTA, ch_index["soil_avg"]))
+                continue
+
+            base, sep, stat = name.rpartition("_pre_")
+            if sep and base in ch_index and stat in ops:
+                plan.append((ops[stat], ch_index[base]))
+            else:
+                unknown.append(name)
+
+        if unknown:
+            raise ValueError(f"Unsupported dose features for rolling window: {unknown}")
+        return tuple(plan)
+
+    # ------------------------------------------------------------------ #
+    def __len__(self) -> int:
+        return min(self._seq, self.size)
+
+    @property
+    def is_full(self) -> bool:
+        return self._seq >= self.size
+
+    def clear(self):
+        self._seq = 0
+        for ch in range(len(CHANNELS)):
+            self._run_mean[ch] = 0.0
+            self._m2[ch] = 0.0
+            self._minq[ch].clear()
+            self._maxq[ch].clear()
+
+    def append(self, soil1, soil2, soil_avg, soil_diff, temperature, humidity):
+        """Push one sample (values in CHANNELS order)."""
+        seq = self._seq
+        size = self.size
+        slot = seq % size
+        full = seq >= size
+        expired = seq - size
+
+        for ch, x in enumerate(
+            (soil1, soil2, soil_avg, soil_diff, temperature, humidity)
+        ):
+            buf = self._buf[ch]
+
+            # Rolling Welford update: numerically stable running mean and
+            # sum of squared deviations (no large sum/sumsq cancellation).
+            mean = self._run_mean[ch]
+            if full:
+                old = buf[slot]
+                new_mean = mean + (x - old) / size
+                self._m2[ch] += (x - old) * (x - new_mean + old - mean)
+            else:
+                new_mean = mean + (x - mean) / (seq + 1)
+                self._m2[ch] += (x - mean) * (x - new_mean)
+            self._run_mean[ch] = new_mean
+
+            buf[slot] = x
+
+            minq = self._minq[ch]
+            while minq and minq[0] <= expired:
+                minq.popleft()
+            while minq and buf[minq[-1] % size] >= x:
+                minq.pop()
+            minq.append(seq)
+
+            maxq = self._maxq[ch]
+            while maxq and maxq[0] <= expired:
+                maxq.popleft()
+            while maxq and buf[maxq[-1] % size] <= x:
+                maxq.pop()
+            maxq.append(seq)
+
+        self._seq = seq + 1
+        if self._seq % self._resync_every == 0:
+            self._resync()
+
+    def _resync(self):
+        """Recompute running moments exactly from the buffer (amortised O(1))."""
+        n = len(self)
+        for ch in range(len(CHANNELS)):
+            values = self._buf[ch][:n]
+            mean = math.fsum(values) / n
+            self._run_mean[ch] = mean
+            self._m2[ch] = math.fsum((x - mean) * (x - mean) for x in values)
+
+    # ------------------------------------------------------------------ #
+    def snapshot(self) -> List[Tuple[float, ...]]:
+        """Samples currently in the window, oldest first (values in CHANNELS order)."""
+        n = len(self)
+        size = self.size
+        start = self._seq - n
+        return [
+            tuple(buf[(start + i) % size] for buf in self._buf)
+            for i in range(n)
+        ]
+
+    def restore(self, samples: Sequence[Sequence[float]]):
+        """Reset the window to `samples` (oldest first; only the last `size` are kept)."""
+        samples = list(samples)[-self.size:]
+        for sample in samples:
+            if len(sample) != len(CHANNELS):
+                raise ValueError(f"Expected {len(CHANNELS)} values per sample, got {len(sample)}")
+        self.clear()
+        for sample in samples:
+            self.append(*(float(x) for x in sample))
+
+    # ------------------------------------------------------------------ #
+    def latest(self, channel: str) -> float:
+        if self._seq == 0:
+            raise ValueError("Rolling window is empty")
+        ch = CHANNELS.index(channel)
+        return self._buf[ch][(self._seq - 1) % self.size]
+
+    def features(self) -> np.ndarray:
+        """
+        Return the (1, n_features) feature row for the current window.
+
+        The at-event snapshot is the newest sample. The returned array is
+        reused between calls: copy it if it must outlive the next append().
+        """
+        n = len(self)
+        if n == 0:
+            raise ValueError("Rolling window is empty")
+
+        size = self.size
+        last = (self._seq - 1) % size
+        for ch in range(len(CHANNELS)):
+            buf = self._buf[ch]
+            lo = buf[self._minq[ch][0] % size]
+            hi = buf[self._maxq[ch][0] % size]
+            var = self._m2[ch] / n
+            self._mean[ch] = self._run_mean[ch]
+            # A flat window has exactly zero spread; don't report rounding residue.
+            self._std[ch] = math.sqrt(var) if (var > 0.0 and hi > lo) else 0.0
+            self._min[ch] = lo
+            self._max[ch] = hi
+
+        out = self._flat
+        for j, (op, ch) in enumerate(self._plan):
+            if op == _OP_MEAN:
+                out[j] = self._mean[ch]
+            elif op == _OP_STD:
+                out[j] = self._std[ch]
+            elif op == _OP_MIN:
+                out[j] = self._min[ch]
+            elif op == _OP_MAX:
+                out[j] = self._max[ch]
+            elif op == _OP_AT_EVENT:
+                out[j] = self._buf[ch][last]
+            else:  # _OP_DELTA
+                out[j] = self._min[ch] - self._mean[ch]
+
+        return self._row
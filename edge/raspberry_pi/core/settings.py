@@ -0,0 +1,48 @@
+import os
+import re
+
+import yaml
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SETTINGS_PATH = os.path.join(BASE_DIR, "config", "settings.yaml")
+
+_UNRESOLVED = re.compile(r"\$\{[^}]*\}")
+
+
+def _drop_unresolved(node):
+    """Turn placeholders with no matching environment variable into None."""
+    if isinstance(node, dict):
+        return {k: _drop_unresolved(v) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_drop_unresolved(v) for v in node]
+    if isinstance(node, str) and _UNRESOLVED.search(node):
+        return None
+    return node
+
+
+def load_settings(path: str = SETTINGS_PATH) -> dict:
+    """
+    Load config/settings.yaml, expanding ${VAR} placeholders from the
+    environment. Missing file -> empty dict; unset variables -> None.
+    """
+    if not os.path.exists(path):
+        return {}
+
+    with open(path, "r", encoding="utf-8") as f:
+        text = os.path.expandvars(f.read())
+
+    return _drop_unresolved(yaml.safe_load(text) or {})
+
+
+def get_section(settings: dict, name: str) -> dict:
+    section = settings.get(name)
+    return section if isinstance(section, dict) else {}
+
+
+def as_list(value):
+    """Accept either a YAML list or a comma-separated string."""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [v.strip() for v in value.split(",") if v.strip()]
+    return [str(v) for v in value]
@@ -0,0 +1,485 @@
+import json
+import math
+import os
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from time import perf_counter
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+from core.log import get_logger
+from core.telemetry_store import gateway_dir
+
+# Shadow evaluation: candidate models run on live samples next to the
+# production controller, without ever touching the CMD that is sent.
+#
+# The controller hands every parsed sample (plus the live decision, the seconds
+# sent and, while watering, the PRE-window feature row) to ShadowEvaluator.submit,
+# which only enqueues it on a small thread pool and returns. A worker runs each
+# candidate on the sample, times it and appends one fixed-size record per
+# (sample, candidate) to a compact log. At most `max_pending` samples are in
+# flight; beyond that samples are skipped and counted, so a slow candidate can
+# never build up a backlog or memory.
+#
+# Threads rather than processes: TFLite invoke() and the NumPy forest release
+# the GIL for the heavy part, and all workers share one loaded copy of each
+# model (a process pool would hold every candidate once per worker on the Pi).
+# Each candidate has its own lock (TFLite interpreters are not thread-safe).
+#
+# Candidates are loaded by the first worker task, off the service start path.
+#
+# Candidate kinds (settings: "kind[:path[:extra]]"):
+#   tflite_onoff   ON/OFF TinyML model (extra = MinMaxScaler joblib);
+#                  features [soil1, soil2, soil_max, temperature, humidity, light]
+#   decision_tree  scikit-learn ON/OFF classifier (extra = MinMaxScaler joblib);
+#                  features [soil1, soil2, temperature, humidity, light]
+#   dose           dose regressor (.npz compiled forest or joblib; extra =
+#                  features JSON, default: the live contract); only run on
+#                  WATER_ON samples with a full PRE window
+#
+# Log: <root>/<gateway>/YYYYMMDD.shd (UTC day of the sample) =
+#   8-byte magic | u4 header length | JSON header {"version", "models"} | records
+# Record (little-endian, 24 bytes):
+#   ts f8 | seq u4 | model u1 | live u1 (1 = WATER_ON) | live_sec u1 | agree u1 |
+#   pred f4 (ON probability or dose seconds) | latency_us f4
+# A file whose header lists other models is never appended to: the next free
+# YYYYMMDD-N.shd is used instead.
+
+WORKERS = 2
+MAX_PENDING = 64
+FLUSH_SECONDS = 60.0
+
+ON_THRESHOLD = 0.5
+ALLOWED_SECONDS = (8.0, 14.0, 18.0, 24.0)
+
+MAGIC = b"EDGESHD1"
+VERSION = 1
+LOG_SUFFIX = ".shd"
+
+_RECORD = struct.Struct("<dIBBBBff")
+_HEADER_LEN = struct.Struct("<I")
+
+EDGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))  # .../edge/raspberry_pi
+REPO_ROOT = os.path.dirname(os.path.dirname(EDGE_DIR))
+
+DEFAULT_PATHS = {
+    "tflite_onoff": (
+        os.path.join(EDGE_DIR, "model", "onoff", "model.tflite"),
+        os.path.join(EDGE_DIR, "model", "onoff", "scaler.joblib"),
+    ),
+    "decision_tree": (
+        os.path.join(REPO_ROOT, "models", "baseline_decision_tree.joblib"),
+        os.path.join(REPO_ROOT, "models", "minmax_scaler.joblib"),
+    ),
+    "dose": (
+        os.path.join(EDGE_DIR, "model", "dose", "rf_dose_regressor_prod.npz"),
+        None,
+    ),
+}
+
+log = get_logger("shadow")
+
+
+def record_dtype():
+    """NumPy structured dtype matching the on-disk record."""
+    import numpy as np
+
+    return np.dtype(
+        [
+            ("ts", "<f8"),
+            ("seq", "<u4"),
+            ("model", "u1"),
+            ("live", "u1"),
+            ("live_sec", "u1"),
+            ("agree", "u1"),
+            ("pred", "<f4"),
+            ("latency_us", "<f4"),
+        ]
+    )
+
+
+class ShadowJob(NamedTuple):
+    ts: float
+    seq: int
+    sample: Tuple[float, float, float, float, float]  # soil1, soil2, temperature, humidity, light
+    live_on: bool
+    live_sec: int
+    X: object = None  # (1, n) PRE-window feature row (own copy), or None
+    feature_names: Optional[Sequence[str]] = None
+
+
+# --------------------------------------------------------------------------- #
+# Candidates
+# --------------------------------------------------------------------------- #
+class Candidate:
+    """One shadow model: predict(job) -> float, or None when it does not apply."""
+
+    kind = ""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.lock = threading.Lock()
+
+    def predict(self, job: ShadowJob) -> Optional[float]:
+        raise NotImplementedError
+
+    def agrees(self, pred: float, job: ShadowJob) -> bool:
+        return (pred >= ON_THRESHOLD) == job.live_on
+
+
+class TFLiteOnOff(Candidate):
+    kind = "onoff"
+
+    def __init__(self, name: str, model_path: str, scaler_path: str):
+        super().__init__(name)
+        from core.edge_model import EdgeIrrigationModel
+
+        self.model = EdgeIrrigationModel(model_path=model_path, scaler_path=scaler_path)
+
+    def predict(self, job):
+        s1, s2, temperature, humidity, light = job.sample
+        prob, _ = self.model.predict((s1, s2, max(s1, s2), temperature, humidity, light))
+        return prob
+
+
+class SklearnOnOff(Candidate):
+    kind = "onoff"
+
+    def __init__(self, name: str, model_path: str, scaler_path: Optional[str] = None):
+        super().__init__(name)
+        import joblib
+
+        self.model = joblib.load(model_path)
+        self.scaler = joblib.load(scaler_path) if scaler_path else None
+
+    def predict(self, job):
+        import numpy as np
+
+        X = np.asarray([job.sample], dtype=float)
+        if self.scaler is not None:
+            X = self.scaler.transform(X)
+        if hasattr(self.model, "predict_proba"):
+            return float(self.model.predict_proba(X)[0, -1])
+        return float(self.model.predict(X)[0])
+
+
+class DoseCandidate(Candidate):
+    kind = "dose"
+
+    def __init__(self, name: str, model_path: str, features_path: Optional[str] = None):
+        super().__init__(name)
+        from core.dose_model import load_dose_model
+
+        self.model = load_dose_model(model_path)
+        self.feature_names = None
+        if features_path:
+            with open(features_path, "r", encoding="utf-8") as f:
+                obj = json.load(f)
+            self.feature_names = list(obj["features"] if isinstance(obj, dict) else obj)
+        self._columns = (None, None)  # (live names, column index into the live row)
+
+    def _select(self, X, live_names):
+        if self.feature_names is None or live_names is None:
+            return X
+        if self._columns[0] != list(live_names):
+            missing = [n for n in self.feature_names if n not in live_names]
+            if missing:
+                raise ValueError(f"features not in the live PRE window: {missing}")
+            index = [list(live_names).index(n) for n in self.feature_names]
+            self._columns = (list(live_names), index)
+        return X[:, self._columns[1]]
+
+    def predict(self, job):
+        if not job.live_on or job.X is None:
+            return None
+        return float(self.model.predict(self._select(job.X, job.feature_names))[0])
+
+    def agrees(self, pred, job):
+        snapped = min(ALLOWED_SECONDS, key=lambda a: abs(a - pred))
+        return int(snapped) == job.live_sec
+
+
+KINDS = {
+    "tflite_onoff": TFLiteOnOff,
+    "decision_tree": SklearnOnOff,
+    "dose": DoseCandidate,
+}
+
+
+def parse_spec(spec: str) -> Tuple[str, str, Optional[str], Optional[str]]:
+    """"kind[:path[:extra]]" -> (name, kind, path, extra) with the kind's default paths."""
+    kind, _, rest = spec.strip().partition(":")
+    if kind not in KINDS:
+        raise ValueError(f"Unknown shadow model kind {kind!r} (expected one of {sorted(KINDS)})")
+    path, _, extra = rest.partition(":")
+    default_path, default_extra = DEFAULT_PATHS[kind]
+    if not path:
+        return kind, kind, default_path, extra or default_extra
+
+    name = f"{kind}-{os.path.splitext(os.path.basename(path))[0]}"
+    if not extra and default_extra:
+        # e.g. a retrained model.tflite with its scaler.joblib next to it
+        sibling = os.path.join(os.path.dirname(path), os.path.basename(default_extra))
+        extra = sibling if os.path.exists(sibling) else None
+    return name, kind, path, extra or None
+
+
+def load_candidates(specs: Sequence[str]) -> List[Candidate]:
+    """Load every spec; one that fails is logged and left out."""
+    out, names = [], set()
+    for spec in specs:
+        try:
+            name, kind, path, extra = parse_spec(spec)
+            if name in names:
+                raise ValueError(f"duplicate shadow model {name!r}")
+            t0 = perf_counter()
+            out.append(KINDS[kind](name, path, extra))
+            names.add(name)
+            log.info("[SHADOW] Loaded %s (%s) in %.2f s", name, os.path.basename(path), perf_counter() - t0)
+        except Exception as e:
+            log.error("[SHADOW] Skipping candidate %r: %s: %s", spec, type(e).__name__, e)
+    return out
+
+
+# --------------------------------------------------------------------------- #
+# Compact log
+# --------------------------------------------------------------------------- #
+def read_header(f) -> dict:
+    if f.read(len(MAGIC)) != MAGIC:
+        raise ValueError("not a shadow log")
+    (n,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+    return json.loads(f.read(n).decode("utf-8"))
+
+
+def read_shadow_log(path: str):
+    """(header dict, NumPy structured array of the complete records)."""
+    import numpy as np
+
+    with open(path, "rb") as f:
+        header = read_header(f)
+        data = f.read()
+    usable = len(data) - len(data) % _RECORD.size  # drop a record cut short by a crash
+    return header, np.frombuffer(data[:usable], dtype=record_dtype())
+
+
+class ShadowLog:
+    """Appends records for one gateway; thread-safe, flushed every FLUSH_SECONDS."""
+
+    def __init__(self, root: str, gateway: str, models: Sequence[Tuple[str, str]]):
+        self.dir = gateway_dir(root, gateway)
+        self.header = {"version": VERSION, "models": [{"name": n, "kind": k} for n, k in models]}
+        self._lock = threading.Lock()
+        self._file = None
+        self._day = None
+        self._flushed = time.monotonic()
+
+    def _open(self, day: str):
+        os.makedirs(self.dir, exist_ok=True)
+        n = 0
+        while True:
+            path = os.path.join(self.dir, day + (f"-{n}" if n else "") + LOG_SUFFIX)
+            try:
+                with open(path, "rb") as f:
+                    same = read_header(f).get("models") == self.header["models"]
+            except FileNotFoundError:
+                f = open(path, "wb")
+                blob = json.dumps(self.header, sort_keys=True).encode("utf-8")
+                f.write(MAGIC + _HEADER_LEN.pack(len(blob)) + blob)
+                return f
+            except (OSError, ValueError):
+                same = False
+            if same:
+                f = open(path, "ab")
+                # Re-align after a torn last record.
+                extra = (f.tell() - self._header_size(path)) % _RECORD.size
+                if extra:
+                    f.truncate(f.tell() - extra)
+                    f.seek(0, os.SEEK_END)
+                return f
+            n += 1
+
+    @staticmethod
+    def _header_size(path: str) -> int:
+        with open(path, "rb") as f:
+            f.seek(len(MAGIC))
+            (n,) = _HEADER_LEN.unpack(f.read(_HEADER_LEN.size))
+        return len(MAGIC) + _HEADER_LEN.size + n
+
+    def append(self, ts, seq, model, live, live_sec, agree, pred, latency_us):
+        rec = _RECORD.pack(
+            ts, seq & 0xFFFFFFFF, model, int(live), min(int(live_sec), 255), int(agree), pred, latency_us
+        )
+        day = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y%m%d")
+        with self._lock:
+            if day != self._day:
+                if self._file is not None:
+                    self._file.close()
+                self._file = self._open(day)
+                self._day = day
+            self._file.write(rec)
+            now = time.monotonic()
+            if now - self._flushed >= FLUSH_SECONDS:
+                self._file.flush()
+                self._flushed = now
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._day = None
+
+
+# --------------------------------------------------------------------------- #
+# Evaluator
+# --------------------------------------------------------------------------- #
+class CandidateStats:
+    __slots__ = ("samples", "agree", "errors", "latency_sum", "latency_max")
+
+    def __init__(self):
+        self.samples = 0
+        self.agree = 0
+        self.errors = 0
+        self.latency_sum = 0.0
+        self.latency_max = 0.0
+
+
+class ShadowEvaluator:
+    """Runs candidate models on submitted samples in a worker pool (see module comment)."""
+
+    def __init__(
+        self,
+        specs: Sequence[str],
+        log_dir: str,
+        gateway: str = "",
+        workers: int = WORKERS,
+        max_pending: int = MAX_PENDING,
+        profiler=None,
+    ):
+        self.specs = list(specs)
+        self.log_dir = log_dir
+        self.gateway = gateway
+        self.max_pending = int(max_pending)
+        self.profiler = profiler
+
+        # Dose candidates need the PRE-window feature row with WATER_ON samples.
+        self.wants_features = any(s.strip().partition(":")[0] == "dose" for s in self.specs)
+
+        self.candidates: Optional[List[Candidate]] = None
+        self.stats = {}
+        self.submitted = 0
+        self.skipped = 0
+        self._seq = 0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._load_lock = threading.Lock()
+        # Workers update CandidateStats and the shadow_* profiler metrics one
+        # at a time (GatewayMetrics assumes a single writer per metric).
+        self._stats_lock = threading.Lock()
+        self._log: Optional[ShadowLog] = None
+        self._pool = ThreadPoolExecutor(max_workers=max(1, int(workers)), thread_name_prefix="shadow")
+        self.log = get_logger("shadow", gateway=gateway)
+
+    def submit(self, ts: float, sample, live_on: bool, live_sec: int, X=None, feature_names=None) -> bool:
+        """Queue one sample (never blocks). False when skipped because too many are in flight."""
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.skipped += 1
+                skipped = True
+            else:
+                self._pending += 1
+                self._seq += 1
+                self.submitted += 1
+                seq = self._seq
+                skipped = False
+        if skipped:
+            if self.profiler is not None:
+                self.profiler.count("shadow_skipped")
+            return False
+
+        job = ShadowJob(ts, seq, tuple(sample), bool(live_on), int(live_sec), X, feature_names)
+        try:
+            self._pool.submit(self._evaluate, job)
+        except RuntimeError:  # pool shut down
+            with self._lock:
+                self._pending -= 1
+            return False
+        return True
+
+    def _ensure_loaded(self):
+        with self._load_lock:
+            if self.candidates is None:
+                self.candidates = load_candidates(self.specs)
+                self.stats = {c.name: CandidateStats() for c in self.candidates}
+                self._log = ShadowLog(self.log_dir, self.gateway, [(c.name, c.kind) for c in self.candidates])
+        return self.candidates
+
+    def _evaluate(self, job: ShadowJob):
+        try:
+            prof = self.profiler
+            for i, cand in enumerate(self._ensure_loaded()):
+                stats = self.stats[cand.name]
+                with cand.lock:
+                    t0 = perf_counter()
+                    try:
+                        pred = cand.predict(job)
+                    except Exception as e:
+                        with self._stats_lock:
+                            stats.errors += 1
+                            if prof is not None:
+                                prof.count("shadow_errors")
+                        self.log.warning("[SHADOW] %s failed: %s: %s", cand.name, type(e).__name__, e)
+                        continue
+                    latency = perf_counter() - t0
+                if pred is None or not math.isfinite(pred):
+                    continue
+
+                agree = cand.agrees(pred, job)
+                with self._stats_lock:
+                    stats.samples += 1
+                    stats.agree += agree
+                    stats.latency_sum += latency
+                    stats.latency_max = max(stats.latency_max, latency)
+                    if prof is not None:
+                        prof.record(f"shadow_{cand.name}", latency)
+                self._log.append(
+                    job.ts, job.seq, i, job.live_on, job.live_sec, agree, pred, latency * 1e6
+                )
+        except Exception as e:  # never let a worker die silently
+            self.log.error("[SHADOW] Evaluation error: %s: %s", type(e).__name__, e)
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+    def summary(self) -> dict:
+        with self._stats_lock:
+            return {
+                name: {
+                    "samples": st.samples,
+                    "agree": st.agree / st.samples if st.samples else float("nan"),
+                    "errors": st.errors,
+                    "latency_mean": st.latency_sum / st.samples if st.samples else float("nan"),
+                    "latency_max": st.latency_max,
+                }
+                for name, st in self.stats.items()
+            }
+
+    def close(self, wait: bool = True):
+        """Finish queued samples, close the log and log a one-line summary per candidate."""
+        self._pool.shutdown(wait=wait)
+        if self._log is not None:
+            self._log.close()
+        for name, st in self.summary().items():
+            self.log.info(
+                "[SHADOW] %s: %d samples, %.1f%% agree with live, mean %.0f us, max %.0f us, %d errors",
+                name,
+                st["samples"],
+                100.0 * st["agree"] if st["samples"] else 0.0,
+                st["latency_mean"] * 1e6 if st["samples"] else 0.0,
+                st["latency_max"] * 1e6,
+                st["errors"],
+            )
+        if self.skipped:
+            self.log.warning("[SHADOW] %d samples skipped (more than %d in flight)", self.skipped, self.max_pending)
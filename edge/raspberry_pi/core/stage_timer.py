@@ -0,0 +1,57 @@
+from typing import Dict, List
+
+# Stages of the receive -> decide -> reply loop, in pipeline order.
+STAGES = ("framing", "rx_wait", "parse", "decision", "dose_features", "predict", "store", "tx", "checkpoint")
+
+
+class StageRecorder:
+    """
+    Keeps every per-stage duration (seconds) reported by the service loop.
+
+    Anything with `record(stage, seconds)`, `count(event, n)` and
+    `gauge(name, value)` methods can be handed to the service as its
+    profiler; this one is meant for offline tooling (replay benchmark),
+    where exact percentiles matter more than bounded memory.
+    core.metrics.GatewayMetrics is the production one.
+    """
+
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+        self.events: Dict[str, int] = {}
+        self.gauges: Dict[str, float] = {}
+
+    def record(self, stage: str, seconds: float):
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def count(self, event: str, n: int = 1):
+        self.events[event] = self.events.get(event, 0) + n
+
+    def gauge(self, name: str, value: float):
+        self.gauges[name] = value
+
+    def reset(self):
+        for values in self.samples.values():
+            values.clear()
+        self.events.clear()
+        self.gauges.clear()
+
+    @staticmethod
+    def percentile(sorted_values, q: float) -> float:
+        if not sorted_values:
+            return float("nan")
+        k = (len(sorted_values) - 1) * q
+        lo = int(k)
+        hi = min(lo + 1, len(sorted_values) - 1)
+        return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+    def summary(self, quantiles=(0.5, 0.9, 0.99)) -> Dict[str, dict]:
+        out = {}
+        for stage, values in self.samples.items():
+            ordered = sorted(values)
+            out[stage] = {
+                "count": len(ordered),
+                "mean": (sum(ordered) / len(ordered)) if ordered else float("nan"),
+                "max": ordered[-1] if ordered else float("nan"),
+                **{f"p{int(q * 100)}": self.percentile(ordered, q) for q in quantiles},
+            }
+        return out
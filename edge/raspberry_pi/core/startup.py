@@ -0,0 +1,123 @@
+import builtins
+import sys
+import threading
+from time import perf_counter
+from typing import Callable, List, Optional, Tuple
+
+
+class BackgroundLoader:
+    """
+    Run `fn` once on a daemon thread. Poll with done(), collect with result()
+    (re-raises whatever `fn` raised). `seconds` is the load time once done.
+    """
+
+    def __init__(self, fn: Callable, name: str = "loader", on_done: Optional[Callable] = None):
+        self.name = name
+        self.seconds: Optional[float] = None
+        self._value = None
+        self._error: Optional[BaseException] = None
+        self._done = threading.Event()
+        self._on_done = on_done
+        self._thread = threading.Thread(target=self._run, args=(fn,), name=name, daemon=True)
+        self._thread.start()
+
+    def _run(self, fn):
+        t0 = perf_counter()
+        try:
+            self._value = fn()
+        except BaseException as e:  # surfaced to the caller by result()
+            self._error = e
+        finally:
+            self.seconds = perf_counter() - t0
+            self._done.set()
+            if self._on_done is not None:
+                self._on_done()
+
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    def result(self, timeout: Optional[float] = None):
+        if not self._done.wait(timeout):
+            raise TimeoutError(f"{self.name} still running after {timeout} s")
+        if self._error is not None:
+            raise self._error
+        return self._value
+
+
+class StartupReport:
+    """
+    Cold-start timeline plus a built-in `python -X importtime` style breakdown.
+
+    install() wraps builtins.__import__ and records self/cumulative time for
+    every module that is actually loaded (cache hits are not timed). Import
+    stacks are per thread, so modules pulled in by a BackgroundLoader are
+    attributed correctly. mark(label) prints the time since `t_start`.
+    """
+
+    def __init__(self, t_start: Optional[float] = None):
+        self.t_start = perf_counter() if t_start is None else t_start
+        self.marks: List[Tuple[str, float]] = []
+        # (module, self seconds, cumulative seconds, depth)
+        self.imports: List[Tuple[str, float, float, int]] = []
+        self._local = threading.local()
+        self._orig_import = None
+
+    # ---- timeline ----
+    def mark(self, label: str):
+        elapsed = perf_counter() - self.t_start
+        self.marks.append((label, elapsed))
+        print(f"[STARTUP] {label}: {elapsed * 1e3:.1f} ms")
+
+    # ---- import timing ----
+    def install(self):
+        if self._orig_import is None:
+            self._orig_import = builtins.__import__
+            builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        if self._orig_import is not None:
+            builtins.__import__ = self._orig_import
+            self._orig_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        orig = self._orig_import or builtins.__import__
+        if level == 0 and name in sys.modules:
+            return orig(name, globals, locals, fromlist, level)
+
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+
+        n_before = len(sys.modules)
+        frame = [0.0]  # time spent in nested imports
+        stack.append(frame)
+        t0 = perf_counter()
+        try:
+            return orig(name, globals, locals, fromlist, level)
+        finally:
+            cumulative = perf_counter() - t0
+            stack.pop()
+            if stack:
+                stack[-1][0] += cumulative
+            if len(sys.modules) != n_before:
+                label = name
+                if level > 0:
+                    # `from . import x` / `from .mod import y`: report the absolute name
+                    package = (globals or {}).get("__package__") or ""
+                    base = package.rsplit(".", level - 1)[0] if level > 1 else package
+                    if name:
+                        label = f"{base}.{name}"
+                    else:
+                        names = list(fromlist or ()) or [""]
+                        more = f" (+{len(names) - 1})" if len(names) > 1 else ""
+                        label = f"{base}.{names[0]}{more}"
+                self.imports.append((label, cumulative - frame[0], cumulative, len(stack)))
+
+    def report(self, top: int = 15):
+        self.uninstall()
+        total = sum(cum for _, _, cum, depth in self.imports if depth == 0)
+        print(f"[STARTUP] Imports: {len(self.imports)} timed, {total * 1e3:.1f} ms at top level")
+        print("[STARTUP]      self [us] | cumulative | imported package")
+        ranked = sorted(self.imports, key=lambda r: r[2], reverse=True)[:top]
+        for name, self_s, cum_s, depth in ranked:
+            print(f"[STARTUP] {self_s * 1e6:14.0f} | {cum_s * 1e6:10.0f} | {'  ' * depth}{name}")
@@ -0,0 +1,71 @@
+import re
+from typing import NamedTuple, Optional
+
+# Fixed ESP32 gateway format:
+#   S1:<float>,S2:<float>,T:<float>,H:<float>,L:<float>
+# Whitespace around keys/values and a trailing \r are tolerated.
+_NUM = rb"\s*([^,\s]+)\s*"
+_TELEMETRY_RE = re.compile(
+    rb"\s*S1:" + _NUM + rb",\s*S2:" + _NUM + rb",\s*T:" + _NUM
+    + rb",\s*H:" + _NUM + rb",\s*L:" + _NUM
+)
+
+_REQUIRED_KEYS = (b"S1", b"S2", b"T", b"H", b"L")
+
+
+class Telemetry(NamedTuple):
+    """One parsed telemetry sample."""
+
+    s1: float
+    s2: float
+    temperature: float
+    humidity: float
+    light: float
+
+
+def _parse_generic(line) -> Optional[Telemetry]:
+    """Slow path: any key order, extra keys, junk fields (same rules as parse_telemetry)."""
+    values = {}
+    for part in bytes(line).split(b","):
+        key, sep, value = part.partition(b":")
+        if not sep:
+            continue
+        try:
+            values[key.strip()] = float(value)
+        except ValueError:
+            continue
+
+    if not all(k in values for k in _REQUIRED_KEYS):
+        return None
+    return Telemetry(*(values[k] for k in _REQUIRED_KEYS))
+
+
+def parse_telemetry_bytes(line) -> Optional[Telemetry]:
+    """
+    Parse a raw telemetry line (bytes, bytearray or memoryview, without the
+    trailing newline) straight into a Telemetry record.
+
+    The fixed gateway format is matched with one precompiled regex and the
+    captured byte groups go directly to float(), so no str/dict is built.
+    Anything else falls back to the generic key:value parser. Partial or
+    corrupted lines return None.
+    """
+    m = _TELEMETRY_RE.fullmatch(line)
+    if m is not None:
+        try:
+            return Telemetry(
+                float(m.group(1)),
+                float(m.group(2)),
+                float(m.group(3)),
+                float(m.group(4)),
+                float(m.group(5)),
+            )
+        except ValueError:
+            pass
+    return _parse_generic(line)
+
+
+def is_telemetry_line(line) -> bool:
+    """Telemetry must contain S1: and S2: at minimum."""
+    raw = bytes(line)
+    return b"S1:" in raw and b"S2:" in raw
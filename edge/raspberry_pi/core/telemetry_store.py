@@ -0,0 +1,260 @@
+import fcntl
+import mmap
+import os
+import re
+import struct
+import time
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+# On-device telemetry history: every parsed sample, as fixed 32-byte records in
+# one memory-mapped segment file per UTC day:
+#
+#   <root>/<gateway>/YYYYMMDD.tlm = 64-byte header + N records
+#
+# Record layout (little-endian), page-aligned so a record never straddles a
+# 4 KB page:
+#   ts f8 | s1 f4 | s2 f4 | temperature f4 | humidity f4 | light f4 |
+#   decision u1 (1 = WATER_ON) | dose_sec u1 | flags u1 | commit u1
+#
+# Crash safety: the writer fills the fields first and sets `commit` last, so a
+# record cut short by a crash or power loss (zero-filled tail) is simply not
+# committed. Readers only return the committed prefix; a restarted writer
+# resumes at the first uncommitted slot.
+#
+# The writer needs only mmap + struct (no NumPy import on the service's start
+# path). Readers return zero-copy NumPy structured views (np.memmap).
+
+MAGIC = b"EDGETLM1"
+VERSION = 1
+HEADER_SIZE = 64
+RECORD_SIZE = 32
+COMMIT = 0xA5
+GROW_RECORDS = 4096  # preallocation step (128 KB)
+SYNC_SECONDS = 60.0  # msync at most this often (SD card wear vs. power-loss window)
+
+SEGMENT_SUFFIX = ".tlm"
+
+_HEADER = struct.Struct("<8sII48x")
+_RECORD = struct.Struct("<d5fBBB")  # everything but the commit byte
+
+
+def record_dtype():
+    """NumPy structured dtype matching the on-disk record."""
+    import numpy as np
+
+    return np.dtype(
+        [
+            ("ts", "<f8"),
+            ("s1", "<f4"),
+            ("s2", "<f4"),
+            ("temperature", "<f4"),
+            ("humidity", "<f4"),
+            ("light", "<f4"),
+            ("decision", "u1"),
+            ("dose_sec", "u1"),
+            ("flags", "u1"),
+            ("commit", "u1"),
+        ]
+    )
+
+
+def gateway_dir(root: str, gateway: str = "") -> str:
+    """Directory for one gateway's segments ("" -> default, pts/3 -> pts_3)."""
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", gateway).strip("._") or "default"
+    return os.path.join(root, name)
+
+
+def segment_day(ts: float) -> str:
+    return datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y%m%d")
+
+
+class TelemetryStore:
+    """
+    Append-only writer for one gateway. Not thread-safe: one writer per
+    gateway directory (enforced with an exclusive flock on the open segment).
+    """
+
+    def __init__(self, root: str, gateway: str = "", sync_seconds: float = SYNC_SECONDS):
+        self.dir = gateway_dir(root, gateway)
+        self.sync_seconds = sync_seconds
+        os.makedirs(self.dir, exist_ok=True)
+
+        self.day: Optional[str] = None
+        self.path: Optional[str] = None
+        self.count = 0  # committed records in the open segment
+        self._fd = None
+        self._mm = None
+        self._capacity = 0
+        self._last_sync = 0.0
+        # UTC day of the open segment, as [start, end) unix seconds
+        self._day_start = 0.0
+        self._day_end = 0.0
+
+    # ---- segment handling ----
+    def _open_segment(self, day: str):
+        self.close()
+        path = os.path.join(self.dir, day + SEGMENT_SUFFIX)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            raise RuntimeError(f"Telemetry segment already open by another writer: {path}")
+
+        size = os.fstat(fd).st_size
+        if size < HEADER_SIZE:
+            os.ftruncate(fd, 0)
+            os.write(fd, _HEADER.pack(MAGIC, VERSION, RECORD_SIZE))
+            size = HEADER_SIZE
+        else:
+            magic, version, rec_size = _HEADER.unpack(os.pread(fd, HEADER_SIZE, 0))
+            if magic != MAGIC or rec_size != RECORD_SIZE:
+                os.close(fd)
+                raise ValueError(f"Not a telemetry segment (or incompatible layout): {path}")
+
+        capacity = max((size - HEADER_SIZE) // RECORD_SIZE, GROW_RECORDS)
+        os.ftruncate(fd, HEADER_SIZE + capacity * RECORD_SIZE)
+
+        self._fd = fd
+        self._map(capacity)
+        self.count = _committed_prefix(self._mm, capacity)
+        self.day = day
+        self.path = path
+
+    def _map(self, capacity: int):
+        if self._mm is not None:
+            self._mm.close()
+        self._mm = mmap.mmap(self._fd, HEADER_SIZE + capacity * RECORD_SIZE)
+        self._capacity = capacity
+
+    def _grow(self):
+        capacity = self._capacity + GROW_RECORDS
+        os.ftruncate(self._fd, HEADER_SIZE + capacity * RECORD_SIZE)
+        self._map(capacity)
+
+    # ---- writing ----
+    def append(
+        self,
+        ts: float,
+        s1: float,
+        s2: float,
+        temperature: float,
+        humidity: float,
+        light: float,
+        decision: int,
+        dose_sec: int,
+        flags: int = 0,
+    ):
+        if not self._day_start <= ts < self._day_end:
+            day = segment_day(ts)
+            if day != self.day:
+                self._open_segment(day)
+            self._day_start = ts - ts % 86400.0
+            self._day_end = self._day_start + 86400.0
+        if self.count >= self._capacity:
+            self._grow()
+
+        offset = HEADER_SIZE + self.count * RECORD_SIZE
+        mm = self._mm
+        _RECORD.pack_into(
+            mm, offset, ts, s1, s2, temperature, humidity, light,
+            1 if decision else 0, max(0, min(255, int(dose_sec))), flags,
+        )
+        mm[offset + RECORD_SIZE - 1] = COMMIT
+        self.count += 1
+
+        now = time.monotonic()
+        if now - self._last_sync >= self.sync_seconds:
+            mm.flush()
+            self._last_sync = now
+
+    def flush(self):
+        if self._mm is not None:
+            self._mm.flush()
+            self._last_sync = time.monotonic()
+
+    def close(self):
+        """Flush, trim the preallocated tail and release the segment."""
+        if self._mm is None:
+            return
+        self._mm.flush()
+        self._mm.close()
+        self._mm = None
+        os.ftruncate(self._fd, HEADER_SIZE + self.count * RECORD_SIZE)
+        os.close(self._fd)
+        self._fd = None
+        self.day = None
+        self.path = None
+        self._capacity = 0
+        self._day_start = self._day_end = 0.0
+
+
+def _committed_prefix(buf, capacity: int) -> int:
+    """Number of leading committed records (binary search is unsafe after a crash: scan)."""
+    pos = HEADER_SIZE + RECORD_SIZE - 1
+    for i in range(capacity):
+        if buf[pos] != COMMIT:
+            return i
+        pos += RECORD_SIZE
+    return capacity
+
+
+# ---- readers (NumPy) ----
+def list_segments(root: str, gateway: str = "", start: Optional[str] = None, end: Optional[str] = None) -> List[str]:
+    """Segment paths for one gateway, oldest first; start/end are inclusive YYYYMMDD."""
+    directory = gateway_dir(root, gateway)
+    if not os.path.isdir(directory):
+        return []
+    paths = []
+    for name in sorted(os.listdir(directory)):
+        day, ext = os.path.splitext(name)
+        if ext != SEGMENT_SUFFIX:
+            continue
+        if (start and day < start) or (end and day > end):
+            continue
+        paths.append(os.path.join(directory, name))
+    return paths
+
+
+def open_segment(path: str):
+    """
+    Zero-copy read-only view of a segment's committed records
+    (np.memmap with record_dtype(); empty array for an empty segment).
+    """
+    import numpy as np
+
+    dtype = record_dtype()
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        magic, _, rec_size = _HEADER.unpack(f.read(HEADER_SIZE))
+    if magic != MAGIC or rec_size != dtype.itemsize:
+        raise ValueError(f"Not a telemetry segment (or incompatible layout): {path}")
+
+    n = (size - HEADER_SIZE) // RECORD_SIZE
+    if n == 0:
+        return np.zeros(0, dtype=dtype)
+    records = np.memmap(path, dtype=dtype, mode="r", offset=HEADER_SIZE, shape=(n,))
+
+    # Committed prefix: the first record without the commit byte ends the data
+    bad = np.flatnonzero(records["commit"] != COMMIT)
+    return records[: bad[0]] if bad.size else records
+
+
+def open_history(root: str, gateway: str = "", start: Optional[str] = None, end: Optional[str] = None) -> List[Tuple[str, object]]:
+    """[(YYYYMMDD, zero-copy records), ...] for every segment in range."""
+    out = []
+    for path in list_segments(root, gateway, start, end):
+        day = os.path.splitext(os.path.basename(path))[0]
+        out.append((day, open_segment(path)))
+    return out
+
+
+def read_history(root: str, gateway: str = "", start: Optional[str] = None, end: Optional[str] = None):
+    """All records in range as one contiguous array (copies; use open_history to stay zero-copy)."""
+    import numpy as np
+
+    parts = [records for _, records in open_history(root, gateway, start, end) if len(records)]
+    if not parts:
+        return np.zeros(0, dtype=record_dtype())
+    return np.concatenate(parts)
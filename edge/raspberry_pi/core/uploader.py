@@ -0,0 +1,291 @@
+import json
+import os
+import queue
+import random
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from core.log import get_logger
+
+# Offline-first ThingSpeak uploader (Pi side).
+#
+# The control loop only calls submit(), a non-blocking put into an in-memory
+# queue. A background worker:
+#   1. moves submitted samples into a local SQLite queue (survives restarts
+#      and connectivity gaps),
+#   2. sends them in order as ThingSpeak bulk updates
+#      (POST .../channels/<id>/bulk_update.json) over one keep-alive
+#      requests.Session,
+#   3. deletes a batch only after the server accepted it, and backs off
+#      exponentially (with jitter, honouring Retry-After) while offline.
+#
+# Fields follow the ESP32 gateway upload: field1..7 = S1, S2, T, H, L,
+# decision (0/1), seconds sent.
+
+BATCH_SIZE = 100  # samples per bulk request
+MIN_INTERVAL = 15.0  # seconds between requests (ThingSpeak free tier rate limit)
+MAX_DELAY = 60.0  # send a partial batch once its oldest sample is this old
+BACKOFF_BASE = 5.0
+BACKOFF_MAX = 600.0
+MEMORY_QUEUE = 1000  # samples waiting for the worker; beyond that submit() drops
+REQUEST_TIMEOUT = (5.0, 20.0)  # connect, read (seconds)
+POLL_SECONDS = 1.0
+
+log = get_logger("uploader")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS samples (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    s1 REAL, s2 REAL, temperature REAL, humidity REAL, light REAL,
+    decision INTEGER, dose_sec INTEGER
+)
+"""
+
+
+class ThingSpeakUploader:
+    """Batched, persistent, background uploader. start() / submit() / stop()."""
+
+    def __init__(
+        self,
+        url: str,
+        api_key: str,
+        db_path: str,
+        batch_size: int = BATCH_SIZE,
+        min_interval: float = MIN_INTERVAL,
+        max_delay: float = MAX_DELAY,
+        backoff_base: float = BACKOFF_BASE,
+        backoff_max: float = BACKOFF_MAX,
+        session=None,
+    ):
+        self.url = url
+        self.api_key = api_key
+        self.db_path = db_path
+        self.batch_size = max(1, int(batch_size))
+        self.min_interval = float(min_interval)
+        self.max_delay = float(max_delay)
+        self.backoff_base = float(backoff_base)
+        self.backoff_max = float(backoff_max)
+
+        # Counters (written by the worker / submit; read for reporting)
+        self.submitted = 0
+        self.dropped = 0
+        self.uploaded = 0
+        self.failed_requests = 0
+        self.backlog = 0  # rows in the SQLite queue
+
+        self._session = session
+        self._inbox = queue.Queue(MEMORY_QUEUE)
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._failures = 0
+        self._next_attempt = 0.0
+        self._offline = False
+
+    # ---- control-loop side ----
+    def submit(self, ts, s1, s2, temperature, humidity, light, decision, dose_sec) -> bool:
+        """Queue one sample for upload. Never blocks; False if it had to be dropped."""
+        try:
+            self._inbox.put_nowait(
+                (float(ts), s1, s2, temperature, humidity, light, 1 if decision else 0, int(dose_sec))
+            )
+        except queue.Full:
+            self.dropped += 1
+            return False
+        self.submitted += 1
+        if self._inbox.qsize() >= self.batch_size:
+            self._wake.set()
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="thingspeak-uploader", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 5.0):
+        """Persist whatever is still in memory and stop the worker."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    # ---- worker ----
+    def _connect(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(_SCHEMA)
+        conn.commit()
+        return conn
+
+    def _get_session(self):
+        if self._session is None:
+            # requests is only imported by the worker thread (start-up cost)
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            self._session = session
+        return self._session
+
+    def _persist(self, conn) -> int:
+        rows = []
+        while True:
+            try:
+                rows.append(self._inbox.get_nowait())
+            except queue.Empty:
+                break
+        if rows:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO samples (ts, s1, s2, temperature, humidity, light, decision, dose_sec)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+            self.backlog += len(rows)
+        return len(rows)
+
+    def _due(self, conn, now: float) -> bool:
+        if self.backlog == 0 or now < self._next_attempt:
+            return False
+        if self.backlog >= self.batch_size:
+            return True
+        (oldest,) = conn.execute("SELECT MIN(ts) FROM samples").fetchone()
+        return oldest is not None and time.time() - oldest >= self.max_delay
+
+    def _backoff(self, retry_after: Optional[float] = None):
+        self._failures += 1
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (self._failures - 1)))
+        delay *= random.uniform(0.5, 1.0)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self._next_attempt = time.monotonic() + delay
+        return delay
+
+    def _upload_batch(self, conn):
+        rows = conn.execute(
+            "SELECT id, ts, s1, s2, temperature, humidity, light, decision, dose_sec"
+            " FROM samples ORDER BY id LIMIT ?",
+            (self.batch_size,),
+        ).fetchall()
+        if not rows:
+            self.backlog = 0
+            return
+
+        updates = []
+        for _, ts, s1, s2, t, h, light, decision, dose_sec in rows:
+            created_at = datetime.fromtimestamp(ts, tz=timezone.utc).strftime("%Y-%m-%d %H:%M:%S +0000")
+            updates.append(
+                {
+                    "created_at": created_at,
+                    "field1": s1,
+                    "field2": s2,
+                    "field3": t,
+                    "field4": h,
+                    "field5": light,
+                    "field6": decision,
+                    "field7": dose_sec,
+                }
+            )
+        body = json.dumps({"write_api_key": self.api_key, "updates": updates}, separators=(",", ":"))
+
+        try:
+            resp = self._get_session().post(
+                self.url,
+                data=body,
+                headers={"Content-Type": "application/json"},
+                timeout=REQUEST_TIMEOUT,
+            )
+            status = resp.status_code
+        except Exception as e:  # connection refused, DNS, timeout, ...
+            self.failed_requests += 1
+            delay = self._backoff()
+            if not self._offline:
+                log.warning(
+                    "[WARN] ThingSpeak unreachable (%s); %d queued, retry in %.0f s",
+                    type(e).__name__, self.backlog, delay,
+                )
+            self._offline = True
+            return
+
+        self._next_attempt = time.monotonic() + self.min_interval
+        last_id = rows[-1][0]
+
+        if 200 <= status < 300:
+            with conn:
+                conn.execute("DELETE FROM samples WHERE id <= ?", (last_id,))
+            self.uploaded += len(rows)
+            self.backlog = max(0, self.backlog - len(rows))
+            self._failures = 0
+            if self._offline:
+                log.info("[INFO] ThingSpeak reachable again; %d samples still queued", self.backlog)
+            self._offline = False
+            log.info("[TS] Uploaded %d samples (%d queued)", len(rows), self.backlog)
+            return
+
+        self.failed_requests += 1
+        if status in (400, 413, 422):
+            # The batch itself is rejected: retrying it forever would block the queue.
+            with conn:
+                conn.execute("DELETE FROM samples WHERE id <= ?", (last_id,))
+            self.backlog = max(0, self.backlog - len(rows))
+            log.error("[ERROR] ThingSpeak rejected a batch (HTTP %d), dropped %d samples", status, len(rows))
+            return
+
+        retry_after = None
+        try:
+            retry_after = float(resp.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            pass
+        delay = self._backoff(retry_after)
+        log.warning("[WARN] ThingSpeak HTTP %d; %d queued, retry in %.0f s", status, self.backlog, delay)
+
+    def _run(self):
+        conn = self._connect()
+        (self.backlog,) = conn.execute("SELECT COUNT(*) FROM samples").fetchone()
+        if self.backlog:
+            log.info("[TS] %d samples queued from a previous run", self.backlog)
+
+        try:
+            while not self._stop.is_set():
+                self._wake.wait(POLL_SECONDS)
+                self._wake.clear()
+                self._persist(conn)
+                if self._due(conn, time.monotonic()):
+                    self._upload_batch(conn)
+        finally:
+            self._persist(conn)
+            conn.close()
+
+
+def uploader_from_settings(settings: dict, db_path: str) -> Optional[ThingSpeakUploader]:
+    """
+    ThingSpeakUploader from the `thingspeak:` section of settings.yaml, or
+    None when url/api_key are not configured (upload stays with the ESP32).
+    """
+    cfg = (settings or {}).get("thingspeak") or {}
+    url, api_key = cfg.get("url"), cfg.get("api_key")
+    if not url or not api_key or cfg.get("enabled") is False:
+        return None
+
+    def opt(key, default):
+        value = cfg.get(key)
+        return default if value is None else value
+
+    return ThingSpeakUploader(
+        url,
+        api_key,
+        opt("queue_path", db_path),
+        batch_size=int(opt("batch_size", BATCH_SIZE)),
+        min_interval=float(opt("min_interval", MIN_INTERVAL)),
+        max_delay=float(opt("max_delay", MAX_DELAY)),
+    )
@@ -0,0 +1,79 @@
+"""
+Offline backtest of the TFLite ON/OFF classifier over dataset_base.csv using
+EdgeIrrigationModel.predict_batch (thousands of rows per invoke).
+
+Feature order matches the Keras training set:
+  [soil1, soil2, soil_max, temperature, humidity, light]
+
+Run from edge/raspberry_pi:
+  python tools/backtest_onoff.py [--threshold 0.5] [--check-single 200]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(os.path.dirname(BASE_DIR))
+sys.path.insert(0, BASE_DIR)
+
+from core.edge_model import EdgeIrrigationModel  # noqa: E402
+
+DATASET_PATH = os.path.join(REPO_ROOT, "tools", "dataset", "processed", "dataset_base.csv")
+
+
+def load_features(path):
+    rows, labels = [], []
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            s1, s2 = float(row["soil1"]), float(row["soil2"])
+            rows.append((s1, s2, max(s1, s2), float(row["temperature"]), float(row["humidity"]), float(row["light"])))
+            if "decision" in row:
+                labels.append(int(row["decision"]))
+    X = np.asarray(rows, dtype=np.float32)
+    y = np.asarray(labels, dtype=int) if len(labels) == len(rows) else None
+    return X, y
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dataset", default=DATASET_PATH)
+    parser.add_argument("--model", default="model/onoff/model.tflite")
+    parser.add_argument("--scaler", default="model/onoff/scaler.joblib")
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--check-single", type=int, default=200, help="Compare the first N rows against predict()")
+    args = parser.parse_args()
+
+    X, y = load_features(args.dataset)
+    model = EdgeIrrigationModel(model_path=args.model, scaler_path=args.scaler)
+
+    t0 = time.perf_counter()
+    probs, labels = model.predict_batch(X, threshold=args.threshold)
+    t_batch = time.perf_counter() - t0
+    print(f"[BACKTEST] {len(X)} rows in {t_batch * 1e3:.1f} ms ({len(X) / t_batch:,.0f} rows/s)")
+
+    n_check = min(args.check_single, len(X))
+    if n_check:
+        t0 = time.perf_counter()
+        single = np.array([model.predict(row)[0] for row in X[:n_check]], dtype=np.float32)
+        t_single = time.perf_counter() - t0
+        max_err = float(np.max(np.abs(single - probs[:n_check])))
+        print(
+            f"[BACKTEST] predict() x{n_check}: {n_check / t_single:,.0f} rows/s | "
+            f"max |batch - single| = {max_err:.2e}"
+        )
+
+    print(f"[BACKTEST] WATER_ON predicted: {int(labels.sum())}/{len(labels)}")
+    if y is not None:
+        tp = int(np.sum((labels == 1) & (y == 1)))
+        fp = int(np.sum((labels == 1) & (y == 0)))
+        fn = int(np.sum((labels == 0) & (y == 1)))
+        print(f"[BACKTEST] Accuracy vs decision column: {np.mean(labels == y):.4f} (TP={tp}, FP={fp}, FN={fn})")
+
+
+if __name__ == "__main__":
+    main()
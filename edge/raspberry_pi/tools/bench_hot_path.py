@@ -0,0 +1,344 @@
+"""
+Micro-benchmarks for the per-sample hot path of the Pi service, checked
+against stored baselines.
+
+Inputs are fixed: the first --lines rows of the ThingSpeak export in the
+gateway wire format, and the PRE windows / dose feature rows they produce.
+
+  parse_telemetry            str parser (tooling / old callers)
+  parse_telemetry_bytes      the service's parser on framed bytes
+  snap_seconds               nearest allowed dose (service helper)
+  dose_features              RollingWindow.append + features() (replaces build_dose_features)
+  dose_predict               DoseRegressor.predict_from_features, compiled forest, no cache
+  dose_predict_cached        same, windows repeating within the prediction cache (hits)
+  edge_model_predict         EdgeIrrigationModel.predict (needs a TFLite runtime)
+  inference_test_predict     tools/inference_test.predict singleton (needs a TFLite runtime)
+
+Per benchmark: best-of --repeat time per call, and with tracemalloc the peak
+bytes allocated while one call runs and the bytes still held per call after a
+batch (growth = a leak or an unbounded cache).
+
+Each benchmark alternates with a fixed pure-Python calibration loop, and
+"ratio" is the time per call vs the baseline divided by the same ratio for
+the calibration loop, so a machine that is busy or clocked down as a whole
+does not read as a regression. A benchmark fails when that ratio exceeds
+1 + --threshold (default 30 %), or its peak allocation grows by more than
+--threshold plus ALLOC_SLACK bytes. The exit status is 1 on any failure, so this can gate
+a change. Baselines are machine-specific: record them on the Pi (or the
+machine running the check) with --update.
+
+Run from edge/raspberry_pi:
+  python tools/bench_hot_path.py                 # compare with tools/bench_hot_path_baselines.json
+  python tools/bench_hot_path.py --update        # record new baselines
+  python tools/bench_hot_path.py --only dose_predict --repeat 15
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "app"))
+sys.path.insert(0, os.path.join(BASE_DIR, "tools"))
+sys.path.insert(0, BASE_DIR)
+
+import numpy as np  # noqa: E402
+
+from bench_line_framing import EXPORT_PATH, load_wire_lines  # noqa: E402
+from bt_inference_service import PRE_N, parse_telemetry, snap_seconds  # noqa: E402
+from core.dose_model import ALLOWED_SECONDS, DoseRegressor  # noqa: E402
+from core.prediction_cache import CACHE_SIZE  # noqa: E402
+from core.rolling_window import RollingWindow  # noqa: E402
+from core.telemetry import parse_telemetry_bytes  # noqa: E402
+
+BASELINES_PATH = os.path.join(BASE_DIR, "tools", "bench_hot_path_baselines.json")
+DOSE_MODEL_PATH = os.path.join(BASE_DIR, "model", "dose", "rf_dose_regressor_prod.npz")
+DOSE_FEATURES_PATH = os.path.join(BASE_DIR, "model", "dose", "rf_dose_features_prod.json")
+ONOFF_MODEL_PATH = os.path.join("model", "onoff", "model.tflite")  # relative to BASE_DIR
+ONOFF_SCALER_PATH = os.path.join("model", "onoff", "scaler.joblib")
+
+N_LINES = 2000
+REPEAT = 15
+MIN_RUN_SECONDS = 0.02  # each repeat loops the inputs until at least this long
+THRESHOLD = 0.30
+ALLOC_SLACK = 256  # bytes of peak-allocation noise tolerated on top of the threshold
+
+
+class Skip(Exception):
+    """Benchmark not runnable here (e.g. no TFLite runtime)."""
+
+
+# --------------------------------------------------------------------------- #
+# Fixed inputs
+# --------------------------------------------------------------------------- #
+class Inputs:
+    def __init__(self, n_lines):
+        wire = load_wire_lines(EXPORT_PATH, n_lines)
+        if not wire:
+            raise SystemExit(f"No telemetry rows in {EXPORT_PATH}")
+        self.raw = [line.rstrip(b"\n") for line in wire]
+        self.text = [line.decode() for line in self.raw]
+        self.samples = []  # PRE window channels
+        self.onoff = []  # EdgeIrrigationModel features: soil1, soil2, soil_max, temp, humidity, light
+        for line in self.raw:
+            t = parse_telemetry_bytes(line)
+            soil_avg = 0.5 * (t.s1 + t.s2)
+            self.samples.append((t.s1, t.s2, soil_avg, abs(t.s1 - t.s2), t.temperature, t.humidity))
+            self.onoff.append((t.s1, t.s2, max(t.s1, t.s2), t.temperature, t.humidity, t.light))
+
+        with open(DOSE_FEATURES_PATH, "r", encoding="utf-8") as f:
+            self.feature_names = json.load(f)["features"]
+        window = RollingWindow(PRE_N, self.feature_names)
+        self.feature_dicts = []
+        rows = []
+        for sample in self.samples:
+            window.append(*sample)
+            if window.is_full:
+                row = window.features()[0]
+                rows.append(row.copy())
+                self.feature_dicts.append(dict(zip(self.feature_names, map(float, row))))
+        regressor = DoseRegressor(DOSE_MODEL_PATH, DOSE_FEATURES_PATH, cache_size=0)
+        self.predictions = [float(v) for v in regressor.model.predict(np.asarray(rows))]
+
+
+# --------------------------------------------------------------------------- #
+# Benchmarks: setup(inputs) -> (fn, args); fn is called once per item of args
+# --------------------------------------------------------------------------- #
+def bench_parse_telemetry(inp):
+    return parse_telemetry, inp.text
+
+
+def bench_parse_telemetry_bytes(inp):
+    return parse_telemetry_bytes, inp.raw
+
+
+def bench_snap_seconds(inp):
+    allowed = [float(a) for a in ALLOWED_SECONDS]
+    return (lambda x: snap_seconds(x, allowed)), inp.predictions
+
+
+def bench_dose_features(inp):
+    window = RollingWindow(PRE_N, inp.feature_names)
+    for sample in inp.samples[:PRE_N]:
+        window.append(*sample)
+
+    def step(sample):
+        window.append(*sample)
+        return window.features()
+
+    return step, inp.samples
+
+
+def bench_dose_predict(inp):
+    regressor = DoseRegressor(DOSE_MODEL_PATH, DOSE_FEATURES_PATH, cache_size=0)
+    return regressor.predict_from_features, inp.feature_dicts
+
+
+def bench_dose_predict_cached(inp):
+    # Windows that fit in the cache (steady sensors repeat the same rows)
+    regressor = DoseRegressor(DOSE_MODEL_PATH, DOSE_FEATURES_PATH)
+    repeated = inp.feature_dicts[: CACHE_SIZE // 2]
+    for features in repeated:
+        regressor.predict_from_features(features)  # warm the cache
+    return regressor.predict_from_features, repeated
+
+
+def bench_edge_model_predict(inp):
+    try:
+        from core.edge_model import EdgeIrrigationModel
+    except ImportError as e:
+        raise Skip(f"no TFLite runtime ({e})")
+    model = EdgeIrrigationModel(model_path=ONOFF_MODEL_PATH, scaler_path=ONOFF_SCALER_PATH)
+    return model.predict, inp.onoff
+
+
+def bench_inference_test_predict(inp):
+    try:
+        import inference_test
+    except ImportError as e:
+        raise Skip(f"no TFLite runtime ({e})")
+    from joblib import load
+
+    # The tool resolves model/model.tflite relative to the working directory
+    inference_test._MODEL_PATH = os.path.join(BASE_DIR, ONOFF_MODEL_PATH)
+    inference_test._SCALER = load(os.path.join(BASE_DIR, ONOFF_SCALER_PATH))
+    rows = [np.asarray([r], dtype=np.float32) for r in inp.onoff]
+    inference_test.predict(rows[0])  # build the singleton interpreter outside the timing
+    return inference_test.predict, rows
+
+
+BENCHMARKS = {
+    "parse_telemetry": bench_parse_telemetry,
+    "parse_telemetry_bytes": bench_parse_telemetry_bytes,
+    "snap_seconds": bench_snap_seconds,
+    "dose_features": bench_dose_features,
+    "dose_predict": bench_dose_predict,
+    "dose_predict_cached": bench_dose_predict_cached,
+    "edge_model_predict": bench_edge_model_predict,
+    "inference_test_predict": bench_inference_test_predict,
+}
+
+
+# --------------------------------------------------------------------------- #
+def calibration(x):
+    """Fixed pure-Python workload timed next to every benchmark (machine speed)."""
+    acc = 0.0
+    for i in range(20):
+        acc += (x * i) % 7.0
+    return acc
+
+
+CALIBRATION_ARGS = [float(i) for i in range(200)]
+
+
+def _run(fn, args, loops):
+    t0 = time.perf_counter()
+    for _ in range(loops):
+        for a in args:
+            fn(a)
+    return time.perf_counter() - t0
+
+
+def _loops(fn, args):
+    return max(1, int(MIN_RUN_SECONDS / max(_run(fn, args, 1), 1e-9)))
+
+
+def time_per_call(fn, args, repeat):
+    """
+    (best-of-`repeat` seconds per call, best calibration seconds per call).
+    Both are sampled alternately, so a machine-wide slowdown during the
+    benchmark shows up in the calibration too.
+    """
+    loops, cal_loops = _loops(fn, args), _loops(calibration, CALIBRATION_ARGS)
+    best = best_cal = float("inf")
+    for _ in range(repeat):
+        best = min(best, _run(fn, args, loops))
+        best_cal = min(best_cal, _run(calibration, CALIBRATION_ARGS, cal_loops))
+    return best / (loops * len(args)), best_cal / (cal_loops * len(CALIBRATION_ARGS))
+
+
+def allocations_per_call(fn, args):
+    """(max peak bytes of a single call, bytes retained per call over the batch)"""
+    # Tracing restarts for every call to reset the peak (tracemalloc.reset_peak
+    # needs Python 3.9; the Pi runs 3.7), then once more over the whole batch.
+    peak_call = 0
+    try:
+        for a in args:
+            tracemalloc.start()
+            fn(a)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            peak_call = max(peak_call, peak)
+
+        tracemalloc.start()
+        start, _ = tracemalloc.get_traced_memory()
+        for a in args:
+            fn(a)
+        end, _ = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak_call, max(0, end - start) / len(args)
+
+
+def load_baselines(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f).get("benchmarks", {})
+
+
+def speed_ratio(result, base):
+    """Time per call relative to the baseline, corrected for machine speed."""
+    ratio = result["ns_per_call"] / base["ns_per_call"]
+    if result.get("calibration_ns") and base.get("calibration_ns"):
+        ratio /= result["calibration_ns"] / base["calibration_ns"]
+    return ratio
+
+
+def check(result, base, threshold):
+    """-> list of failure messages"""
+    if not base:
+        return []
+    failures = []
+    ratio = speed_ratio(result, base)
+    if ratio > 1.0 + threshold:
+        failures.append(f"time x{ratio:.2f} (calibrated) > x{1.0 + threshold:.2f}")
+    limit = base["peak_bytes_per_call"] * (1.0 + threshold) + ALLOC_SLACK
+    if result["peak_bytes_per_call"] > limit:
+        failures.append(f"peak alloc {result['peak_bytes_per_call']} B > {limit:.0f} B")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=N_LINES, help="Export rows used as inputs")
+    parser.add_argument("--repeat", type=int, default=REPEAT)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Allowed slowdown vs baseline (0.3 = 30%%)")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run a subset")
+    parser.add_argument("--baselines", default=BASELINES_PATH)
+    parser.add_argument("--update", action="store_true", help="Record the results as the new baselines")
+    args = parser.parse_args()
+
+    inputs = Inputs(args.lines)
+    baselines = load_baselines(args.baselines)
+    names = args.only or list(BENCHMARKS)
+    print(f"[BENCH] {len(inputs.raw)} lines, {len(inputs.feature_dicts)} dose windows, threshold {args.threshold:.0%}")
+    print(f"{'benchmark':<26}{'ns/call':>11}{'baseline':>11}{'ratio':>8}{'peak B':>9}{'kept B':>8}  status")
+
+    results, failed = {}, []
+    for name in names:
+        try:
+            fn, fn_args = BENCHMARKS[name](inputs)
+        except Skip as e:
+            print(f"{name:<26}{'-':>11}{'-':>11}{'-':>8}{'-':>9}{'-':>8}  skipped: {e}")
+            continue
+        sec, cal = time_per_call(fn, fn_args, args.repeat)
+        ns = sec * 1e9
+        peak, kept = allocations_per_call(fn, fn_args)
+        result = {
+            "ns_per_call": round(ns, 1),
+            "calibration_ns": round(cal * 1e9, 1),
+            "peak_bytes_per_call": int(peak),
+            "retained_bytes_per_call": round(kept, 1),
+        }
+        results[name] = result
+
+        base = baselines.get(name)
+        failures = [] if args.update else check(result, base, args.threshold)
+        if failures:
+            failed.append(name)
+        status = "FAIL: " + "; ".join(failures) if failures else ("new" if not base else "ok")
+        base_txt = f"{base['ns_per_call']:>11.0f}{speed_ratio(result, base):>8.2f}" if base else f"{'-':>11}{'-':>8}"
+        print(f"{name:<26}{ns:>11.0f}{base_txt}{peak:>9}{kept:>8.0f}  {status}")
+
+    if args.update:
+        merged = dict(baselines)
+        merged.update(results)
+        payload = {
+            "machine": {
+                "platform": platform.platform(),
+                "machine": platform.machine(),
+                "python": platform.python_version(),
+                "numpy": np.__version__,
+            },
+            "lines": len(inputs.raw),
+            "benchmarks": merged,
+        }
+        with open(args.baselines, "w", encoding="utf-8") as f:
+            json.dump(payload, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"\n[BENCH] Baselines saved: {args.baselines}")
+        return
+
+    if failed:
+        print(f"\n[RESULT] FAILED: {', '.join(failed)} regressed beyond {args.threshold:.0%}")
+        sys.exit(1)
+    print("\n[RESULT] OK")
+
+
+if __name__ == "__main__":
+    main()
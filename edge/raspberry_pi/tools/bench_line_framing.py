@@ -0,0 +1,119 @@
+"""
+Receive-path benchmark: str framing + parse_telemetry vs LineFramer +
+parse_telemetry_bytes, on a backlog replayed from the ThingSpeak export.
+
+The export is converted back into the gateway wire format
+(S1:..,S2:..,T:..,H:..,L:..\\n) and fed in chunks, like ser.read(256) during
+normal operation or one large read after a reconnect flushes the backlog.
+
+Run from edge/raspberry_pi:
+  python tools/bench_line_framing.py [--lines 19000] [--repeat 3]
+"""
+
+import argparse
+import csv
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+REPO_ROOT = os.path.dirname(os.path.dirname(BASE_DIR))
+sys.path.insert(0, os.path.join(BASE_DIR, "app"))
+sys.path.insert(0, BASE_DIR)
+
+from bt_inference_service import parse_telemetry  # noqa: E402
+from core.line_framer import LineFramer  # noqa: E402
+from core.telemetry import parse_telemetry_bytes  # noqa: E402
+
+EXPORT_PATH = os.path.join(REPO_ROOT, "tools", "dataset", "raw", "thingspeak_export_raw.csv")
+
+# (label, chunk size in bytes; 0 = whole backlog in one read)
+SCENARIOS = [
+    ("steady ser.read(256)", 256),
+    ("burst read(4096)", 4096),
+    ("reconnect backlog (single read)", 0),
+]
+
+
+def load_wire_lines(path, limit=None):
+    """ThingSpeak export rows -> gateway telemetry lines (bytes, with newline)."""
+    lines = []
+    with open(path, "r", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            try:
+                s1, s2, t, h, light = (float(row[f"field{i}"]) for i in range(1, 6))
+            except (TypeError, ValueError):
+                continue
+            lines.append(f"S1:{s1:.1f},S2:{s2:.1f},T:{t:.1f},H:{h:.1f},L:{light:.0f}\n".encode())
+            if limit and len(lines) >= limit:
+                break
+    return lines
+
+
+def chunked(payload: bytes, size: int):
+    if size <= 0:
+        return [payload]
+    return [payload[i : i + size] for i in range(0, len(payload), size)]
+
+
+def run_legacy(chunks):
+    """The original receive path: str buffer + split('\\n', 1) + dict parser."""
+    rx_buffer = ""
+    parsed = 0
+    for chunk in chunks:
+        rx_buffer += chunk.decode("utf-8", errors="replace")
+        while "\n" in rx_buffer:
+            line, rx_buffer = rx_buffer.split("\n", 1)
+            text = line.strip().strip("\r")
+            if not text:
+                continue
+            if parse_telemetry(text) is not None:
+                parsed += 1
+    return parsed
+
+
+def run_framer(chunks):
+    framer = LineFramer()
+    parsed = 0
+    for chunk in chunks:
+        for line in framer.feed(chunk):
+            if parse_telemetry_bytes(line) is not None:
+                parsed += 1
+    return parsed
+
+
+def best_of(fn, chunks, repeat):
+    best = float("inf")
+    result = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn(chunks)
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--export", default=EXPORT_PATH)
+    parser.add_argument("--lines", type=int, default=None, help="Limit backlog size")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    lines = load_wire_lines(args.export, args.lines)
+    payload = b"".join(lines)
+    print(f"[BENCH] Backlog: {len(lines)} lines, {len(payload) / 1024:.1f} KB")
+    print(f"{'scenario':<34}{'legacy lines/s':>16}{'framer lines/s':>16}{'speedup':>10}")
+
+    for label, size in SCENARIOS:
+        chunks = chunked(payload, size)
+        t_old, n_old = best_of(run_legacy, chunks, args.repeat)
+        t_new, n_new = best_of(run_framer, chunks, args.repeat)
+        if n_old != n_new:
+            raise AssertionError(f"{label}: parsed {n_old} (legacy) vs {n_new} (framer)")
+        print(
+            f"{label:<34}{n_old / t_old:>16,.0f}{n_new / t_new:>16,.0f}{t_old / t_new:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Replay check for the dose prediction cache (core/prediction_cache.py).
+
+The ThingSpeak export is replayed, in the gateway wire format, through two
+GatewayControllers with the production dose model: one with the service's
+PredictionCache, one that calls the model for every prediction. The check
+fails unless both give the same continuous prediction for every WATER_ON
+sample and the same CMD stream; the cache hit rate is reported.
+
+Run from edge/raspberry_pi:
+  python tools/dose_cache_check.py
+  python tools/dose_cache_check.py --lines 5000 --model model/dose/rf_dose_regressor_prod.joblib
+"""
+
+import argparse
+import os
+import sys
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "app"))
+sys.path.insert(0, os.path.join(BASE_DIR, "tools"))
+sys.path.insert(0, BASE_DIR)
+
+import bt_inference_service  # noqa: E402
+from bench_line_framing import EXPORT_PATH, load_wire_lines  # noqa: E402
+from core.dose_model import load_dose_model  # noqa: E402
+from core.prediction_cache import PredictionCache  # noqa: E402
+
+
+class RecordingCache(PredictionCache):
+    def __init__(self):
+        super().__init__()
+        self.values = []
+
+    def predict(self, model, X) -> float:
+        value = super().predict(model, X)
+        self.values.append(value)
+        return value
+
+
+class NoCache(RecordingCache):
+    """Same interface, every prediction straight from the model."""
+
+    def predict(self, model, X) -> float:
+        self.misses += 1
+        value = float(model.predict(X)[0])
+        self.values.append(value)
+        return value
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, default=0, help="Export rows to replay (0 = all)")
+    parser.add_argument("--model", help="Dose model artefact (default: the one the service loads)")
+    args = parser.parse_args()
+
+    dose_model, feature_names = bt_inference_service.load_dose_artifacts()
+    if args.model:
+        dose_model = load_dose_model(args.model)
+
+    controllers = []
+    for cache in (RecordingCache(), NoCache()):
+        controller = bt_inference_service.GatewayController(dose_model, feature_names)
+        controller.dose_cache = cache
+        controllers.append(controller)
+    cached, direct = controllers
+
+    lines = load_wire_lines(EXPORT_PATH, args.lines or None)
+    mismatched_cmds = 0
+    for line in lines:
+        line = line.rstrip(b"\n")
+        if cached.handle_line(line) != direct.handle_line(line):
+            mismatched_cmds += 1
+
+    a, b = cached.dose_cache.values, direct.dose_cache.values
+    mismatched_preds = sum(x != y for x, y in zip(a, b)) + abs(len(a) - len(b))
+    stats = cached.dose_cache.stats()
+    print(
+        f"[CHECK] {len(lines)} lines, {len(a)} dose predictions, "
+        f"{stats['hits']} cache hits ({100 * stats['hit_rate']:.1f}%), "
+        f"key: {'split cells' if cached.dose_cache._edges is not None else 'quantum'}"
+    )
+    print(f"[CHECK] predictions differing from the uncached model: {mismatched_preds}")
+    print(f"[CHECK] CMD replies differing: {mismatched_cmds}")
+
+    ok = mismatched_preds == 0 and mismatched_cmds == 0
+    print("[RESULT]", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+"""
+ESP32 gateway simulator: pty-backed fake rfcomm devices for developing and
+load-testing the Pi service off-device.
+
+Each simulated gateway (firmware/esp32_gateway) is a pseudo-terminal whose
+slave end is published under a stable path, --dir/rfcomm<N> (a symlink), so
+the services open it exactly like /dev/rfcomm<N> and reopen the same path
+after a link loss. Per device:
+
+  - telemetry in the gateway wire format, "S1:%.1f,S2:%.1f,T:%.1f,H:%.1f,L:%d\\n",
+    at --rate lines/s from a closed-loop soil model (dries between samples,
+    drops when a WATER_ON reaches the "pump") or replayed from a ThingSpeak
+    export (--export, e.g. from tools/make_synth_telemetry.py --thingspeak);
+  - replies parsed like the firmware (CMD:<WATER_ON|WATER_OFF>;SEC:<n>, legacy
+    DECISION:<...>); WATER_ON with SEC > 0 runs the pump for SEC seconds
+    (capped at 30 s like arduino_edge.ino);
+  - faults: fragmented writes (--frag), corrupted bytes (--corrupt), partial
+    lines without their tail (--partial), random disconnects (--disconnect-every)
+    and a reconnect storm (--storm-at / --storm-cycles) where the link flaps
+    quickly several times in a row.
+
+Like SerialBT, a device only sends while a client has the port open (lines
+are skipped and counted as offline otherwise). A disconnect closes the pty
+(the service's reads fail with EIO), removes the path while the link is down
+(reopening fails) and publishes a fresh pty at the same path when it comes
+back.
+
+Reported per device: lines sent / faulty, replies per command, unparsable
+replies, pump seconds, disconnects and reply latency (telemetry write ->
+CMD read; approximate when faulty lines also get replies).
+
+Run from edge/raspberry_pi:
+  python tools/gateway_simulator.py --devices 4 --rate 20 --duration 30 --with-service
+  python tools/gateway_simulator.py --devices 1 --rate 50 --disconnect-every 10 --with-service --service single
+  python tools/gateway_simulator.py --devices 2 --duration 0   # serve --dir/rfcomm* until Ctrl+C
+  python tools/gateway_simulator.py --devices 8 --rate 50 --frag 0.5 --corrupt 0.01 --partial 0.01 \\
+      --disconnect-every 20 --storm-at 10 --storm-cycles 8 --duration 60 --with-service
+"""
+
+import argparse
+import asyncio
+import errno
+import math
+import os
+import random
+import signal
+import subprocess
+import sys
+import time
+import tty
+from collections import Counter, deque
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from bench_line_framing import load_wire_lines  # noqa: E402
+
+DEFAULT_DIR = "/tmp/rfsim"
+SERVICES = {
+    "multi": os.path.join(BASE_DIR, "app", "multi_gateway_service.py"),
+    "single": os.path.join(BASE_DIR, "app", "bt_inference_service.py"),
+}
+
+READ_SIZE = 4096
+STATUS_EVERY = 5.0  # seconds between status lines
+WRITE_RETRY = 0.005  # pty buffer full (service not reading): retry after
+
+# Soil model (raw ADC units, HIGH = dry), per telemetry line
+SOIL_START = (440.0, 530.0)
+DRY_DRIFT = 0.8
+SOIL_NOISE = 1.5
+PUMP_GAIN = 4.0  # soil drop per pump second
+MAX_PUMP_SECONDS = 30  # arduino_edge.ino
+
+CORRUPT_BYTES = b"\x00\xff\xfe#?~"
+
+
+class SimDevice:
+    """One fake ESP32 gateway behind a pty published at `path`."""
+
+    def __init__(self, index, args, rng, wire_lines=None):
+        self.index = index
+        self.path = os.path.join(args.dir, f"rfcomm{index}")
+        self.args = args
+        self.rng = rng
+        self.wire_lines = wire_lines
+        self.wire_pos = rng.randrange(len(wire_lines)) if wire_lines else 0
+
+        self.level = rng.uniform(*SOIL_START)
+        self.offset = rng.uniform(20.0, 90.0)
+        self.phase = rng.uniform(0.0, 2 * math.pi)
+        self.n_lines = 0
+        self.pump_until = 0.0
+        self._merge_next = False  # a partial line swallows the start of the next one
+
+        self.stats = Counter()
+        self.latencies = []
+        self._pending = deque()  # write times of clean lines awaiting a reply
+        self._rx = bytearray()
+        self._master = None
+        self._connected = False
+
+    # ------------------------------------------------------------------ #
+    # Link
+    # ------------------------------------------------------------------ #
+    def open_link(self):
+        master, slave = os.openpty()
+        tty.setraw(slave)
+        os.set_blocking(master, False)
+        tmp = self.path + ".tmp"
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        os.symlink(os.ttyname(slave), tmp)
+        os.replace(tmp, self.path)
+        # Only the client holds the slave open: master reads fail with EIO
+        # until it connects and again after it hangs up.
+        os.close(slave)
+        self._master = master
+        self._connected = False
+
+    def close_link(self):
+        if self._master is None:
+            return
+        self._drop_client()
+        try:
+            os.close(self._master)
+        except OSError:
+            pass
+        self._master = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def connected(self) -> bool:
+        """True once a client has the port open (probed with a master read)."""
+        if self._connected:
+            return True
+        if self._master is None:
+            return False
+        try:
+            chunk = os.read(self._master, READ_SIZE)
+        except BlockingIOError:
+            chunk = b""
+        except OSError as e:
+            if e.errno == errno.EIO:
+                return False
+            raise
+        self._connected = True
+        self.stats["connects"] += 1
+        asyncio.get_running_loop().add_reader(self._master, self._on_readable)
+        if chunk:
+            self._on_chunk(chunk)
+        return True
+
+    def _drop_client(self):
+        if self._connected:
+            asyncio.get_running_loop().remove_reader(self._master)
+            self._connected = False
+        self._rx.clear()
+        self._merge_next = False
+        self.stats["unanswered"] += len(self._pending)
+        self._pending.clear()
+
+    async def bounce(self, down: float):
+        """Link loss for `down` seconds, then a fresh pty at the same path."""
+        self.close_link()
+        self.stats["disconnects"] += 1
+        await asyncio.sleep(down)
+        self.open_link()
+
+    # ------------------------------------------------------------------ #
+    # Replies (service -> gateway)
+    # ------------------------------------------------------------------ #
+    def _on_readable(self):
+        try:
+            chunk = os.read(self._master, READ_SIZE)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            if e.errno == errno.EIO:  # the client closed the port
+                self.stats["client_hangups"] += 1
+                self._drop_client()
+                return
+            raise
+        self._on_chunk(chunk)
+
+    def _on_chunk(self, chunk: bytes):
+        self._rx += chunk
+        while True:
+            i = self._rx.find(b"\n")
+            if i < 0:
+                return
+            line = bytes(self._rx[:i])
+            del self._rx[: i + 1]
+            self.handle_reply(line.decode("utf-8", errors="replace").strip())
+
+    def handle_reply(self, line: str):
+        if not line:
+            return
+        now = time.perf_counter()
+        if self._pending:
+            self.latencies.append(now - self._pending.popleft())
+        else:
+            self.stats["unmatched_replies"] += 1
+
+        # Same parsing as firmware/esp32_gateway/src/main.cpp
+        if line.startswith("CMD:"):
+            sec_index = line.find(";SEC:")
+            if sec_index < 0:
+                self.stats["bad_replies"] += 1
+                return
+            cmd = line[4:sec_index].strip()
+            digits = ""
+            for ch in line[sec_index + 5 :].strip():
+                if not ch.isdigit():
+                    break
+                digits += ch
+            seconds = int(digits or 0)
+            self.stats[f"cmd_{cmd}"] += 1
+            if cmd == "WATER_ON" and seconds > 0:
+                self.run_pump(min(seconds, MAX_PUMP_SECONDS))
+        elif line.startswith("DECISION:"):
+            self.stats["legacy_replies"] += 1
+        else:
+            self.stats["bad_replies"] += 1
+
+    def run_pump(self, seconds: int):
+        """A new WATER_ON restarts the pump timer: only the extension waters."""
+        now = time.monotonic()
+        watered = max(0.0, now + seconds - max(now, self.pump_until))
+        self.pump_until = now + seconds
+        self.level = max(300.0, self.level - PUMP_GAIN * watered)
+        self.stats["pump_seconds"] += watered
+
+    # ------------------------------------------------------------------ #
+    # Telemetry (gateway -> service)
+    # ------------------------------------------------------------------ #
+    def next_line(self) -> bytes:
+        self.n_lines += 1
+        if self.wire_lines:
+            line = self.wire_lines[self.wire_pos % len(self.wire_lines)]
+            self.wire_pos += 1
+            return line
+
+        rng = self.rng
+        self.level = min(700.0, self.level + DRY_DRIFT + rng.gauss(0.0, 0.3))
+        day = math.sin(2 * math.pi * self.n_lines / 480.0 + self.phase)  # 480 lines = 1 day at 3 min
+        s1 = self.level - self.offset / 2 + rng.gauss(0.0, SOIL_NOISE)
+        s2 = self.level + self.offset / 2 + rng.gauss(0.0, SOIL_NOISE)
+        temp = 17.0 + 3.0 * day + rng.gauss(0.0, 0.2)
+        hum = 70.0 - 6.0 * day + rng.gauss(0.0, 0.5)
+        light = max(0, int(60 + 600 * max(day, 0.0) + rng.gauss(0.0, 10.0)))
+        return f"S1:{s1:.1f},S2:{s2:.1f},T:{temp:.1f},H:{hum:.1f},L:{light}\n".encode()
+
+    def inject_faults(self, line: bytes):
+        """-> (chunks to write, clean)"""
+        args, rng = self.args, self.rng
+        clean = not self._merge_next
+        self._merge_next = False
+        if rng.random() < args.corrupt:
+            data = bytearray(line)
+            for _ in range(rng.randint(1, 3)):
+                data[rng.randrange(len(data) - 1)] = rng.choice(CORRUPT_BYTES)
+            line = bytes(data)
+            self.stats["corrupted"] += 1
+            clean = False
+        if rng.random() < args.partial:
+            line = line[: rng.randint(1, len(line) - 2)]  # tail (and newline) lost
+            self.stats["partial"] += 1
+            self._merge_next = True
+            clean = False
+        if args.frag > 0 and rng.random() < args.frag:
+            chunks, i = [], 0
+            while i < len(line):
+                n = rng.randint(1, args.frag_max)
+                chunks.append(line[i : i + n])
+                i += n
+            self.stats["fragmented"] += 1
+            return chunks, clean
+        return [line], clean
+
+    async def write(self, data: bytes):
+        while data:
+            if self._master is None:
+                return
+            try:
+                n = os.write(self._master, data)
+            except BlockingIOError:
+                self.stats["tx_blocked"] += 1
+                await asyncio.sleep(WRITE_RETRY)
+                continue
+            data = data[n:]
+
+    async def send_line(self):
+        if not self.connected():
+            self.stats["offline"] += 1
+            return
+        chunks, clean = self.inject_faults(self.next_line())
+        if clean:
+            self._pending.append(time.perf_counter())
+        for k, chunk in enumerate(chunks):
+            if k:
+                await asyncio.sleep(self.args.frag_delay_ms / 1000.0)
+            await self.write(chunk)
+        self.stats["lines"] += 1
+        if not clean:
+            self.stats["faulty"] += 1
+
+    # ------------------------------------------------------------------ #
+    async def run(self, stop: asyncio.Event, t_start: float):
+        args, rng = self.args, self.rng
+        interval = 1.0 / args.rate
+        next_send = time.monotonic()
+        next_drop = next_send + rng.expovariate(1.0 / args.disconnect_every) if args.disconnect_every > 0 else math.inf
+        storm_pending = args.storm_cycles > 0 and self.index < (args.storm_devices or args.devices)
+
+        self.open_link()
+        try:
+            while not stop.is_set():
+                now = time.monotonic()
+                if storm_pending and now - t_start >= args.storm_at:
+                    storm_pending = False
+                    for _ in range(args.storm_cycles):
+                        await self.bounce(rng.uniform(0.05, 0.5))
+                        await asyncio.sleep(rng.uniform(0.05, 0.5))
+                        await self.send_line()
+                    self.stats["storms"] += 1
+                    next_send = time.monotonic()
+                elif now >= next_drop:
+                    await self.bounce(rng.uniform(args.down_min, args.down_max))
+                    next_drop = time.monotonic() + rng.expovariate(1.0 / args.disconnect_every)
+                    next_send = time.monotonic()
+                elif now >= next_send:
+                    await self.send_line()
+                    next_send += interval
+                    if next_send < now - 1.0:  # far behind (blocked writes): do not burst
+                        next_send = now
+                else:
+                    await asyncio.sleep(min(next_send, next_drop) - now)
+        finally:
+            self.close_link()
+
+    def summary(self) -> str:
+        s = self.stats
+        lat = sorted(self.latencies)
+        if lat:
+            p50 = lat[len(lat) // 2] * 1e3
+            p99 = lat[min(len(lat) - 1, int(len(lat) * 0.99))] * 1e3
+            lat_txt = f"reply p50 {p50:.2f} ms p99 {p99:.2f} ms"
+        else:
+            lat_txt = "no replies"
+        return (
+            f"rfcomm{self.index}: sent {s['lines']} (faulty {s['faulty']}: corrupted {s['corrupted']}, "
+            f"partial {s['partial']}; fragmented {s['fragmented']}) | "
+            f"ON {s['cmd_WATER_ON']} OFF {s['cmd_WATER_OFF']} bad {s['bad_replies']} "
+            f"unanswered {s['unanswered']} | pump {s['pump_seconds']:.0f} s | "
+            f"disconnects {s['disconnects']} (client connects {s['connects']}) | offline {s['offline']} | tx blocked {s['tx_blocked']} | {lat_txt}"
+        )
+
+
+# --------------------------------------------------------------------------- #
+def start_service(kind, paths, log_path):
+    """
+    The service on the simulated devices (own process, own log): "multi" =
+    app/multi_gateway_service.py on every path, "single" =
+    app/bt_inference_service.py (pyserial reader/pipeline) on the one path.
+    """
+    cmd = [sys.executable, SERVICES[kind]]
+    for path in paths:
+        cmd += ["--port", path]
+    env = dict(os.environ, METRICS_PORT="0")
+    log = open(log_path, "w", encoding="utf-8")
+    return subprocess.Popen(cmd, cwd=BASE_DIR, env=env, stdout=log, stderr=subprocess.STDOUT), log
+
+
+def service_reconnects(log_path, devices):
+    """Serial errors per device in the service log (single-port logs carry no device prefix)."""
+    counts = Counter()
+    try:
+        with open(log_path, "r", encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if "Serial error" in line:
+                    for dev in devices:
+                        if len(devices) == 1 or f"[rfcomm{dev.index}]" in line:
+                            counts[dev.index] += 1
+    except OSError:
+        pass
+    return counts
+
+
+async def simulate(args, devices, log_path=None):
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    t_start = time.monotonic()
+    tasks = [asyncio.ensure_future(d.run(stop, t_start)) for d in devices]
+    await asyncio.sleep(0)  # links published
+    print(f"[SIM] {len(devices)} device(s): " + ", ".join(d.path for d in devices))
+
+    service = service_log = None
+    if log_path:
+        service, service_log = start_service(args.service, [d.path for d in devices], log_path)
+        print(f"[SIM] Service pid {service.pid}, log: {log_path}")
+
+    last = Counter()
+    try:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=STATUS_EVERY)
+            except asyncio.TimeoutError:
+                pass
+            elapsed = time.monotonic() - t_start
+            total = sum((d.stats for d in devices), Counter())
+            rate = (total["lines"] - last["lines"]) / STATUS_EVERY
+            print(
+                f"[SIM] t={elapsed:6.1f}s lines={total['lines']} ({rate:.0f}/s) "
+                f"replies={total['cmd_WATER_ON'] + total['cmd_WATER_OFF']} disconnects={total['disconnects']}"
+            )
+            last = total
+            if args.duration and elapsed >= args.duration:
+                stop.set()
+    finally:
+        stop.set()
+        if service is not None:
+            # Service first, so closing the links is not counted as a reconnect
+            service.send_signal(signal.SIGTERM)
+            try:
+                await loop.run_in_executor(None, service.wait, 10)
+            except subprocess.TimeoutExpired:
+                service.kill()
+            service_log.close()
+        await asyncio.gather(*tasks)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=2)
+    parser.add_argument("--dir", default=DEFAULT_DIR, help="Where the rfcomm<N> links are published")
+    parser.add_argument("--rate", type=float, default=1.0, help="Telemetry lines per second per device")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds (0 = until Ctrl+C)")
+    parser.add_argument("--export", help="Replay a ThingSpeak export instead of the soil model")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--frag", type=float, default=0.0, help="Share of lines written in fragments")
+    parser.add_argument("--frag-max", type=int, default=8, help="Max fragment size in bytes")
+    parser.add_argument("--frag-delay-ms", type=float, default=1.0, help="Pause between fragments")
+    parser.add_argument("--corrupt", type=float, default=0.0, help="Share of lines with corrupted bytes")
+    parser.add_argument("--partial", type=float, default=0.0, help="Share of lines cut short (no newline)")
+    parser.add_argument("--disconnect-every", type=float, default=0.0, help="Mean seconds between link losses (0 = never)")
+    parser.add_argument("--down-min", type=float, default=0.5, help="Min link-down time (s)")
+    parser.add_argument("--down-max", type=float, default=5.0, help="Max link-down time (s)")
+    parser.add_argument("--storm-at", type=float, default=10.0, help="Seconds before the reconnect storm")
+    parser.add_argument("--storm-cycles", type=int, default=0, help="Quick disconnect/reconnect cycles (0 = no storm)")
+    parser.add_argument("--storm-devices", type=int, default=0, help="Devices in the storm (0 = all)")
+    parser.add_argument("--with-service", action="store_true", help="Also run the service (--service) on the devices")
+    parser.add_argument(
+        "--service",
+        choices=sorted(SERVICES),
+        default="multi",
+        help="multi = app/multi_gateway_service.py, single = app/bt_inference_service.py (one device)",
+    )
+    args = parser.parse_args()
+
+    if args.rate <= 0:
+        parser.error("--rate must be > 0")
+    if args.with_service and args.service == "single" and args.devices != 1:
+        parser.error("--service single serves one port: use --devices 1")
+    os.makedirs(args.dir, exist_ok=True)
+    wire_lines = load_wire_lines(args.export) if args.export else None
+    if args.export and not wire_lines:
+        parser.error(f"No telemetry rows in {args.export}")
+
+    rng = random.Random(args.seed)
+    devices = [SimDevice(i, args, random.Random(rng.random()), wire_lines) for i in range(args.devices)]
+
+    log_path = os.path.join(args.dir, "service.log") if args.with_service else None
+    asyncio.run(simulate(args, devices, log_path))
+
+    print()
+    reconnects = service_reconnects(log_path, devices) if log_path else {}
+    for d in devices:
+        extra = f" | service reconnects {reconnects.get(d.index, 0)}" if log_path else ""
+        print("[SIM] " + d.summary() + extra)
+
+
+if __name__ == "__main__":
+    main()
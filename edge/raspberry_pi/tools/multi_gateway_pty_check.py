@@ -0,0 +1,101 @@
+"""
+Local sanity check for the asyncio multi-gateway service without Bluetooth.
+
+It creates one pty pair per fake gateway, serves the slave ends with
+app/multi_gateway_service.py (as if they were /dev/rfcomm0, /dev/rfcomm1, ...),
+writes telemetry into the master ends and checks that every gateway gets its
+own `CMD:` replies:
+  - gateway 0 reports dry soil  -> WATER_ON (dose once the PRE window is full)
+  - gateway 1 reports wet soil  -> WATER_OFF
+Lines are written in small fragments to exercise the per-port line buffers.
+
+Run from edge/raspberry_pi:
+  python tools/multi_gateway_pty_check.py
+"""
+
+import asyncio
+import os
+import sys
+import tty
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "app"))
+sys.path.insert(0, BASE_DIR)
+
+import multi_gateway_service  # noqa: E402
+
+N_LINES = 12
+FRAGMENT = 7  # bytes per write, to force partial lines
+
+GATEWAYS = [
+    {"s1": 540.0, "s2": 530.0, "expect": "WATER_ON"},
+    {"s1": 400.0, "s2": 410.0, "expect": "WATER_OFF"},
+]
+
+
+def open_pty_pair():
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    return master, slave, os.ttyname(slave)
+
+
+async def feed(master, gw):
+    for i in range(N_LINES):
+        line = f"S1:{gw['s1'] + i % 3:.1f},S2:{gw['s2']:.1f},T:21.5,H:60.0,L:300\n".encode()
+        for k in range(0, len(line), FRAGMENT):
+            os.write(master, line[k : k + FRAGMENT])
+            await asyncio.sleep(0.001)
+        await asyncio.sleep(0.01)
+
+
+async def collect(master, n_expected, timeout=5.0):
+    loop = asyncio.get_running_loop()
+    buf = bytearray()
+    deadline = loop.time() + timeout
+    while buf.count(b"\n") < n_expected and loop.time() < deadline:
+        try:
+            buf += os.read(master, 1024)
+        except BlockingIOError:
+            await asyncio.sleep(0.01)
+    return buf.decode().splitlines()
+
+
+async def run_check():
+    pairs = [open_pty_pair() for _ in GATEWAYS]
+    for master, _, _ in pairs:
+        os.set_blocking(master, False)
+
+    stop = asyncio.Event()
+    server = asyncio.ensure_future(
+        multi_gateway_service.serve([path for _, _, path in pairs], stop=stop)
+    )
+    await asyncio.sleep(0.5)  # let every port open
+
+    replies = await asyncio.gather(
+        *(feed(m, gw) for (m, _, _), gw in zip(pairs, GATEWAYS)),
+        *(collect(m, N_LINES) for m, _, _ in pairs),
+    )
+    replies = replies[len(GATEWAYS):]
+
+    stop.set()
+    await server
+    for master, slave, _ in pairs:
+        os.close(master)
+        os.close(slave)
+
+    ok = True
+    for i, (gw, lines) in enumerate(zip(GATEWAYS, replies)):
+        decisions = {ln.split(";")[0] for ln in lines}
+        dosed = [ln for ln in lines if not ln.endswith("SEC:0")]
+        print(f"[CHECK] gateway {i}: {len(lines)} replies, decisions={sorted(decisions)}, dosed={len(dosed)}")
+        if len(lines) != N_LINES or decisions != {f"CMD:{gw['expect']}"}:
+            ok = False
+        if gw["expect"] == "WATER_ON" and not dosed:
+            ok = False
+    return ok
+
+
+if __name__ == "__main__":
+    ok = asyncio.run(run_check())
+    print("[RESULT]", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
@@ -0,0 +1,249 @@
+"""
+End-to-end replay benchmark for the Bluetooth inference service.
+
+The ThingSpeak export (tools/dataset/raw/thingspeak_export_raw.csv) is turned
+back into the gateway wire format and written into the master side of a
+pseudo-terminal. The real service loop (bt_inference_service.run) reads the
+slave side exactly as it would read /dev/rfcomm0, and its `CMD:` replies are
+collected from the master side.
+
+Reported:
+  - sustained throughput (lines/s, first write -> last reply)
+  - per-stage latency percentiles: framing, rx_wait, parse, decision,
+    dose_features, predict, tx
+  - pipeline queue high-water marks (--inline: the single-threaded loop)
+  - the CMD stream, optionally saved (--cmd-out) and diffed against a previous
+    run (--compare) to catch behavioural regressions
+
+Run from edge/raspberry_pi:
+  python tools/replay_benchmark.py --lines 5000 --rate 0 --frag-min 1 --frag-max 40
+"""
+
+import argparse
+import os
+import random
+import select
+import sys
+import threading
+import time
+import tty
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+EDGE_DIR = os.path.dirname(BASE_DIR)
+sys.path.insert(0, os.path.join(EDGE_DIR, "app"))
+sys.path.insert(0, EDGE_DIR)
+
+import bt_inference_service  # noqa: E402
+from bench_line_framing import EXPORT_PATH, load_wire_lines  # noqa: E402
+from core.log import setup_logging  # noqa: E402
+from core.stage_timer import STAGES, StageRecorder  # noqa: E402
+from core.telemetry_store import TelemetryStore  # noqa: E402
+
+IDLE_TIMEOUT = 5.0  # seconds without replies after the last write -> stop
+
+
+def fragment(line: bytes, rng: random.Random, lo: int, hi: int):
+    """Split one line into random-sized pieces (lo..hi bytes); lo=0 keeps it whole."""
+    if lo <= 0:
+        return [line]
+    parts = []
+    i = 0
+    while i < len(line):
+        n = rng.randint(lo, max(lo, hi))
+        parts.append(line[i : i + n])
+        i += n
+    return parts
+
+
+def writer(master, lines, args, state):
+    rng = random.Random(args.seed)
+    period = 1.0 / args.rate if args.rate > 0 else 0.0
+    frag_delay = args.frag_delay_ms / 1000.0
+
+    state["t_first_write"] = time.perf_counter()
+    for i, line in enumerate(lines):
+        if period:
+            delay = state["t_first_write"] + i * period - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        for piece in fragment(line, rng, args.frag_min, args.frag_max):
+            os.write(master, piece)
+            if frag_delay:
+                time.sleep(frag_delay)
+    state["t_last_write"] = time.perf_counter()
+
+
+def reader(master, expected, state):
+    buf = bytearray()
+    replies = state["replies"]
+    last_rx = time.perf_counter()
+
+    while len(replies) < expected:
+        ready, _, _ = select.select([master], [], [], 0.05)
+        chunk = b""
+        if ready:
+            try:
+                chunk = os.read(master, 4096)
+            except OSError:
+                break
+
+        now = time.perf_counter()
+        if chunk:
+            last_rx = now
+            buf += chunk
+            while True:
+                end = buf.find(b"\n")
+                if end < 0:
+                    break
+                replies.append(bytes(buf[:end]).decode())
+                del buf[: end + 1]
+            state["t_last_reply"] = now
+        elif "t_last_write" in state and now - last_rx > IDLE_TIMEOUT:
+            break
+
+
+def fmt_us(seconds):
+    return f"{seconds * 1e6:10.1f}"
+
+
+def report(lines, state, recorder, args):
+    replies = state["replies"]
+    t0 = state["t_first_write"]
+    t1 = state.get("t_last_reply", time.perf_counter())
+    elapsed = max(t1 - t0, 1e-9)
+
+    print("\n---- Replay benchmark ----")
+    print(f"Lines sent: {len(lines)} | replies: {len(replies)} | elapsed: {elapsed:.2f} s")
+    print(f"Sustained throughput: {len(replies) / elapsed:,.0f} lines/s")
+    print(
+        f"Rate: {'max' if args.rate <= 0 else args.rate} lines/s | "
+        f"fragments: {args.frag_min}-{args.frag_max} B | read timeout: {args.read_timeout} s | "
+        f"loop: {'inline' if args.inline else f'pipelined (rx {args.rx_queue}, {args.rx_policy})'}"
+    )
+
+    summary = recorder.summary()
+    print(f"\n{'stage':<15}{'count':>8}{'mean us':>10}{'p50 us':>10}{'p90 us':>10}{'p99 us':>10}{'max us':>10}")
+    for stage in STAGES:
+        st = summary.get(stage)
+        if not st or not st["count"]:
+            continue
+        print(
+            f"{stage:<15}{st['count']:>8}{fmt_us(st['mean'])}{fmt_us(st['p50'])}"
+            f"{fmt_us(st['p90'])}{fmt_us(st['p99'])}{fmt_us(st['max'])}"
+        )
+
+    if recorder.events:
+        print("\nEvents: " + ", ".join(f"{k}={v}" for k, v in sorted(recorder.events.items())))
+    if recorder.gauges:
+        print("Gauges: " + ", ".join(f"{k}={v:g}" for k, v in sorted(recorder.gauges.items())))
+
+    print("\nCommands:")
+    for cmd, n in sorted(Counter(replies).items()):
+        print(f"  {cmd}: {n}")
+
+
+def compare(replies, path):
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = [ln.rstrip("\n") for ln in f]
+
+    diffs = [i for i, (a, b) in enumerate(zip(baseline, replies)) if a != b]
+    if len(baseline) != len(replies):
+        print(f"[COMPARE] Length differs: baseline={len(baseline)} current={len(replies)}")
+    if diffs:
+        i = diffs[0]
+        print(f"[COMPARE] {len(diffs)} differing commands; first at #{i}: {baseline[i]!r} != {replies[i]!r}")
+        return False
+    if len(baseline) != len(replies):
+        return False
+    print(f"[COMPARE] CMD stream identical to {path}")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--export", default=EXPORT_PATH)
+    parser.add_argument("--lines", type=int, default=None, help="Replay only the first N samples")
+    parser.add_argument("--rate", type=float, default=0.0, help="Lines per second (0 = as fast as possible)")
+    parser.add_argument("--frag-min", type=int, default=0, help="Min fragment size in bytes (0 = whole lines)")
+    parser.add_argument("--frag-max", type=int, default=0, help="Max fragment size in bytes")
+    parser.add_argument("--frag-delay-ms", type=float, default=0.0, help="Pause between fragments")
+    parser.add_argument("--read-timeout", type=float, default=0.5, help=f"Service serial timeout (prod: {bt_inference_service.TIMEOUT})")
+    parser.add_argument("--startup-delay", type=float, default=2.0, help="Wait for the service to open the port")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--inline", action="store_true", help="Single-threaded service loop (no reader/TX threads)")
+    parser.add_argument("--rx-queue", type=int, default=bt_inference_service.RX_QUEUE_LINES)
+    parser.add_argument(
+        "--rx-policy", default=bt_inference_service.RX_QUEUE_POLICY, choices=("block", "drop_oldest")
+    )
+    parser.add_argument("--cmd-out", help="Save the CMD stream (one per line)")
+    parser.add_argument("--compare", help="Diff the CMD stream against a saved one")
+    parser.add_argument("--store-dir", help="Also append every sample to a telemetry store under this directory")
+    parser.add_argument("--show-log", action="store_true", help="Print the service's own log output")
+    parser.add_argument(
+        "--log-level",
+        default=None,
+        help="Run the service logging at this level (to /dev/null unless --show-log) to measure its cost",
+    )
+    args = parser.parse_args()
+
+    lines = load_wire_lines(args.export, args.lines)
+
+    master, slave = os.openpty()
+    tty.setraw(slave)
+    port = os.ttyname(slave)
+
+    recorder = StageRecorder()
+    stop = threading.Event()
+    state = {"replies": []}
+
+    logs = None
+    if args.show_log or args.log_level:
+        logs = setup_logging(
+            level=args.log_level or "DEBUG",
+            path=None if args.show_log else os.devnull,
+        )
+
+    service = threading.Thread(
+        target=bt_inference_service.run,
+        kwargs={
+            "port": port,
+            "timeout": args.read_timeout,
+            "profiler": recorder,
+            "stop_event": stop,
+            "store": TelemetryStore(args.store_dir) if args.store_dir else None,
+            "pipelined": not args.inline,
+            "rx_queue": args.rx_queue,
+            "rx_policy": args.rx_policy,
+        },
+        daemon=True,
+    )
+    service.start()
+    time.sleep(args.startup_delay)
+
+    rx = threading.Thread(target=reader, args=(master, len(lines), state), daemon=True)
+    rx.start()
+    writer(master, lines, args, state)
+    rx.join()
+
+    stop.set()
+    service.join(timeout=args.read_timeout + 3.0)
+    if logs is not None:
+        logs.stop()
+
+    os.close(master)
+    os.close(slave)
+
+    report(lines, state, recorder, args)
+
+    if args.cmd_out:
+        with open(args.cmd_out, "w", encoding="utf-8") as f:
+            f.writelines(f"{cmd}\n" for cmd in state["replies"])
+        print(f"\nSaved CMD stream: {args.cmd_out}")
+
+    if args.compare and not compare(state["replies"], args.compare):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Compare shadow-evaluated candidate models (core/shadow.py) against the live
+controller on real traffic: accuracy vs the live rule / dose and cost.
+
+  python tools/shadow_report.py                           # every gateway, every day
+  python tools/shadow_report.py --gateway rfcomm1 --start 20251201
+
+Per candidate:
+  ON/OFF models: agreement with the hysteresis rule, predicted vs live ON
+  rate, precision/recall of WATER_ON (the rule as reference)
+  dose models:   share of WATER_ON samples with the same snapped seconds,
+  mean absolute error vs the seconds sent
+  both:          latency p50 / p99 / max (us) inside the worker
+
+Run from edge/raspberry_pi.
+"""
+
+import argparse
+import glob
+import os
+import sys
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from core.shadow import ALLOWED_SECONDS, LOG_SUFFIX, ON_THRESHOLD, read_shadow_log  # noqa: E402
+
+DEFAULT_ROOT = os.path.join(BASE_DIR, "data", "shadow")
+
+
+def log_files(root, gateway, start, end):
+    pattern = os.path.join(root, gateway or "*", "*" + LOG_SUFFIX)
+    for path in sorted(glob.glob(pattern)):
+        day = os.path.basename(path)[:8]
+        if (start and day < start) or (end and day > end):
+            continue
+        yield path
+
+
+def collect(paths):
+    """model name -> (kind, list of record arrays)"""
+    models = {}
+    for path in paths:
+        try:
+            header, records = read_shadow_log(path)
+        except (OSError, ValueError) as e:
+            print(f"[WARN] Skipping {path}: {e}")
+            continue
+        for i, model in enumerate(header["models"]):
+            rows = records[records["model"] == i]
+            if len(rows):
+                models.setdefault(model["name"], (model["kind"], []))[1].append(rows)
+    return {name: (kind, np.concatenate(parts)) for name, (kind, parts) in models.items()}
+
+
+def onoff_line(rows):
+    live = rows["live"].astype(bool)
+    pred = rows["pred"] >= ON_THRESHOLD
+    tp = int(np.sum(pred & live))
+    precision = tp / pred.sum() if pred.any() else float("nan")
+    recall = tp / live.sum() if live.any() else float("nan")
+    return (
+        f"ON rate {100 * pred.mean():5.1f}% (live {100 * live.mean():5.1f}%) | "
+        f"precision {precision:.3f} recall {recall:.3f}"
+    )
+
+
+def dose_line(rows):
+    allowed = np.asarray(ALLOWED_SECONDS)
+    snapped = allowed[np.argmin(np.abs(rows["pred"][:, None] - allowed), axis=1)]
+    live = rows["live_sec"].astype(float)
+    return (
+        f"MAE {np.mean(np.abs(snapped - live)):5.2f} s (raw {np.mean(np.abs(rows['pred'] - live)):5.2f} s) | "
+        f"mean dose {snapped.mean():5.1f} s (live {live.mean():5.1f} s)"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    parser.add_argument("--gateway", default="", help="Gateway directory (default: all)")
+    parser.add_argument("--start", help="First UTC day, YYYYMMDD")
+    parser.add_argument("--end", help="Last UTC day, YYYYMMDD")
+    args = parser.parse_args()
+
+    paths = list(log_files(args.root, args.gateway, args.start, args.end))
+    if not paths:
+        print(f"No shadow logs under {args.root}")
+        return
+    models = collect(paths)
+    print(f"{len(paths)} log file(s), {len(models)} candidate(s)\n")
+
+    print(f"{'model':<28}{'kind':<7}{'samples':>9}{'agree':>8}{'p50 us':>9}{'p99 us':>9}{'max us':>9}")
+    details = []
+    for name, (kind, rows) in sorted(models.items()):
+        lat = rows["latency_us"]
+        print(
+            f"{name:<28}{kind:<7}{len(rows):>9}{100 * rows['agree'].mean():>7.1f}%"
+            f"{np.percentile(lat, 50):>9.0f}{np.percentile(lat, 99):>9.0f}{lat.max():>9.0f}"
+        )
+        details.append(f"  {name}: " + (dose_line(rows) if kind == "dose" else onoff_line(rows)))
+
+    print()
+    print("\n".join(details))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Inspect / export the on-device telemetry history written by the service
+(core/telemetry_store.py), without any CSV parsing on the way in.
+
+  python tools/telemetry_history.py                       # per-day summary
+  python tools/telemetry_history.py --gateway rfcomm1 --start 20251201
+  python tools/telemetry_history.py --csv /tmp/dataset_base.csv
+
+--csv writes the same columns as tools/dataset/processed/dataset_base.csv
+(timestamp, entry_id, soil1, soil2, temperature, humidity, light, decision,
+soil_avg, soil_diff) plus dose_sec, so the training scripts can use it as is.
+
+Run from edge/raspberry_pi.
+"""
+
+import argparse
+import os
+import sys
+from datetime import datetime, timezone
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from core.telemetry_store import open_history, read_history  # noqa: E402
+
+DEFAULT_ROOT = os.path.join(BASE_DIR, "data", "telemetry")
+
+
+def summary(root, gateway, start, end):
+    total = 0
+    print(f"{'day':<10}{'samples':>9}{'WATER_ON':>10}{'dosed':>7}{'soil_avg min/mean/max':>26}")
+    for day, rec in open_history(root, gateway, start, end):
+        n = len(rec)
+        total += n
+        if not n:
+            print(f"{day:<10}{0:>9}")
+            continue
+        soil_avg = 0.5 * (rec["s1"] + rec["s2"])
+        print(
+            f"{day:<10}{n:>9}{int(rec['decision'].sum()):>10}{int((rec['dose_sec'] > 0).sum()):>7}"
+            f"{soil_avg.min():>10.1f}/{soil_avg.mean():.1f}/{soil_avg.max():.1f}"
+        )
+    print(f"[HISTORY] {total} samples")
+
+
+def export_csv(root, gateway, start, end, path):
+    rec = read_history(root, gateway, start, end)
+    s1 = rec["s1"].astype(float)
+    s2 = rec["s2"].astype(float)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("timestamp,entry_id,soil1,soil2,temperature,humidity,light,decision,soil_avg,soil_diff,dose_sec\n")
+        for i in range(len(rec)):
+            ts = datetime.fromtimestamp(float(rec["ts"][i]), tz=timezone.utc)
+            f.write(
+                f"{ts.isoformat(sep=' ', timespec='seconds')},{i + 1},{s1[i]:.1f},{s2[i]:.1f},"
+                f"{rec['temperature'][i]:.1f},{rec['humidity'][i]:.1f},{rec['light'][i]:.0f},"
+                f"{int(rec['decision'][i])},{0.5 * (s1[i] + s2[i]):.1f},{abs(s1[i] - s2[i]):.1f},"
+                f"{int(rec['dose_sec'][i])}\n"
+            )
+    print(f"[HISTORY] Wrote {len(rec)} rows -> {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--root", default=DEFAULT_ROOT)
+    parser.add_argument("--gateway", default="", help="Gateway label (multi-gateway mode), default: single port")
+    parser.add_argument("--start", help="First day, YYYYMMDD (UTC)")
+    parser.add_argument("--end", help="Last day, YYYYMMDD (UTC)")
+    parser.add_argument("--csv", help="Export to CSV in dataset_base.csv format")
+    args = parser.parse_args()
+
+    if args.csv:
+        export_csv(args.root, args.gateway, args.start, args.end, args.csv)
+    else:
+        summary(args.root, args.gateway, args.start, args.end)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Local check for the ThingSpeak uploader (core/uploader.py) against a stand-in
+bulk_update server, no internet needed.
+
+Scenario:
+  1. samples are submitted while the "cloud" is down (connection refused)
+     -> the uploader backs off and keeps them in its SQLite queue,
+  2. the uploader is stopped with samples still queued and a new one is
+     started on the same queue file (service restart),
+  3. the stand-in server comes up but answers the first requests with 503
+     -> more backoff,
+  4. everything is delivered: every sample exactly once, in order, in
+     batches no larger than the configured batch size.
+
+Run from edge/raspberry_pi:
+  python tools/uploader_check.py [--samples 250] [--batch 40]
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_DIR)
+
+from core.log import setup_logging  # noqa: E402
+from core.uploader import ThingSpeakUploader  # noqa: E402
+
+API_KEY = "TESTKEY"
+
+
+class StandIn:
+    """Minimal ThingSpeak bulk_update endpoint: records updates, can fail on purpose."""
+
+    def __init__(self, port: int, fail_first: int = 0):
+        self.updates = []
+        self.requests = 0
+        self.batch_sizes = []
+        self.fail_first = fail_first
+        outer = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                outer.requests += 1
+                if outer.fail_first > 0:
+                    outer.fail_first -= 1
+                    self._reply(503, {"error": "try later"})
+                elif body.get("write_api_key") != API_KEY:
+                    self._reply(401, {"error": "bad key"})
+                else:
+                    outer.batch_sizes.append(len(body["updates"]))
+                    outer.updates.extend(body["updates"])
+                    self._reply(202, {"success": True})
+
+            def _reply(self, status, obj):
+                data = json.dumps(obj).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def make_uploader(url, db_path, batch):
+    return ThingSpeakUploader(
+        url,
+        API_KEY,
+        db_path,
+        batch_size=batch,
+        min_interval=0.05,
+        max_delay=0.2,
+        backoff_base=0.1,
+        backoff_max=0.5,
+    ).start()
+
+
+def wait_for(cond, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return cond()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=250)
+    parser.add_argument("--batch", type=int, default=40)
+    parser.add_argument("--show-log", action="store_true")
+    args = parser.parse_args()
+
+    logs = setup_logging(level="INFO") if args.show_log else None
+
+    port = free_port()
+    url = f"http://127.0.0.1:{port}/channels/1/bulk_update.json"
+    db_path = os.path.join(tempfile.mkdtemp(prefix="ts_queue_"), "queue.sqlite3")
+    t0 = time.time() - args.samples  # sample timestamps in the past
+    half = args.samples // 2
+
+    # 1) offline: nothing listens on the port
+    up = make_uploader(url, db_path, args.batch)
+    for i in range(half):
+        up.submit(t0 + i, 500.0 + i, 510.0, 21.5, 60.0, 300.0, i % 2, 14 if i % 2 else 0)
+    wait_for(lambda: up.failed_requests >= 2, 5.0)
+    failed_offline = up.failed_requests
+
+    # 2) restart with samples still queued on disk
+    up.stop()
+    up = make_uploader(url, db_path, args.batch)
+    for i in range(half, args.samples):
+        up.submit(t0 + i, 500.0 + i, 510.0, 21.5, 60.0, 300.0, i % 2, 14 if i % 2 else 0)
+
+    # 3) the cloud comes back, flaky at first
+    server = StandIn(port, fail_first=2)
+    delivered = wait_for(lambda: len(server.updates) >= args.samples and up.backlog == 0, 20.0)
+    up.stop()
+    server.stop()
+    if logs is not None:
+        logs.stop()
+
+    got = [u["field1"] for u in server.updates]
+    expected = [500.0 + i for i in range(args.samples)]
+    ok = delivered and got == expected and max(server.batch_sizes, default=0) <= args.batch
+
+    print(f"[CHECK] offline failures before restart: {failed_offline}")
+    print(f"[CHECK] requests: {server.requests} (503s: 2), batches: {server.batch_sizes}")
+    print(f"[CHECK] delivered {len(got)}/{args.samples}, in order: {got == expected}, queued left: {up.backlog}")
+    print("[RESULT]", "OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,10 @@
+import argparse
 import os
 import pandas as pd
 import numpy as np
 
+from columnar_cache import read_csv_cached, to_csv_cached
+
 # ---- Configuration ----
 DATASET_PATH = "tools/dataset/processed/dataset_base.csv"
 EVENTS_PATH = "data/labels/irrigation_events.csv"
@@ -15,6 +18,18 @@ POST_MINUTES = 240
 MIN_PRE_SAMPLES = 5
 MIN_POST_SAMPLES = 20
 
+# Base feature columns (adjust if your CSV uses different names)
+BASE_COLS = [
+    "soil1",
+    "soil2",
+    "soil_avg",
+    "soil_diff",
+    "temperature",
+    "humidity",
+    "light",
+]
+POST_COLS = ["soil_avg", "soil_diff", "soil1", "soil2"]
+
 # ---- Helper functions ----
 def safe_mean(x):
     return float(np.nanmean(x)) if len(x) else np.nan
@@ -33,21 +48,10 @@ def safe_max(x):
 
 
 def build_row(pre_df, post_df, event_row):
-    # Base feature columns (adjust if your CSV uses different names)
-    base_cols = [
-        "soil1",
-        "soil2",
-        "soil_avg",
-        "soil_diff",
-        "temperature",
-        "humidity",
-        "light",
-    ]
-
     feats = {}
 
     # --- Statistics from PRE-irrigation window ---
-    for c in base_cols:
+    for c in BASE_COLS:
         v = pre_df[c].to_numpy()
         feats[f"{c}_pre_mean"] = safe_mean(v)
         feats[f"{c}_pre_std"] = safe_std(v)
@@ -55,7 +59,7 @@ def build_row(pre_df, post_df, event_row):
         feats[f"{c}_pre_max"] = safe_max(v)
 
     # --- Statistics from POST-irrigation window ---
-    for c in ["soil_avg", "soil_diff", "soil1", "soil2"]:
+    for c in POST_COLS:
         v = post_df[c].to_numpy()
         feats[f"{c}_post_min"] = safe_min(v)
         feats[f"{c}_post_max"] = safe_max(v)
@@ -89,35 +93,8 @@ def build_row(pre_df, post_df, event_row):
     return feats
 
 
-def main():
-    os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
-
-    df = pd.read_csv(DATASET_PATH)
-    events = pd.read_csv(EVENTS_PATH)
-
-    # Parse timestamps while preserving timezone (UTC)
-    df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
-    events["timestamp"] = pd.to_datetime(events["timestamp"], utc=True)
-    events["irrigation_seconds"] = pd.to_numeric(events.get("irrigation_seconds"), errors="coerce")
-
-    # Sort data chronologically
-    df = df.sort_values("timestamp").reset_index(drop=True)
-    events = events.sort_values("timestamp").reset_index(drop=True)
-
-    # Ensure required feature columns exist
-    required = {
-        "soil1",
-        "soil2",
-        "soil_avg",
-        "soil_diff",
-        "temperature",
-        "humidity",
-        "light",
-    }
-    missing = required - set(df.columns)
-    if missing:
-        raise ValueError(f"Missing required columns in dataset_base.csv: {missing}")
-
+def build_rows_loop(df, events):
+    """Reference implementation: boolean-mask each window, one event at a time."""
     rows = []
     for _, ev in events.iterrows():
         t = ev["timestamp"]
@@ -141,10 +118,191 @@ def main():
         row = build_row(pre_df, post_df, ev)
         rows.append(row)
 
-    out = pd.DataFrame(rows)
-    out.to_csv(OUT_PATH, index=False)
+    return pd.DataFrame(rows)
+
+
+def _gather(lo, hi):
+    """Flat row indices of all windows [lo_i, hi_i) plus their group starts."""
+    lengths = hi - lo
+    starts = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+    idx = np.repeat(lo - starts, lengths) + np.arange(lengths.sum())
+    return idx, starts, lengths
+
+
+def _window_stats(values, idx, starts, lengths):
+    """NaN-aware mean/std/min/max per window (same semantics as np.nan*)."""
+    v = values[idx]
+    valid = ~np.isnan(v)
+    group = np.repeat(np.arange(len(starts)), lengths)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        count = np.add.reduceat(valid.astype(float), starts)
+        mean = np.add.reduceat(np.where(valid, v, 0.0), starts) / count
+        dev = np.where(valid, v - mean[group], 0.0)
+        std = np.sqrt(np.add.reduceat(dev * dev, starts) / count)
+
+    return {
+        "mean": mean,
+        "std": std,
+        "min": np.fmin.reduceat(v, starts),
+        "max": np.fmax.reduceat(v, starts),
+        "values": v,
+        "group": group,
+    }
+
+
+def build_rows_vectorized(df, events):
+    """
+    Same columns as build_row(), without scanning `df` once per event.
+
+    Window bounds come from searchsorted on the sorted timestamps (O(log n)
+    per event); statistics are computed for all windows at once with
+    ufunc.reduceat over the concatenated window rows, so the cost is
+    O(rows inside windows) instead of O(events x rows).
+    """
+    labelled = events["irrigation_seconds"].notna().to_numpy()
+    for t in events.loc[~labelled, "timestamp"]:
+        print(f"[SKIP] Event {t} has no irrigation_seconds label.")
+
+    ts = df["timestamp"].to_numpy(dtype="datetime64[ns]")
+    ev_ts = events["timestamp"].to_numpy(dtype="datetime64[ns]")
+    pre_lo = np.searchsorted(ts, ev_ts - np.timedelta64(PRE_MINUTES, "m"), side="left")
+    mid = np.searchsorted(ts, ev_ts, side="left")
+    post_hi = np.searchsorted(ts, ev_ts + np.timedelta64(POST_MINUTES, "m"), side="left")
+
+    n_pre = mid - pre_lo
+    n_post = post_hi - mid
+    enough = (n_pre >= MIN_PRE_SAMPLES) & (n_post >= MIN_POST_SAMPLES)
+    for i in np.flatnonzero(labelled & ~enough):
+        print(f"[SKIP] Event {events['timestamp'].iloc[i]} does not have enough samples in PRE/POST windows (pre={n_pre[i]}, post={n_post[i]}).")
+
+    keep = np.flatnonzero(labelled & enough)
+    if len(keep) == 0:
+        return pd.DataFrame()
+
+    pre_idx, pre_starts, pre_len = _gather(pre_lo[keep], mid[keep])
+    post_idx, post_starts, post_len = _gather(mid[keep], post_hi[keep])
+
+    cols = {c: df[c].to_numpy(dtype=float) for c in BASE_COLS}
+    out = {}
+
+    # --- Statistics from PRE-irrigation window ---
+    for c in BASE_COLS:
+        st = _window_stats(cols[c], pre_idx, pre_starts, pre_len)
+        for name in ("mean", "std", "min", "max"):
+            out[f"{c}_pre_{name}"] = st[name]
+
+    # --- Statistics from POST-irrigation window ---
+    post_soil_avg = None
+    for c in POST_COLS:
+        st = _window_stats(cols[c], post_idx, post_starts, post_len)
+        out[f"{c}_post_min"] = st["min"]
+        out[f"{c}_post_max"] = st["max"]
+        out[f"{c}_post_mean"] = st["mean"]
+        if c == "soil_avg":
+            post_soil_avg = st
+
+    # --- Delta features (system response to irrigation) ---
+    out["delta_soil_avg_min_vs_pre_mean"] = out["soil_avg_post_min"] - out["soil_avg_pre_mean"]
+
+    # time_to_min_soil_avg: first row reaching the window minimum (np.nanargmin)
+    v, group = post_soil_avg["values"], post_soil_avg["group"]
+    hits = np.flatnonzero(v == post_soil_avg["min"][group])
+    hit_groups, first = np.unique(group[hits], return_index=True)
+    argmin_row = np.full(len(keep), -1)
+    argmin_row[hit_groups] = post_idx[hits[first]]
+    t_min = ts[np.maximum(argmin_row, 0)]
+    minutes = (t_min - ev_ts[keep]) / np.timedelta64(1, "s") / 60.0
+    out["time_to_min_soil_avg_minutes"] = np.where(argmin_row >= 0, minutes, np.nan)
+
+    # Context at the irrigation event (last PRE sample)
+    last_pre = mid[keep] - 1
+    out["soil_avg_at_event"] = cols["soil_avg"][last_pre]
+    out["soil_diff_at_event"] = cols["soil_diff"][last_pre]
+    out["temp_at_event"] = cols["temperature"][last_pre]
+    out["humidity_at_event"] = cols["humidity"][last_pre]
+    out["light_at_event"] = cols["light"][last_pre]
+
+    # Regression target
+    out["irrigation_seconds"] = events["irrigation_seconds"].to_numpy(dtype=float)[keep]
+    out["event_timestamp"] = [str(t) for t in events["timestamp"].iloc[keep]]
+
+    # Column order identical to build_row()
+    order = list(build_row_columns())
+    return pd.DataFrame({c: out[c] for c in order})
+
+
+def build_row_columns():
+    for c in BASE_COLS:
+        for name in ("mean", "std", "min", "max"):
+            yield f"{c}_pre_{name}"
+    for c in POST_COLS:
+        yield f"{c}_post_min"
+        yield f"{c}_post_max"
+        yield f"{c}_post_mean"
+    yield "delta_soil_avg_min_vs_pre_mean"
+    yield "time_to_min_soil_avg_minutes"
+    yield from ("soil_avg_at_event", "soil_diff_at_event", "temp_at_event", "humidity_at_event", "light_at_event")
+    yield "irrigation_seconds"
+    yield "event_timestamp"
+
+
+def check_parity(df, events, fast):
+    """Compare the vectorized output against the per-event reference loop."""
+    print("[PARITY] Running reference loop implementation...")
+    ref = build_rows_loop(df, events)
+    pd.testing.assert_frame_equal(
+        fast.reset_index(drop=True),
+        ref.reset_index(drop=True),
+        check_exact=False,
+        rtol=1e-9,
+        atol=1e-9,
+    )
+    print(f"[PARITY] OK: {len(fast)} rows x {fast.shape[1]} columns match build_row()")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build data/training/train.csv from labelled irrigation events")
+    parser.add_argument("--loop", action="store_true", help="Use the per-event reference implementation")
+    parser.add_argument("--check-parity", action="store_true", help="Also run the reference loop and compare outputs")
+    parser.add_argument("--no-cache", action="store_true", help="Parse the CSVs instead of using the columnar cache")
+    parser.add_argument("--dataset", default=DATASET_PATH, help="Telemetry CSV (e.g. a tools/make_synth_telemetry.py zone)")
+    parser.add_argument("--events", default=EVENTS_PATH, help="Irrigation events CSV")
+    parser.add_argument("--out", default=OUT_PATH)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+
+    # Timestamps parsed while preserving timezone (UTC); typed columns come
+    # from the .npz cache when the CSVs are unchanged (scripts/columnar_cache.py)
+    use_cache = not args.no_cache
+    df = read_csv_cached(args.dataset, parse_dates=["timestamp"], use_cache=use_cache)
+    events = read_csv_cached(args.events, parse_dates=["timestamp"], use_cache=use_cache)
+    events["irrigation_seconds"] = pd.to_numeric(events.get("irrigation_seconds"), errors="coerce")
+
+    # Sort data chronologically
+    df = df.sort_values("timestamp").reset_index(drop=True)
+    events = events.sort_values("timestamp").reset_index(drop=True)
+
+    # Ensure required feature columns exist
+    required = set(BASE_COLS)
+    missing = required - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing required columns in dataset_base.csv: {missing}")
+
+    if args.loop:
+        out = build_rows_loop(df, events)
+    else:
+        out = build_rows_vectorized(df, events)
+        if args.check_parity:
+            check_parity(df, events, out)
+
+    if use_cache:
+        to_csv_cached(out, args.out)  # train.csv + its cache for the training scripts
+    else:
+        out.to_csv(args.out, index=False)
 
-    print(f"OK -> {OUT_PATH}")
+    print(f"OK -> {args.out}")
     print(f"Eventos usados: {len(out)} / {len(events)}")
     print("Preview:")
     print(out.head(3).to_string(index=False))
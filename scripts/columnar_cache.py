@@ -0,0 +1,147 @@
+"""
+Columnar binary cache for the pipeline CSVs (dataset_base.csv, train.csv, ...).
+
+read_csv_cached(path) returns the same DataFrame as pd.read_csv(path) (plus
+UTC parsing of `parse_dates` columns), but stores the typed columns in
+`<csv dir>/.columnar/<name>.npz` the first time. Later calls load the arrays
+directly when the CSV content hash still matches, skipping text parsing and
+pd.to_datetime. Any change to the CSV (or to the read options) rebuilds it.
+
+The .npz holds plain NumPy arrays only (no pickles): numeric columns as is,
+datetimes as datetime64 plus their timezone, text as unicode arrays with a
+missing-value mask.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+CACHE_VERSION = 1
+CACHE_DIRNAME = ".columnar"
+HASH_BLOCK = 1 << 20
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def cache_path(path: str) -> str:
+    directory, name = os.path.split(os.path.abspath(path))
+    return os.path.join(directory, CACHE_DIRNAME, os.path.splitext(name)[0] + ".npz")
+
+
+def _encode(df: pd.DataFrame):
+    arrays, columns = {}, []
+    blocks = {}  # numeric dtype -> column arrays (stored as one 2-D array)
+    for i, name in enumerate(df.columns):
+        s = df[name]
+        key = f"c{i}"
+        if isinstance(s.dtype, pd.DatetimeTZDtype) or pd.api.types.is_datetime64_dtype(s.dtype):
+            tz = str(s.dt.tz) if s.dt.tz is not None else None
+            values = s.dt.tz_convert(None) if tz else s
+            arrays[key] = values.to_numpy()
+            columns.append({"name": name, "kind": "datetime", "tz": tz})
+        elif pd.api.types.is_numeric_dtype(s.dtype) and not pd.api.types.is_extension_array_dtype(s.dtype):
+            block = blocks.setdefault(s.dtype.str, [])
+            columns.append({"name": name, "kind": "numeric", "block": "b" + s.dtype.str})
+            block.append(s.to_numpy())
+        else:
+            mask = s.isna().to_numpy()
+            arrays[key] = s.astype(object).where(~mask, "").astype(str).to_numpy(dtype=str)
+            arrays[key + "_na"] = mask
+            columns.append({"name": name, "kind": "text", "dtype": str(s.dtype)})
+    for dtype, block in blocks.items():
+        arrays["b" + dtype] = np.column_stack(block) if block else np.empty((len(df), 0), dtype=dtype)
+    return arrays, columns
+
+
+def _decode(data, columns) -> pd.DataFrame:
+    parts = []
+    blocks = {}
+    for col in columns:
+        if col["kind"] == "numeric":
+            blocks.setdefault(col["block"], []).append(col["name"])
+    for key, names in blocks.items():
+        parts.append(pd.DataFrame(data[key], columns=names, copy=False))
+
+    for i, col in enumerate(columns):
+        key = f"c{i}"
+        if col["kind"] == "datetime":
+            s = pd.Series(data[key], name=col["name"])
+            parts.append(s.dt.tz_localize(col["tz"]) if col["tz"] else s)
+        elif col["kind"] == "text":
+            s = pd.Series(data[key].astype(object), name=col["name"]).where(~data[key + "_na"], np.nan)
+            parts.append(s if col["dtype"] == "object" else s.astype(col["dtype"]))
+
+    df = parts[0].to_frame() if isinstance(parts[0], pd.Series) else parts[0]
+    if len(parts) > 1:
+        df = pd.concat(parts, axis=1)
+    return df[[col["name"] for col in columns]]
+
+
+def _load(cpath: str, digest: str, options: dict):
+    try:
+        with np.load(cpath, allow_pickle=False) as data:
+            meta = json.loads(str(data["__meta__"]))
+            if meta.get("version") != CACHE_VERSION or meta.get("source_sha256") != digest:
+                return None
+            if meta.get("options") != options:
+                return None
+            return _decode(data, meta["columns"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _store(cpath: str, df: pd.DataFrame, digest: str, options: dict):
+    arrays, columns = _encode(df)
+    meta = {"version": CACHE_VERSION, "source_sha256": digest, "options": options, "columns": columns}
+    os.makedirs(os.path.dirname(cpath), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(suffix=".npz", dir=os.path.dirname(cpath))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.savez(f, __meta__=np.array(json.dumps(meta)), **arrays)
+        os.replace(tmp, cpath)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def read_csv_cached(path: str, parse_dates=(), use_cache: bool = True) -> pd.DataFrame:
+    """
+    pd.read_csv(path) with the `parse_dates` columns converted by
+    pd.to_datetime(..., utc=True), served from the columnar cache when the
+    CSV is unchanged.
+    """
+    options = {"parse_dates": list(parse_dates)}
+    digest = file_hash(path) if use_cache else None
+    cpath = cache_path(path)
+
+    if use_cache:
+        df = _load(cpath, digest, options)
+        if df is not None:
+            return df
+
+    df = pd.read_csv(path)
+    for col in parse_dates:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], utc=True)
+
+    if use_cache:
+        try:
+            _store(cpath, df, digest, options)
+        except OSError as e:
+            print(f"[CACHE] Not written ({cpath}): {e}")
+    return df
+
+
+def to_csv_cached(df: pd.DataFrame, path: str, parse_dates=()):
+    """Write `path` and prime its cache (what read_csv_cached will return)."""
+    df.to_csv(path, index=False)
+    return read_csv_cached(path, parse_dates)
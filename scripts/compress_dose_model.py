@@ -0,0 +1,342 @@
+"""
+Latency-aware compression of the RandomForest dose model.
+
+build_model() in train_rf_dose_model.py fixes 300 trees of depth 6. This
+script searches smaller forests and measures what each one costs on the
+compiled (NumPy-only) runtime the Raspberry Pi uses:
+
+  - depth:   max_depth in DEPTHS
+  - prefix:  the first k trees (a forest with n_estimators=k and the same
+             random_state grows exactly these trees)
+  - greedy:  k trees picked by forward selection on their marginal LOOCV
+             contribution (each step adds the tree that lowers the snapped
+             LOOCV MAE most, continuous MAE breaking ties)
+
+LOOCV predictions are computed once per depth and per tree (folds x trees), so
+every subset is scored without refitting. For each candidate the matching
+trees of a forest fitted on all rows are compiled like
+export_compiled_dose_model.py does, and its .npz size and single-row predict
+latency (CompiledForest) are measured, together with how often it snaps to the
+same pump duration as the reference forest on the export parity rows.
+
+The chosen model is the smallest artefact whose snapped LOOCV MAE is within
+--tolerance seconds of the reference and whose snap agreement is at least
+--min-agreement. Among equally small candidates, one with a different
+structure (node count) wins on latency only when it is more than LATENCY_NOISE
+faster (same-structure forests, e.g. every depth >= the trees' actual depth,
+differ by timing noise alone); otherwise the reference wins, then fewer trees,
+then the shallower depth, so an equivalent forest never replaces the prod
+artefact. Greedy subsets are selected on the same LOOCV
+predictions they are scored on, so their MAE is optimistic on a small training
+set; the agreement check keeps them honest.
+
+Run from the repo root:
+  python scripts/compress_dose_model.py            # search + report
+  python scripts/compress_dose_model.py --write    # also emit the chosen model as the prod artefact
+"""
+import argparse
+import copy
+import csv
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import joblib
+import numpy as np
+from sklearn.model_selection import LeaveOneOut
+
+import export_compiled_dose_model as export
+from export_compiled_dose_model import CompiledForest
+from train_rf_dose_model import (
+    ALLOWED_SECONDS,
+    FEATURES_PATH,
+    LOOCV_CACHE_DIR,
+    MODEL_PATH,
+    TRAIN_PATH,
+    build_model,
+    load_training_data,
+    split_xy,
+)
+
+DEPTHS = (3, 4, 5, 6)
+TREE_COUNTS = (5, 10, 15, 20, 30, 50, 75, 100, 150, 200, 300)
+GREEDY_MAX = 100
+
+TOLERANCE = 0.0  # seconds of snapped LOOCV MAE over the reference forest
+MIN_AGREEMENT = 0.95  # share of parity rows snapped to the same duration as the reference
+
+LATENCY_ITERS = 2000
+LATENCY_REPEATS = 5
+LATENCY_NOISE = 0.25  # relative latency difference treated as measurement noise
+
+REPORT_PATH = "models/rf_dose_compression.json"
+TABLE_PATH = "models/rf_dose_compression.csv"
+CHART_PATH = "docs/figures/dose_model_compression.png"
+
+
+def snap(y) -> np.ndarray:
+    y = np.asarray(y, dtype=float)
+    return ALLOWED_SECONDS[np.argmin(np.abs(y[..., None] - ALLOWED_SECONDS), axis=-1)]
+
+
+def make_forest(depth: int, n_trees: int):
+    return build_model().set_params(max_depth=depth, n_estimators=n_trees)
+
+
+# --------------------------------------------------------------------------- #
+# LOOCV per-tree predictions
+# --------------------------------------------------------------------------- #
+def _cache_key(X, y, params) -> str:
+    params = dict(params)
+    params.pop("n_jobs", None)
+    h = hashlib.sha256()
+    h.update(b"per-tree-loocv")
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    h.update(json.dumps(list(X.columns)).encode())
+    h.update(np.ascontiguousarray(X.to_numpy(dtype=float)).tobytes())
+    h.update(np.ascontiguousarray(np.asarray(y, dtype=float)).tobytes())
+    return h.hexdigest()
+
+
+def loocv_tree_predictions(X, y, depth, n_trees, cache_dir=None) -> np.ndarray:
+    """(n_rows, n_trees): each tree's prediction for the row held out of its fold."""
+    model = make_forest(depth, n_trees)
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f"trees-{_cache_key(X, y, model.get_params())}.npy")
+        if os.path.exists(path):
+            return np.load(path)
+
+    P = np.empty((len(X), n_trees))
+    for train_idx, test_idx in LeaveOneOut().split(X):
+        fold = make_forest(depth, n_trees).fit(X.iloc[train_idx], y[train_idx])
+        row = X.iloc[test_idx].to_numpy(dtype=np.float32)
+        P[test_idx[0]] = [tree.predict(row)[0] for tree in fold.estimators_]
+
+    if path:
+        os.makedirs(cache_dir, exist_ok=True)
+        np.save(path, P)
+    return P
+
+
+def loocv_scores(P, y, trees):
+    pred = P[:, list(trees)].mean(axis=1)
+    return float(np.mean(np.abs(snap(pred) - y))), float(np.mean(np.abs(pred - y)))
+
+
+def greedy_order(P, y, k_max):
+    """Tree indices in forward-selection order (see module docstring)."""
+    n_trees = P.shape[1]
+    total = np.zeros(P.shape[0])
+    chosen, free = [], np.ones(n_trees, dtype=bool)
+    for k in range(1, min(k_max, n_trees) + 1):
+        cand = (total[:, None] + P) / k
+        mae_snap = np.mean(np.abs(snap(cand) - y[:, None]), axis=0)
+        mae_cont = np.mean(np.abs(cand - y[:, None]), axis=0)
+        mae_snap[~free] = np.inf
+        best = int(np.lexsort((np.arange(n_trees), mae_cont, mae_snap))[0])
+        chosen.append(best)
+        free[best] = False
+        total += P[:, best]
+    return chosen
+
+
+# --------------------------------------------------------------------------- #
+# Compiled cost
+# --------------------------------------------------------------------------- #
+def subset_forest(model, trees):
+    """Shallow copy of a fitted forest keeping only `trees` (indices into estimators_)."""
+    sub = copy.copy(model)
+    sub.estimators_ = [model.estimators_[i] for i in trees]
+    sub.n_estimators = len(sub.estimators_)
+    return sub
+
+
+def measure(model, feature_names, check_X, ref_snap):
+    """Compiled .npz size, single-row predict latency and snap agreement with the reference."""
+    arrays = export.flatten_forest(model, feature_names)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "forest.npz")
+        np.savez_compressed(path, **arrays)
+        size = os.path.getsize(path)
+        compiled = CompiledForest(path)
+
+    row = check_X[:1]
+    per_call = []
+    n = LATENCY_ITERS // LATENCY_REPEATS
+    for _ in range(LATENCY_REPEATS):
+        t0 = time.perf_counter()
+        for _ in range(n):
+            compiled.predict(row)
+        per_call.append((time.perf_counter() - t0) / n)
+
+    agreement = float(np.mean(snap(compiled.predict(check_X)) == ref_snap))
+    return size, min(per_call) * 1e6, agreement, int(len(compiled.value))
+
+
+# --------------------------------------------------------------------------- #
+def choose(feasible, reference):
+    """Smallest artefact; ties broken deterministically (see module docstring)."""
+    if not feasible:
+        return None
+    min_size = min(r["size_kb"] for r in feasible)
+    smallest = [r for r in feasible if r["size_kb"] == min_size]
+    # Best latency per structure, then every structure within the noise of the fastest
+    latency = {}
+    for r in smallest:
+        latency[r["nodes"]] = min(latency.get(r["nodes"], r["latency_us"]), r["latency_us"])
+    fastest = min(latency.values())
+    fast = [r for r in smallest if latency[r["nodes"]] <= fastest * (1.0 + LATENCY_NOISE)]
+    return min(fast, key=lambda r: (r is not reference, r["trees"], r["depth"], r["kind"] != "prefix"))
+
+
+def write_chart(results, chosen, reference, path):
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        print("(matplotlib not installed: chart skipped, see the CSV table)")
+        return None
+
+    fig, axes = plt.subplots(1, 2, figsize=(11, 4.5), sharey=True)
+    for ax, key, label in ((axes[0], "latency_us", "single-row predict (us)"), (axes[1], "size_kb", "compiled .npz (KB)")):
+        for kind, marker in (("prefix", "o"), ("greedy", "^")):
+            for depth in sorted({r["depth"] for r in results}):
+                pts = [r for r in results if r["kind"] == kind and r["depth"] == depth]
+                ax.scatter([r[key] for r in pts], [r["mae_snapped"] for r in pts], marker=marker, s=18,
+                           label=f"{kind} d={depth}")
+        ax.scatter([reference[key]], [reference["mae_snapped"]], marker="s", s=70, facecolors="none",
+                   edgecolors="k", label="reference")
+        if chosen is not None:
+            ax.scatter([chosen[key]], [chosen["mae_snapped"]], marker="*", s=160, c="r", label="chosen")
+        ax.set_xscale("log")
+        ax.set_xlabel(label)
+        ax.grid(alpha=0.3)
+    axes[0].set_ylabel("snapped LOOCV MAE (s)")
+    axes[1].legend(fontsize=7, ncol=2)
+    fig.suptitle("Dose forest compression")
+    fig.tight_layout()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fig.savefig(path, dpi=120)
+    plt.close(fig)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE,
+                        help="Allowed snapped LOOCV MAE above the reference forest (seconds)")
+    parser.add_argument("--min-agreement", type=float, default=MIN_AGREEMENT,
+                        help="Min share of parity rows snapped like the reference forest")
+    parser.add_argument("--depths", type=int, nargs="+", default=list(DEPTHS))
+    parser.add_argument("--no-cache", action="store_true", help=f"Ignore the LOOCV cache in {LOOCV_CACHE_DIR}")
+    parser.add_argument("--write", action="store_true", help="Emit the chosen model as the prod artefact")
+    args = parser.parse_args()
+
+    X, y = split_xy(load_training_data(TRAIN_PATH))
+    feature_names = list(X.columns)
+    ref_params = build_model().get_params()
+    ref_depth, ref_trees = int(ref_params["max_depth"]), int(ref_params["n_estimators"])
+    depths = sorted(set(args.depths) | {ref_depth})
+    n_trees = max(max(TREE_COUNTS), ref_trees)
+    cache_dir = None if args.no_cache else LOOCV_CACHE_DIR
+    check_X = export.check_rows(feature_names)
+
+    print(f"---- Dose forest compression ({len(X)} rows, {len(feature_names)} features) ----")
+    t0 = time.perf_counter()
+    loocv, final = {}, {}
+    for depth in depths:
+        loocv[depth] = loocv_tree_predictions(X, y, depth, n_trees, cache_dir)
+        final[depth] = make_forest(depth, n_trees).fit(X, y)
+    print(f"LOOCV per-tree predictions: {len(depths)} depths x {n_trees} trees ({time.perf_counter() - t0:.1f} s)")
+
+    ref_model = subset_forest(final[ref_depth], range(ref_trees))
+    ref_snap = snap(ref_model.predict(check_X))
+
+    candidates = [("prefix", ref_depth, list(range(ref_trees)))]
+    for depth in depths:
+        order = greedy_order(loocv[depth], y, GREEDY_MAX)
+        for k in TREE_COUNTS:
+            if k <= n_trees and (depth, k) != (ref_depth, ref_trees):
+                candidates.append(("prefix", depth, list(range(k))))
+            if k <= len(order):
+                candidates.append(("greedy", depth, order[:k]))
+
+    results = []
+    for kind, depth, trees in candidates:
+        mae_snap, mae_cont = loocv_scores(loocv[depth], y, trees)
+        size, latency, agreement, nodes = measure(subset_forest(final[depth], trees), feature_names, check_X, ref_snap)
+        results.append({
+            "kind": kind,
+            "depth": depth,
+            "trees": len(trees),
+            "mae_snapped": mae_snap,
+            "mae_continuous": mae_cont,
+            "agreement": agreement,
+            "size_kb": size / 1024,
+            "latency_us": latency,
+            "nodes": nodes,
+            "tree_indices": [int(i) for i in trees],
+        })
+    reference = results[0]
+
+    limit = reference["mae_snapped"] + args.tolerance + 1e-12
+    feasible = [r for r in results if r["mae_snapped"] <= limit and r["agreement"] >= args.min_agreement]
+    chosen = choose(feasible, reference)
+
+    print(f"\n{'kind':<8}{'depth':>6}{'trees':>7}{'MAE snap':>10}{'MAE cont':>10}{'agree':>8}"
+          f"{'KB':>9}{'us/row':>9}")
+    for r in sorted(results, key=lambda r: (r["size_kb"], r["latency_us"])):
+        mark = " <- chosen" if r is chosen else (" <- reference" if r is reference else "")
+        ok = "" if r in feasible else "  x"
+        print(f"{r['kind']:<8}{r['depth']:>6}{r['trees']:>7}{r['mae_snapped']:>10.3f}{r['mae_continuous']:>10.3f}"
+              f"{100 * r['agreement']:>7.1f}%{r['size_kb']:>9.1f}{r['latency_us']:>9.1f}{ok}{mark}")
+
+    os.makedirs(os.path.dirname(TABLE_PATH), exist_ok=True)
+    with open(TABLE_PATH, "w", newline="", encoding="utf-8") as f:
+        cols = [k for k in results[0] if k != "tree_indices"]
+        w = csv.DictWriter(f, fieldnames=cols, extrasaction="ignore")
+        w.writeheader()
+        w.writerows(results)
+    chart = write_chart(results, chosen, reference, CHART_PATH)
+
+    report = {
+        "rows": int(len(X)),
+        "tolerance": args.tolerance,
+        "min_agreement": args.min_agreement,
+        "reference": reference,
+        "chosen": chosen,
+        "candidates": results,
+    }
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved: {REPORT_PATH}, {TABLE_PATH}" + (f", {chart}" if chart else ""))
+
+    if chosen is None:
+        print(f"No candidate within {args.tolerance} s of the reference and {100 * args.min_agreement:.0f}% agreement")
+        return
+
+    print(
+        f"Chosen: {chosen['kind']} depth={chosen['depth']} trees={chosen['trees']} | "
+        f"{chosen['size_kb']:.1f} KB vs {reference['size_kb']:.1f} KB | "
+        f"{chosen['latency_us']:.1f} us vs {reference['latency_us']:.1f} us per row"
+    )
+    if not args.write:
+        print("(dry run: rerun with --write to emit it as the prod artefact)")
+        return
+
+    model = subset_forest(final[chosen["depth"]], chosen["tree_indices"])
+    joblib.dump(model, MODEL_PATH)
+    with open(FEATURES_PATH, "w", encoding="utf-8") as f:
+        json.dump({"features": feature_names}, f, indent=2)
+    print(f"Saved model: {MODEL_PATH}")
+    # Compile to .npz (models/ and the Pi's model/dose/) with the sklearn parity check.
+    export.main()
+
+
+if __name__ == "__main__":
+    main()
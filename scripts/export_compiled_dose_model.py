@@ -0,0 +1,140 @@
+import json
+import os
+import sys
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+
+# Flatten the production RandomForestRegressor into contiguous NumPy arrays so
+# the Raspberry Pi can evaluate it without importing scikit-learn.
+# The runtime evaluator lives in edge/raspberry_pi/core/dose_model.py (CompiledForest).
+
+SRC_MODEL = "models/rf_dose_regressor_prod.joblib"
+SRC_FEATS = "models/rf_dose_features_prod.json"
+TRAIN_PATH = "data/training/train.csv"
+
+DST_MODELS = [
+    "models/rf_dose_regressor_prod.npz",
+    "edge/raspberry_pi/model/dose/rf_dose_regressor_prod.npz",
+]
+
+# Random rows drawn around the training data for the parity check
+N_CHECK_ROWS = 2000
+RANDOM_STATE = 42
+
+sys.path.insert(0, os.path.join("edge", "raspberry_pi"))
+from core.dose_model import CompiledForest  # noqa: E402
+from columnar_cache import read_csv_cached  # noqa: E402
+
+TREE_LEAF = -1
+
+
+def flatten_forest(model, feature_names):
+    """Concatenate all trees into flat node arrays with absolute child indices."""
+    features, thresholds, lefts, rights, values, roots = [], [], [], [], [], []
+    offset = 0
+    max_depth = 0
+
+    for est in model.estimators_:
+        tree = est.tree_
+        n = tree.node_count
+        is_leaf = tree.children_left == TREE_LEAF
+        own = np.arange(offset, offset + n, dtype=np.int32)
+
+        # Leaves loop onto themselves so the runtime can walk a fixed depth.
+        feature = np.where(is_leaf, 0, tree.feature).astype(np.int32)
+        threshold = np.where(is_leaf, np.inf, tree.threshold).astype(np.float64)
+        left = np.where(is_leaf, own, tree.children_left + offset).astype(np.int32)
+        right = np.where(is_leaf, own, tree.children_right + offset).astype(np.int32)
+
+        features.append(feature)
+        thresholds.append(threshold)
+        lefts.append(left)
+        rights.append(right)
+        values.append(tree.value[:, 0, 0].astype(np.float64))
+        roots.append(offset)
+
+        offset += n
+        max_depth = max(max_depth, int(tree.max_depth))
+
+    return {
+        "feature": np.concatenate(features),
+        "threshold": np.concatenate(thresholds),
+        "left": np.concatenate(lefts),
+        "right": np.concatenate(rights),
+        "value": np.concatenate(values),
+        "roots": np.asarray(roots, dtype=np.int32),
+        "max_depth": np.int32(max_depth),
+        "n_features": np.int32(model.n_features_in_),
+        "feature_names": np.asarray(feature_names),
+    }
+
+
+def check_rows(feature_names):
+    """Real training rows plus random rows spanning (and exceeding) their range."""
+    df = read_csv_cached(TRAIN_PATH)
+    real = df[feature_names].to_numpy(dtype=float)
+
+    rng = np.random.default_rng(RANDOM_STATE)
+    lo = real.min(axis=0)
+    hi = real.max(axis=0)
+    span = np.maximum(hi - lo, 1.0)
+    synth = rng.uniform(lo - span, hi + span, size=(N_CHECK_ROWS, real.shape[1]))
+
+    return np.vstack([real, synth])
+
+
+def main():
+    model = joblib.load(SRC_MODEL)
+
+    with open(SRC_FEATS, "r", encoding="utf-8") as f:
+        feature_names = json.load(f)["features"]
+
+    if model.n_features_in_ != len(feature_names):
+        raise ValueError(
+            f"Model expects {model.n_features_in_} features, contract lists {len(feature_names)}"
+        )
+
+    arrays = flatten_forest(model, feature_names)
+
+    for dst in DST_MODELS:
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        np.savez_compressed(dst, **arrays)
+
+    # ---- Parity check against scikit-learn ----
+    compiled = CompiledForest(DST_MODELS[0])
+    X = check_rows(feature_names)
+
+    y_ref = model.predict(pd.DataFrame(X, columns=feature_names))
+    y_batch = compiled.predict(X)
+    y_single = np.array([compiled.predict(X[i : i + 1])[0] for i in range(len(X))])
+
+    err = max(np.max(np.abs(y_ref - y_batch)), np.max(np.abs(y_ref - y_single)))
+    if not (np.allclose(y_ref, y_batch, rtol=1e-12, atol=1e-9) and np.allclose(y_ref, y_single, rtol=1e-12, atol=1e-9)):
+        raise AssertionError(f"Compiled forest diverges from sklearn (max abs err={err:.3e})")
+
+    # ---- Single-row latency ----
+    row = X[:1]
+    n_iter = 2000
+    t0 = time.perf_counter()
+    for _ in range(n_iter):
+        model.predict(row)
+    sk_us = (time.perf_counter() - t0) / n_iter * 1e6
+
+    t0 = time.perf_counter()
+    for _ in range(n_iter):
+        compiled.predict(row)
+    np_us = (time.perf_counter() - t0) / n_iter * 1e6
+
+    print("OK: exported compiled dose model")
+    for dst in DST_MODELS:
+        print(" ->", dst, f"({os.path.getsize(dst) / 1024:.1f} KB)")
+    print(f"Trees: {compiled.n_estimators} | nodes: {len(compiled.value)} | max depth: {compiled.max_depth}")
+    print(f"Parity rows: {len(X)} | max abs error vs sklearn: {err:.3e}")
+    print(f"Single-row predict: sklearn {sk_us:.1f} us | compiled {np_us:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,6 +3,8 @@ import joblib
 import numpy as np
 import pandas as pd
 
+from columnar_cache import read_csv_cached
+
 TRAIN_PATH = "data/training/train.csv"
 MODEL_PATH = "models/rf_dose_regressor_prod.joblib"
 FEATURES_PATH = "models/rf_dose_features_prod.json"
@@ -22,7 +24,7 @@ def main():
         feature_names = json.load(f)["features"]
 
     # Load training set (just to get a real example vector)
-    df = pd.read_csv(TRAIN_PATH)
+    df = read_csv_cached(TRAIN_PATH)
 
     # Build X using the exact feature order expected by the model
     missing = [c for c in feature_names if c not in df.columns]
@@ -1,6 +1,11 @@
+import argparse
+import hashlib
 import os
 import json
 import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+
 import joblib
 import numpy as np
 import pandas as pd
@@ -9,6 +14,8 @@ from sklearn.ensemble import RandomForestRegressor
 from sklearn.model_selection import LeaveOneOut
 from sklearn.metrics import mean_absolute_error, mean_squared_error
 
+from columnar_cache import read_csv_cached
+
 # Train a production-ready model (decision-time only features).
 # True  -> use only PRE + at_event features (usable on the Raspberry Pi before watering)
 # False -> allow PRE + POST features (analysis mode, not usable for real-time decision)
@@ -31,6 +38,10 @@ FEATURES_PATH = (
 # ---- Config ----
 RANDOM_STATE = 42
 
+# Per-fold LOOCV predictions are cached here, keyed by a hash of the fold's
+# data + model hyperparameters, so reruns only refit folds that changed.
+LOOCV_CACHE_DIR = "models/.loocv_cache"
+
 
 # Since you only allow a fixed set of pump durations, we can evaluate
 # both continuous predictions and "snapped" predictions.
@@ -46,7 +57,7 @@ def snap_to_allowed_seconds(y_pred: float, allowed: np.ndarray) -> float:
 def load_training_data(path: str) -> pd.DataFrame:
     if not os.path.exists(path):
         raise FileNotFoundError(f"Training file not found: {path}")
-    df = pd.read_csv(path)
+    df = read_csv_cached(path)
     if df.empty:
         raise ValueError("train.csv is empty.")
     return df
@@ -91,7 +102,7 @@ def split_xy(df: pd.DataFrame):
     return X, y
 
 
-def build_model() -> RandomForestRegressor:
+def build_model(n_jobs: int = -1) -> RandomForestRegressor:
     # Small dataset: keep model simple-ish to reduce overfitting.
     return RandomForestRegressor(
         n_estimators=300,
@@ -99,28 +110,110 @@ def build_model() -> RandomForestRegressor:
         max_depth=6,
         min_samples_leaf=1,
         min_samples_split=2,
-        n_jobs=-1,
+        n_jobs=n_jobs,
     )
 
 
-def loocv_evaluate(X: pd.DataFrame, y: np.ndarray):
+def _fit_predict_fold(X_train, y_train, X_test, n_jobs):
+    """Fit one LOOCV fold and return the continuous prediction for the held-out row."""
+    model = build_model(n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    return float(model.predict(X_test)[0])
+
+
+def fold_cache_key(X_train: pd.DataFrame, y_train, X_test: pd.DataFrame) -> str:
+    """Hash of everything that determines a fold's prediction (n_jobs does not)."""
+    params = build_model().get_params()
+    params.pop("n_jobs", None)
+
+    h = hashlib.sha256()
+    h.update(json.dumps(params, sort_keys=True, default=str).encode())
+    h.update(json.dumps(list(X_train.columns)).encode())
+    h.update(np.ascontiguousarray(X_train.to_numpy(dtype=float)).tobytes())
+    h.update(np.ascontiguousarray(np.asarray(y_train, dtype=float)).tobytes())
+    h.update(np.ascontiguousarray(X_test.to_numpy(dtype=float)).tobytes())
+    return h.hexdigest()
+
+
+def _cache_path(cache_dir: str, key: str) -> str:
+    return os.path.join(cache_dir, f"{key}.json")
+
+
+def _cache_get(cache_dir, key):
+    if not cache_dir:
+        return None
+    try:
+        with open(_cache_path(cache_dir, key), "r", encoding="utf-8") as f:
+            return float(json.load(f)["pred"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def _cache_put(cache_dir, key, pred):
+    if not cache_dir:
+        return
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = _cache_path(cache_dir, key) + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"pred": pred}, f)
+    os.replace(tmp, _cache_path(cache_dir, key))
+
+
+def loocv_evaluate(
+    X: pd.DataFrame,
+    y: np.ndarray,
+    parallel: bool = False,
+    workers: int = None,
+    cache_dir: str = None,
+):
+    """
+    Leave-one-out evaluation.
+
+    parallel=False: folds run one after another, each forest using all cores
+    (n_jobs=-1). parallel=True: folds run in a process pool and each forest is
+    single-threaded, which suits many small folds better than tree-level
+    threads. With cache_dir set, fold predictions are reused when the fold's
+    data and hyperparameters are unchanged.
+    """
     loo = LeaveOneOut()
+    folds = list(loo.split(X))
+
+    preds = [None] * len(folds)
+    keys = [None] * len(folds)
+    todo = []
+
+    for i, (train_idx, test_idx) in enumerate(folds):
+        if cache_dir:
+            keys[i] = fold_cache_key(X.iloc[train_idx], y[train_idx], X.iloc[test_idx])
+            preds[i] = _cache_get(cache_dir, keys[i])
+        if preds[i] is None:
+            todo.append(i)
+
+    def fold_args(i, n_jobs):
+        train_idx, test_idx = folds[i]
+        return X.iloc[train_idx], y[train_idx], X.iloc[test_idx], n_jobs
+
+    if parallel and len(todo) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {i: pool.submit(_fit_predict_fold, *fold_args(i, 1)) for i in todo}
+            for i, fut in futures.items():
+                preds[i] = fut.result()
+    else:
+        for i in todo:
+            preds[i] = _fit_predict_fold(*fold_args(i, -1))
+
+    for i in todo:
+        if cache_dir:
+            _cache_put(cache_dir, keys[i], preds[i])
 
     y_true = []
     y_pred_cont = []
     y_pred_snap = []
 
-    for train_idx, test_idx in loo.split(X):
-        X_train, X_test = X.iloc[train_idx], X.iloc[test_idx]
-        y_train, y_test = y[train_idx], y[test_idx]
-
-        model = build_model()
-        model.fit(X_train, y_train)
-
-        pred = float(model.predict(X_test)[0])
+    for (train_idx, test_idx), pred in zip(folds, preds):
         pred_snap = snap_to_allowed_seconds(pred, ALLOWED_SECONDS)
 
-        y_true.append(float(y_test[0]))
+        y_true.append(float(y[test_idx][0]))
         y_pred_cont.append(pred)
         y_pred_snap.append(pred_snap)
 
@@ -143,9 +236,29 @@ def loocv_evaluate(X: pd.DataFrame, y: np.ndarray):
         "y_true": y_true.tolist(),
         "y_pred_continuous": y_pred_cont.tolist(),
         "y_pred_snapped": y_pred_snap.tolist(),
+        "folds_computed": len(todo),
+        "folds_cached": len(folds) - len(todo),
     }
 
 
+def timing_report(X: pd.DataFrame, y: np.ndarray, workers: int = None):
+    """Time the sequential loop against the fold-parallel mode (both uncached)."""
+    t0 = time.perf_counter()
+    seq = loocv_evaluate(X, y, parallel=False)
+    t_seq = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    par = loocv_evaluate(X, y, parallel=True, workers=workers)
+    t_par = time.perf_counter() - t0
+
+    same = np.allclose(seq["y_pred_continuous"], par["y_pred_continuous"])
+    print("\n---- LOOCV timing report ----")
+    print(f"Folds: {seq['n_samples']} | workers: {workers or os.cpu_count()}")
+    print(f"Sequential (tree-level n_jobs=-1): {t_seq:.2f} s")
+    print(f"Fold-parallel (process pool, n_jobs=1): {t_par:.2f} s ({t_seq / t_par:.1f}x)")
+    print(f"Predictions identical: {same}")
+
+
 def train_final_and_save(X: pd.DataFrame, y: np.ndarray):
     model = build_model()
     model.fit(X, y)
@@ -160,6 +273,13 @@ def train_final_and_save(X: pd.DataFrame, y: np.ndarray):
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Train the RandomForest dose regressor")
+    parser.add_argument("--parallel", action="store_true", help="Fold-parallel LOOCV (process pool)")
+    parser.add_argument("--workers", type=int, default=None, help="Process pool size (default: CPU count)")
+    parser.add_argument("--no-cache", action="store_true", help=f"Ignore the LOOCV cache in {LOOCV_CACHE_DIR}")
+    parser.add_argument("--timing-report", action="store_true", help="Compare sequential vs fold-parallel LOOCV")
+    args = parser.parse_args()
+
     df = load_training_data(TRAIN_PATH)
     X, y = split_xy(df)
 
@@ -171,8 +291,15 @@ def main():
         print(f"  - {c}")
 
     print("\n---- LOOCV evaluation (small dataset friendly) ----")
-    metrics = loocv_evaluate(X, y)
+    metrics = loocv_evaluate(
+        X,
+        y,
+        parallel=args.parallel,
+        workers=args.workers,
+        cache_dir=None if args.no_cache else LOOCV_CACHE_DIR,
+    )
     print(f"Samples: {metrics['n_samples']}")
+    print(f"Folds computed: {metrics['folds_computed']} | from cache: {metrics['folds_cached']}")
     print(f"MAE (continuous): {metrics['mae_continuous']:.3f} s")
     print(f"RMSE (continuous): {metrics['rmse_continuous']:.3f} s")
     print(
@@ -180,6 +307,9 @@ def main():
     )
     print(f"RMSE (snapped): {metrics['rmse_snapped']:.3f} s")
 
+    if args.timing_report:
+        timing_report(X, y, workers=args.workers)
+
     print("\n---- Train final model on all data & save artefacts ----")
     _ = train_final_and_save(X, y)
     print(f"Saved model: {MODEL_PATH}")
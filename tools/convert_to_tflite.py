@@ -1,11 +1,48 @@
 # tools/convert_to_tflite.py
+"""
+Convert the Keras ON/OFF model (models/baseline_dense.keras) to TFLite.
+
+  python tools/convert_to_tflite.py                 # dynamic-range (as deployed)
+  python tools/convert_to_tflite.py --mode int8     # full int8 + report
+
+--mode int8:
+  - the MinMaxScaler (models/minmax_scaler_keras.joblib) is folded into the
+    first Dense layer (W' = diag(scale) W, b' = min W + b), so the model takes
+    the raw features [soil1, soil2, soil_max, temp_c, humidity, light] and the
+    Pi no longer scales anything;
+  - weights and activations are int8, including the input/output tensors,
+    calibrated on a representative sample of dataset_base.csv /
+    dataset_synth.csv (balanced over the decision label);
+  - writes models/baseline_dense_int8.tflite, its sidecar .json (read by
+    core/edge_model.py: scaler folded, quantization) and a report comparing
+    float32 / dynamic-range / int8 accuracy, agreement, size and per-invoke
+    latency on the CPU interpreter (models/baseline_dense_int8_report.json).
+
+  The raw input is quantized per tensor, so one int8 step covers ~1/255 of the
+  widest feature range (soil/light ADC counts); narrow features such as
+  temperature get coarse steps. The report's agreement column shows whether
+  that matters for the decision; --no-fold keeps the scaler on the host
+  (all inputs in [0, 1]) for comparison.
+
+Deploy: copy the .tflite and its .json (same base name) to
+edge/raspberry_pi/model/onoff/, e.g. model.tflite + model.json.
+"""
+import argparse
+import csv
+import json
 import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
 os.environ["CUDA_VISIBLE_DEVICES"] = "-1"
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "2"
 os.environ["TF_ENABLE_ONEDNN_OPTS"] = "0"
 
+import numpy as np
 import tensorflow as tf
-from pathlib import Path
+import joblib
 import shutil
 
 # Deshabilitar GPU (Metal)
@@ -21,30 +58,256 @@ project = Path(__file__).resolve().parents[1]
 models_dir = project / "models"
 
 keras_model_path = models_dir / "baseline_dense.keras"
+scaler_path      = models_dir / "minmax_scaler_keras.joblib"
 saved_model_dir  = models_dir / "baseline_dense_saved"
 tflite_path      = models_dir / "baseline_dense.tflite"
+int8_path        = models_dir / "baseline_dense_int8.tflite"
+report_path      = models_dir / "baseline_dense_int8_report.json"
+
+DATASETS = [
+    project / "tools" / "dataset" / "processed" / "dataset_base.csv",
+    project / "firmware" / "data" / "baseline" / "dataset_synth.csv",
+]
+FEATURES = ["soil1", "soil2", "soil_max", "temp_c", "humidity", "light"]
+THRESHOLD = 0.5
+CALIB_ROWS = 1000
+BENCH_INVOKES = 2000
+SEED = 42
+
+sys.path.insert(0, str(project / "edge" / "raspberry_pi"))
+from core.edge_model import EdgeIrrigationModel  # noqa: E402
+
+
+# --------------------------------------------------------------------------- #
+# Data
+# --------------------------------------------------------------------------- #
+def load_rows(paths):
+    """Raw feature rows (FEATURES order) and decision labels from every CSV in paths."""
+    missing = [str(p) for p in paths if not p.exists()]
+    if missing:
+        raise FileNotFoundError(f"Calibration dataset(s) not found: {missing}")
+    rows, labels, used = [], [], []
+    for path in paths:
+        used.append(os.path.relpath(path, project))
+        with open(path, "r", encoding="utf-8") as f:
+            for r in csv.DictReader(f):
+                try:
+                    s1, s2 = float(r["soil1"]), float(r["soil2"])
+                    temp = float(r.get("temp_c") or r["temperature"])
+                    x = (s1, s2, max(s1, s2), temp, float(r["humidity"]), float(r["light"]))
+                    y = int(float(r["decision"])) if r.get("decision") not in (None, "") else -1
+                except (KeyError, ValueError):
+                    continue
+                rows.append(x)
+                labels.append(y)
+    if not rows:
+        raise FileNotFoundError(f"No dataset rows in {[str(p) for p in paths]}")
+    return np.asarray(rows, dtype=np.float32), np.asarray(labels, dtype=int), used
+
+
+def representative_rows(X, y, n, seed=SEED):
+    """Up to n rows, split evenly over the labels present (so both classes calibrate)."""
+    rng = np.random.default_rng(seed)
+    groups = [np.flatnonzero(y == label) for label in np.unique(y)]
+    per_group = max(1, n // len(groups))
+    picked = [rng.choice(g, size=min(per_group, len(g)), replace=False) for g in groups]
+    return X[np.sort(np.concatenate(picked))]
+
+
+# --------------------------------------------------------------------------- #
+# Models
+# --------------------------------------------------------------------------- #
+def fold_scaler(model, scaler):
+    """Keras model taking raw features: the MinMaxScaler merged into the first Dense layer."""
+    scale = np.asarray(scaler.scale_, dtype=np.float64)
+    offset = np.asarray(scaler.min_, dtype=np.float64)
+
+    folded = tf.keras.models.clone_model(model)
+    folded.set_weights(model.get_weights())
+    first = next(layer for layer in folded.layers if layer.get_weights())
+
+    if isinstance(first, tf.keras.layers.Dense) and not getattr(scaler, "clip", False):
+        W, b = first.get_weights()
+        first.set_weights([(scale[:, None] * W).astype(W.dtype), (offset @ W + b).astype(b.dtype)])
+        return folded
+
+    # Anything else: an explicit affine layer in front (still one fused op in TFLite).
+    inp = tf.keras.Input(shape=(len(scale),), name="raw_features")
+    x = tf.keras.layers.Dense(
+        len(scale),
+        kernel_initializer=tf.keras.initializers.Constant(np.diag(scale)),
+        bias_initializer=tf.keras.initializers.Constant(offset),
+        trainable=False,
+        name="minmax_scaler",
+    )(inp)
+    if getattr(scaler, "clip", False):
+        lo, hi = scaler.feature_range
+        x = tf.keras.layers.Lambda(lambda t: tf.clip_by_value(t, lo, hi), name="minmax_clip")(x)
+    return tf.keras.Model(inp, folded(x))
+
+
+def convert(model, mode, rep_rows=None):
+    """TFLite flatbuffer for `model`: float32, dynamic (weights int8) or int8 (everything)."""
+    with tempfile.TemporaryDirectory() as tmp:
+        model.export(tmp)  # Keras 3: SavedModel for the converter
+        converter = tf.lite.TFLiteConverter.from_saved_model(tmp)
+        if mode in ("dynamic", "int8"):
+            converter.optimizations = [tf.lite.Optimize.DEFAULT]
+        if mode == "int8":
+            converter.representative_dataset = lambda: ([row[None, :]] for row in rep_rows)
+            converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+            converter.inference_input_type = tf.int8
+            converter.inference_output_type = tf.int8
+        return converter.convert()
+
+
+# --------------------------------------------------------------------------- #
+# Report
+# --------------------------------------------------------------------------- #
+def invoke_latency(model, X, n=BENCH_INVOKES):
+    """Per-sample latency (us): bare invoke(), and predict() with host scaling/quantization."""
+    model._ensure_rows(1)
+    rows = X[np.arange(n) % len(X)]
+    invoke, predict = [], []
+    for row in rows:
+        t0 = time.perf_counter()
+        model.predict(row)
+        predict.append(time.perf_counter() - t0)
+    for _ in range(n):
+        t0 = time.perf_counter()
+        model.interpreter.invoke()
+        invoke.append(time.perf_counter() - t0)
+    q = lambda v, p: float(np.percentile(v, p) * 1e6)  # noqa: E731
+    return {
+        "invoke_p50_us": q(invoke, 50),
+        "invoke_p99_us": q(invoke, 99),
+        "predict_p50_us": q(predict, 50),
+        "predict_p99_us": q(predict, 99),
+    }
+
+
+def evaluate(name, path, scaler, X, y, reference=None):
+    model = EdgeIrrigationModel(model_path=str(path), scaler_path=scaler)
+    probs = np.asarray([model.predict(row)[0] for row in X], dtype=np.float32)
+    labels = (probs >= THRESHOLD).astype(int)
+    known = y >= 0
+    result = {
+        "model": name,
+        "path": str(path.relative_to(project)) if project in path.parents else "(not saved)",
+        "bytes": path.stat().st_size,
+        "accuracy": float(np.mean(labels[known] == y[known])) if known.any() else None,
+        **invoke_latency(model, X),
+    }
+    if reference is not None:
+        result["agreement"] = float(np.mean(labels == reference[0]))
+        result["max_abs_prob_diff"] = float(np.max(np.abs(probs - reference[1])))
+    return result, (labels, probs)
+
+
+def print_report(report):
+    print(f"\nRows: {report['rows']} ({', '.join(report['datasets'])}) | calibration: {report['calibration_rows']}")
+    print(f"{'model':<12}{'KB':>8}{'acc':>8}{'agree':>8}{'invoke p50':>12}{'p99':>8}{'predict p50':>13}{'p99':>8}")
+    for r in report["models"]:
+        agree = f"{100 * r['agreement']:7.2f}%" if "agreement" in r else f"{'-':>8}"
+        acc = f"{100 * r['accuracy']:7.2f}%" if r["accuracy"] is not None else f"{'-':>8}"
+        print(
+            f"{r['model']:<12}{r['bytes'] / 1024:>8.2f}{acc}{agree}"
+            f"{r['invoke_p50_us']:>12.1f}{r['invoke_p99_us']:>8.1f}{r['predict_p50_us']:>13.1f}{r['predict_p99_us']:>8.1f}"
+        )
+
+
+# --------------------------------------------------------------------------- #
+def export_dynamic():
+    print("Project root:", project)
+    print("Keras model:", keras_model_path)
+
+    # Limpiar carpeta SavedModel si existe
+    if saved_model_dir.exists():
+        shutil.rmtree(saved_model_dir)
+
+    # 1) Exportar a SavedModel (Keras 3)
+    model = tf.keras.models.load_model(keras_model_path)
+    model.export(saved_model_dir)   # <-- clave en Keras 3
+    print("SavedModel written to:", saved_model_dir)
+
+    # 2) Conversión a TFLite desde el SavedModel
+    converter = tf.lite.TFLiteConverter.from_saved_model(str(saved_model_dir))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    # Si diera guerra, prueba:
+    # converter.optimizations = []
+    # converter._experimental_lower_tensor_list_ops = False
+
+    tflite_model = converter.convert()
+    tflite_path.write_bytes(tflite_model)
+
+    print("TFLite saved:", tflite_path, f"({tflite_path.stat().st_size/1024:.2f} KB)")
+    print("Header bytes:", list(tflite_model[:12]))
+
+
+def export_int8(args):
+    model = tf.keras.models.load_model(keras_model_path)
+    scaler = joblib.load(scaler_path)
+
+    X, y, used = load_rows([Path(p) for p in args.dataset] if args.dataset else DATASETS)
+    rep = representative_rows(X, y, args.calib_rows)
+    print(f"Calibration: {len(rep)} of {len(X)} rows from {', '.join(used)}")
+
+    if args.no_fold:
+        graph, rep_in, host_scaler = model, scaler.transform(rep).astype(np.float32), str(scaler_path)
+    else:
+        graph, rep_in, host_scaler = fold_scaler(model, scaler), rep, None
+
+    int8_path.write_bytes(convert(graph, "int8", rep_in))
+    meta = {
+        "source": keras_model_path.name,
+        "features": FEATURES,
+        "quantization": "int8",
+        "scaler_folded": not args.no_fold,
+        "threshold": THRESHOLD,
+        "calibration": {"datasets": used, "rows": int(len(rep)), "seed": SEED},
+    }
+    int8_path.with_suffix(".json").write_text(json.dumps(meta, indent=2) + "\n", encoding="utf-8")
+    print("TFLite int8 saved:", int8_path, f"({int8_path.stat().st_size / 1024:.2f} KB)")
+
+    # Float32 reference (no optimizations) next to the deployed dynamic-range model.
+    with tempfile.TemporaryDirectory() as tmp:
+        float_path = Path(tmp) / "baseline_dense_float32.tflite"
+        float_path.write_bytes(convert(model, "float32"))
+        if not tflite_path.exists():
+            tflite_path.write_bytes(convert(model, "dynamic"))
+
+        results = []
+        ref, ref_out = evaluate("float32", float_path, str(scaler_path), X, y)
+        results.append(ref)
+        for name, path, sc in (("dynamic", tflite_path, str(scaler_path)), ("int8", int8_path, host_scaler)):
+            results.append(evaluate(name, path, sc, X, y, reference=ref_out)[0])
 
-print("Project root:", project)
-print("Keras model:", keras_model_path)
+    report = {
+        "datasets": used,
+        "rows": int(len(X)),
+        "calibration_rows": int(len(rep)),
+        "scaler_folded": not args.no_fold,
+        "threshold": THRESHOLD,
+        "models": results,
+    }
+    report_path.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print_report(report)
+    print("\nReport saved:", report_path)
 
-# Limpiar carpeta SavedModel si existe
-if saved_model_dir.exists():
-    shutil.rmtree(saved_model_dir)
 
-# 1) Exportar a SavedModel (Keras 3)
-model = tf.keras.models.load_model(keras_model_path)
-model.export(saved_model_dir)   # <-- clave en Keras 3
-print("SavedModel written to:", saved_model_dir)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("dynamic", "int8"), default="dynamic")
+    parser.add_argument("--dataset", action="append", help="Calibration/evaluation CSV (repeatable)")
+    parser.add_argument("--calib-rows", type=int, default=CALIB_ROWS)
+    parser.add_argument("--no-fold", action="store_true", help="Keep the MinMaxScaler on the host")
+    args = parser.parse_args()
 
-# 2) Conversión a TFLite desde el SavedModel
-converter = tf.lite.TFLiteConverter.from_saved_model(str(saved_model_dir))
-converter.optimizations = [tf.lite.Optimize.DEFAULT]
-# Si diera guerra, prueba:
-# converter.optimizations = []
-# converter._experimental_lower_tensor_list_ops = False
+    if args.mode == "int8":
+        export_int8(args)
+    else:
+        export_dynamic()
 
-tflite_model = converter.convert()
-tflite_path.write_bytes(tflite_model)
 
-print("TFLite saved:", tflite_path, f"({tflite_path.stat().st_size/1024:.2f} KB)")
-print("Header bytes:", list(tflite_model[:12]))
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,42 @@
 #!/usr/bin/env python3
+"""
+Build tools/dataset/processed/dataset_base.csv from the ThingSpeak exports in
+tools/dataset/raw/.
+
+Streaming + incremental:
+  - every raw CSV is read in chunks with explicit dtypes and cleaned on its
+    own (in a process pool when several files are new), then written as a
+    sorted, deduplicated part file;
+  - parts are k-way merged line by line into the output, so peak memory is
+    one raw file, not the whole history;
+  - a manifest next to the output records which raw files (name, size,
+    mtime) were merged and their entry_id / timestamp ranges. Later runs only
+    process files not seen before: parts newer than everything merged so far
+    are appended, anything overlapping is merged into the existing output.
+
+Duplicate timestamps keep the last row (later file, later row wins).
+
+  python tools/make_dataset.py            # incremental (full build the first time)
+  python tools/make_dataset.py --full     # rebuild from every raw file
+"""
+import argparse
 import glob
+import heapq
+import json
 import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
 
 RAW_DIR = os.path.join("tools", "dataset", "raw")
 OUT_DIR = os.path.join("tools", "dataset", "processed")
 OUT_FILE = os.path.join(OUT_DIR, "dataset_base.csv")
+MANIFEST_FILE = os.path.join(OUT_DIR, "dataset_base.manifest.json")
+MANIFEST_VERSION = 1
+
+CHUNK_ROWS = 50_000
 
 COLUMN_MAP = {
     "created_at": "timestamp",
@@ -19,22 +50,33 @@ COLUMN_MAP = {
 }
 
 KEEP_COLS = ["timestamp", "entry_id", "soil1", "soil2", "temperature", "humidity", "light", "decision"]
+OUT_COLS = KEEP_COLS + ["soil_avg", "soil_diff"]
 
-def load_raw_files():
-    files = sorted(glob.glob(os.path.join(RAW_DIR, "*.csv")))
-    if not files:
-        raise FileNotFoundError(f"No CSV files found in {RAW_DIR}")
-    dfs = []
-    for f in files:
-        df = pd.read_csv(f)
-        dfs.append(df)
-    return pd.concat(dfs, ignore_index=True)
+# Explicit read dtypes (raw column names). Files with non-numeric junk in a
+# field fall back to string reads + coercion, as the in-memory version did.
+RAW_DTYPES = {
+    "created_at": str,
+    "entry_id": "float64",
+    "field1": "float64",
+    "field2": "float64",
+    "field3": "float64",
+    "field4": "float64",
+    "field5": "float64",
+    "field6": "float64",
+}
+
+# ThingSpeak timestamps have 1 s resolution; a fixed text format also makes
+# the output sortable line by line (merge key = first column).
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S+00:00"
 
-def main():
-    os.makedirs(OUT_DIR, exist_ok=True)
 
-    df = load_raw_files()
+def read_raw_chunks(path, chunk_rows=CHUNK_ROWS, typed=True):
+    """Raw CSV in chunks: only the mapped columns, with explicit dtypes."""
+    dtype = RAW_DTYPES if typed else str
+    return pd.read_csv(path, usecols=lambda c: c in COLUMN_MAP, dtype=dtype, chunksize=chunk_rows)
 
+
+def clean_chunk(df):
     # Rename columns to stable names
     df = df.rename(columns=COLUMN_MAP)
 
@@ -48,8 +90,8 @@ def main():
     # Parse timestamp
     df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True, errors="coerce")
 
-    # Convert numeric columns
-    for c in ["soil1", "soil2", "temperature", "humidity", "light", "decision"]:
+    # Convert numeric columns (no-op for typed reads)
+    for c in ["entry_id", "soil1", "soil2", "temperature", "humidity", "light", "decision"]:
         df[c] = pd.to_numeric(df[c], errors="coerce")
 
     # Drop invalid rows
@@ -59,16 +101,195 @@ def main():
     df = df[(df["soil1"].between(0, 1023)) & (df["soil2"].between(0, 1023))]
     df = df[(df["humidity"].between(0, 100))]  # DHT humidity range
 
-    # Sort + deduplicate timestamps
-    df = df.sort_values("timestamp").drop_duplicates(subset=["timestamp"], keep="last")
+    # Integer fields stay integers in the output (LDR ADC reading, 0/1 flag)
+    for c in ["entry_id", "light", "decision"]:
+        df[c] = df[c].round().astype("Int64")
+    return df
+
+
+def clean_file(path, part_dir, chunk_rows=CHUNK_ROWS):
+    """
+    Clean one raw CSV into a sorted, deduplicated part file (output format).
+    Returns its manifest entry plus the part path.
+    """
+    try:
+        parts = [clean_chunk(c) for c in read_raw_chunks(path, chunk_rows)]
+    except ValueError:
+        parts = [clean_chunk(c) for c in read_raw_chunks(path, chunk_rows, typed=False)]
+
+    df = pd.concat(parts, ignore_index=True) if parts else clean_chunk(pd.DataFrame(columns=list(COLUMN_MAP)))
+    rows_valid = len(df)
+
+    # Sort + deduplicate timestamps (stable: the last row of a timestamp wins)
+    df = df.sort_values("timestamp", kind="stable").drop_duplicates(subset=["timestamp"], keep="last")
 
     # Feature engineering
     df["soil_avg"] = (df["soil1"] + df["soil2"]) / 2.0
     df["soil_diff"] = (df["soil1"] - df["soil2"]).abs()
 
-    # NOTE: Outlier handling will be added in next step (so we keep this version minimal + reproducible)
-    df.to_csv(OUT_FILE, index=False)
-    print(f"Saved: {OUT_FILE} | rows={len(df)}")
+    df["timestamp"] = df["timestamp"].dt.strftime(TIMESTAMP_FORMAT)
+
+    st = os.stat(path)
+    name = os.path.basename(path)
+    part = os.path.join(part_dir, name)
+    df[OUT_COLS].to_csv(part, index=False)
+    return {
+        "file": name,
+        "size": st.st_size,
+        "mtime_ns": st.st_mtime_ns,
+        "rows_valid": rows_valid,
+        "rows": len(df),
+        "entry_min": int(df["entry_id"].min()) if df["entry_id"].notna().any() else None,
+        "entry_max": int(df["entry_id"].max()) if df["entry_id"].notna().any() else None,
+        "ts_min": df["timestamp"].iloc[0] if len(df) else None,
+        "ts_max": df["timestamp"].iloc[-1] if len(df) else None,
+        "part": part,
+    }
+
+
+def _keyed_lines(path, rank):
+    with open(path, "r", encoding="utf-8") as f:
+        next(f, None)  # header
+        for line in f:
+            yield line.split(",", 1)[0], rank, line
+
+
+def merge_sorted(paths, out):
+    """
+    K-way merge of sorted CSVs (same header) into the open file `out`,
+    keeping the last of equal timestamps (later path wins). Returns
+    (rows written, first timestamp, last timestamp).
+    """
+    streams = [_keyed_lines(p, rank) for rank, p in enumerate(paths)]
+    rows = 0
+    first = prev_ts = prev_line = None
+    for ts, _, line in heapq.merge(*streams):
+        if ts != prev_ts and prev_line is not None:
+            out.write(prev_line)
+            rows += 1
+        if first is None:
+            first = ts
+        prev_ts, prev_line = ts, line
+    if prev_line is not None:
+        out.write(prev_line)
+        rows += 1
+    return rows, first, prev_ts
+
+
+def load_manifest():
+    """Manifest of the current output, or None when it must be rebuilt."""
+    try:
+        with open(MANIFEST_FILE, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != MANIFEST_VERSION:
+        return None
+    try:
+        if os.path.getsize(OUT_FILE) != manifest.get("output_bytes"):
+            print("Output changed since the last run: rebuilding")
+            return None
+    except OSError:
+        return None
+    return manifest
+
+
+def save_manifest(manifest):
+    manifest["output_bytes"] = os.path.getsize(OUT_FILE)
+    tmp = MANIFEST_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, MANIFEST_FILE)
+
+
+def process_files(paths, part_dir, workers, chunk_rows):
+    if workers > 1 and len(paths) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(paths))) as pool:
+            return list(pool.map(clean_file, paths, [part_dir] * len(paths), [chunk_rows] * len(paths)))
+    return [clean_file(p, part_dir, chunk_rows) for p in paths]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--full", action="store_true", help="Rebuild from every raw file (ignore the manifest)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+    files = sorted(glob.glob(os.path.join(RAW_DIR, "*.csv")))
+    if not files:
+        raise FileNotFoundError(f"No CSV files found in {RAW_DIR}")
+
+    manifest = None if args.full else load_manifest()
+    if manifest is None:
+        manifest = {"version": MANIFEST_VERSION, "files": {}, "rows": 0, "ts_min": None, "ts_max": None}
+    seen = manifest["files"]
+
+    new = []
+    for path in files:
+        entry = seen.get(os.path.basename(path))
+        st = os.stat(path)
+        if entry is None or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns:
+            new.append(path)
+    if not new:
+        print(f"Up to date: {OUT_FILE} | rows={manifest['rows']}")
+        return
+    if any(os.path.basename(p) in seen for p in new):
+        # A merged file changed in place: its old rows can't be told apart.
+        print("Raw file(s) modified since the last run: rebuilding")
+        manifest = {"version": MANIFEST_VERSION, "files": {}, "rows": 0, "ts_min": None, "ts_max": None}
+        seen = manifest["files"]
+        new = files
+
+    part_dir = tempfile.mkdtemp(prefix=".parts-", dir=OUT_DIR)
+    try:
+        metas = process_files(new, part_dir, args.workers, args.chunk_rows)
+
+        # Re-exports of data already merged (same entry_id/timestamp ranges
+        # and row count as a merged file) are recorded but not merged again.
+        ranges = {(m["entry_min"], m["entry_max"], m["ts_min"], m["ts_max"], m["rows"]) for m in seen.values()}
+        parts = []
+        for meta in metas:
+            key = (meta["entry_min"], meta["entry_max"], meta["ts_min"], meta["ts_max"], meta["rows"])
+            if meta["rows"] and key not in ranges:
+                parts.append(meta["part"])
+                ranges.add(key)
+            elif meta["rows"]:
+                print(f"Skipping {meta['file']}: same entry_id/timestamp range as a merged file")
+
+        have_output = bool(manifest["rows"]) and os.path.exists(OUT_FILE)
+        new_min = min((m["ts_min"] for m in metas if m["part"] in parts), default=None)
+
+        if not parts:
+            mode = "nothing new"
+        elif have_output and new_min > manifest["ts_max"]:
+            # Strictly newer data: append the merged parts to the output.
+            with open(OUT_FILE, "a", encoding="utf-8") as out:
+                rows, _, last = merge_sorted(parts, out)
+            manifest["rows"] += rows
+            manifest["ts_max"] = last
+            mode = "appended"
+        else:
+            sources = ([OUT_FILE] if have_output else []) + parts
+            tmp = os.path.join(part_dir, "dataset_base.csv")
+            with open(tmp, "w", encoding="utf-8") as out:
+                out.write(",".join(OUT_COLS) + "\n")
+                rows, first, last = merge_sorted(sources, out)
+            os.replace(tmp, OUT_FILE)
+            manifest.update(rows=rows, ts_min=first, ts_max=last)
+            mode = "merged" if have_output else "built"
+
+        for meta in metas:
+            meta.pop("part")
+            seen[meta["file"]] = meta
+        save_manifest(manifest)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+    print(f"Saved: {OUT_FILE} | rows={manifest['rows']} | {mode}, {len(new)} new raw file(s)")
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
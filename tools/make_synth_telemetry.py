@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+"""
+Synthetic, temporally realistic telemetry for load testing.
+
+tools/make_synth_dataset.py draws independent random rows; this generator
+simulates many virtual zones over time, vectorized with NumPy over
+(zones x time) blocks, and streams the result to disk chunk by chunk:
+
+  - soil drying: raw soil readings (HIGH = dry) relax exponentially towards a
+    bone-dry level, faster when it is warm and sunny;
+  - irrigation: once a zone crosses its dry threshold, someone waters it after
+    a random delay; the dose (8/14/18/24 s) grows with dryness and
+    temperature, and the soil drops by a zone-specific gain per second;
+  - the two probes lag the true moisture (infiltration), with different time
+    constants and a fixed offset, so soil_diff moves around irrigations;
+  - diurnal temperature / humidity / light with AR(1) weather and clouds;
+  - sensor noise and spikes, NaN reads, dropped samples and gateway outages.
+
+Irrigation is stateful but stays vectorized: between two events the drying
+curve is closed-form in the cumulative drying rate R(t), so the next
+threshold crossing is a searchsorted on R for all zones at once (one round
+per event, not per sample). First-order lags and AR(1) noise use lfilter
+(scipy ships with scikit-learn), with the filter state carried across chunks.
+
+Per zone, under --out-dir:
+  zone_000/dataset_base.csv          same columns as tools/dataset/processed/
+  zone_000/irrigation_events.csv     matching labels (unless --no-events)
+  zone_000/thingspeak_export.csv     raw export layout (--thingspeak), e.g. for
+                                     edge/raspberry_pi/tools/replay_benchmark.py --export
+
+  python tools/make_synth_telemetry.py --zones 100 --days 30     # ~2.4M rows
+  python tools/make_synth_telemetry.py --zones 1 --days 365 --thingspeak
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+
+OUT_DIR = os.path.join("data", "synth")
+
+DATASET_FILE = "dataset_base.csv"
+EVENTS_FILE = "irrigation_events.csv"
+THINGSPEAK_FILE = "thingspeak_export.csv"
+
+DATASET_COLS = ["timestamp", "entry_id", "soil1", "soil2", "temperature", "humidity", "light", "decision", "soil_avg", "soil_diff"]
+THINGSPEAK_COLS = ["created_at", "entry_id", "field1", "field2", "field3", "field4", "field5", "field6", "latitude", "longitude", "elevation", "status"]
+
+CHUNK_ROWS = 1_000_000
+ZONE_BATCH = 64
+
+# Doses the pump accepts (models snap to these) and the labels used in data/labels/
+ALLOWED_SECONDS = np.array([8.0, 14.0, 18.0, 24.0])
+DOSE_NOTES = {8: "low", 14: "medium", 18: "high", 24: "superhigh"}
+
+# ---- Zone physics (raw ADC units, HIGH = dry); drawn uniformly per zone ----
+SOIL_BONE_DRY = (620.0, 680.0)  # level the soil relaxes towards
+SOIL_WET_FLOOR = (320.0, 380.0)  # lowest level an irrigation can reach
+DRY_THRESHOLD = (490.0, 530.0)  # watering becomes due above this soil_avg
+DRYING_RATE = (2.0e-6, 5.0e-6)  # 1/s at 20 C in the dark
+IRRIGATION_GAIN = (4.0, 7.0)  # raw units of soil drop per pump second
+PROBE_OFFSET = (20.0, 90.0)  # soil2 - soil1
+PROBE_LAG_MIN = ((5.0, 15.0), (20.0, 45.0))  # infiltration time constant of each probe
+REACTION_HOURS = (0.5, 8.0)  # crossing -> watering
+
+TEMP_MEAN = (13.0, 19.0)
+TEMP_AMPLITUDE = (1.0, 4.0)
+HUMIDITY_MEAN = (62.0, 78.0)
+LIGHT_PEAK = (500.0, 950.0)
+LIGHT_FLOOR = (30.0, 70.0)
+
+WEATHER_PHI = 0.995  # AR(1) per sample, ~10 h memory at 3 min
+CLOUD_PHI = 0.98
+
+SENSOR_NOISE = 2.0
+SPIKE_RATE = 2e-4
+SPIKE_SIZE = 60.0
+
+
+def uniform(rng, bounds, n):
+    return rng.uniform(bounds[0], bounds[1], n)
+
+
+class ZoneBatch:
+    """Parameters and carried state of a batch of zones (state shape: (zones,))."""
+
+    def __init__(self, rng, first_zone, n, start_s, period):
+        self.ids = np.arange(first_zone, first_zone + n)
+        self.bone_dry = uniform(rng, SOIL_BONE_DRY, n)
+        self.wet_floor = uniform(rng, SOIL_WET_FLOOR, n)
+        self.threshold = uniform(rng, DRY_THRESHOLD, n)
+        self.rate = uniform(rng, DRYING_RATE, n)
+        self.gain = uniform(rng, IRRIGATION_GAIN, n)
+        self.offset = uniform(rng, PROBE_OFFSET, n)
+        self.lag_s = [uniform(rng, b, n) * 60.0 for b in PROBE_LAG_MIN]
+        self.temp_mean = uniform(rng, TEMP_MEAN, n)
+        self.temp_amp = uniform(rng, TEMP_AMPLITUDE, n)
+        self.hum_mean = uniform(rng, HUMIDITY_MEAN, n)
+        self.light_peak = uniform(rng, LIGHT_PEAK, n)
+        self.light_floor = uniform(rng, LIGHT_FLOOR, n)
+
+        # carried state
+        self.t = start_s + rng.uniform(0.0, period, n)  # next sample time (epoch s)
+        self.level = rng.uniform(self.wet_floor + 40.0, self.threshold)  # true soil_avg
+        self.probe = [self.level.copy(), self.level.copy()]
+        self.weather = np.zeros(n)
+        self.humid = np.zeros(n)
+        self.cloud = np.zeros(n)
+        self.due_in = np.full(n, -1)  # steps until a pending watering (-1: none)
+        self.outage_left = np.zeros(n, dtype=np.int64)
+        self.entry_id = np.zeros(n, dtype=np.int64)
+
+
+def ar1(noise, phi, prev):
+    """y[i] = phi*y[i-1] + noise[i] along axis 1, starting from `prev`."""
+    y, _ = lfilter([1.0], [1.0, -phi], noise, axis=1, zi=(phi * prev)[:, None])
+    return y
+
+
+def lag(x, alpha, prev):
+    """First-order lag y += alpha*(x - y), per-zone alpha (zones, 1)."""
+    out = np.empty_like(x)
+    for i in range(x.shape[0]):  # per-zone coefficients: one lfilter call per zone row
+        c = 1.0 - alpha[i]
+        out[i], _ = lfilter([alpha[i]], [1.0, -c], x[i], zi=[c * prev[i]])
+    return out
+
+
+def row_searchsorted(R, targets):
+    """First index per row with R[row, idx] >= targets[row] (R non-decreasing per row)."""
+    n_rows, n = R.shape
+    span = R[:, -1].max() + 1.0
+    base = np.arange(n_rows) * span
+    flat = (R + base[:, None]).ravel()
+    idx = np.searchsorted(flat, np.minimum(targets, span - 0.5) + base, side="left")
+    return idx - np.arange(n_rows) * n
+
+
+def simulate_chunk(z: ZoneBatch, steps, rng, args):
+    """Advance every zone by `steps` samples; returns per-sample arrays + events."""
+    n = len(z.ids)
+    period = args.period
+
+    # --- time (jittered sampling) ---
+    dt = np.clip(period + rng.normal(0.0, args.jitter, (n, steps)), 1.0, None)
+    t = z.t[:, None] + np.concatenate([np.zeros((n, 1)), np.cumsum(dt[:, :-1], axis=1)], axis=1)
+    z.t = t[:, -1] + dt[:, -1]
+    hour = (t % 86400.0) / 3600.0
+
+    # --- weather: diurnal cycle + AR(1) anomalies ---
+    scale = np.sqrt(1.0 - WEATHER_PHI**2)
+    w = ar1(rng.normal(0.0, 2.0 * scale, (n, steps)), WEATHER_PHI, z.weather)
+    z.weather = w[:, -1]
+    temp = z.temp_mean[:, None] + z.temp_amp[:, None] * np.sin(2 * np.pi * (hour - 9.0) / 24.0) + w
+    hn = ar1(rng.normal(0.0, 4.0 * scale, (n, steps)), WEATHER_PHI, z.humid)
+    z.humid = hn[:, -1]
+    humidity = np.clip(z.hum_mean[:, None] - 2.2 * (temp - z.temp_mean[:, None]) + hn, 15.0, 99.0)
+
+    cl = ar1(rng.normal(0.0, np.sqrt(1.0 - CLOUD_PHI**2), (n, steps)), CLOUD_PHI, z.cloud)
+    z.cloud = cl[:, -1]
+    sun = np.clip(np.sin(np.pi * (hour - 6.5) / 12.0), 0.0, None) ** 1.5
+    clear = 1.0 / (1.0 + np.exp(-2.0 * cl))
+    light = z.light_floor[:, None] + z.light_peak[:, None] * sun * (0.25 + 0.75 * clear)
+
+    # --- soil drying: cumulative rate R, level = dry - (dry - s_a) * exp(-(R - R_a)) ---
+    et = np.clip(1.0 + 0.06 * (temp - 20.0) + 0.6 * light / 1000.0, 0.2, None)
+    R = np.cumsum(z.rate[:, None] * et * dt, axis=1)
+    dry = z.bone_dry[:, None]
+
+    anchor_idx = np.full(n, -1)  # -1: chunk start (R_a = 0)
+    anchor_lvl = z.level.copy()
+    ev_zone, ev_idx, ev_sec, ev_post = [], [], [], []
+    due_mark = np.zeros((n, steps + 1), dtype=np.int8)
+    due_mark[z.due_in >= 0, 0] += 1  # watering pending from the previous chunk
+
+    active = np.ones(n, dtype=bool)
+    due = z.due_in.copy()
+    rows = np.arange(n)
+    while active.any():
+        # zones without a pending watering: next threshold crossing
+        seek = active & (due < 0)
+        if seek.any():
+            R_a = np.where(anchor_idx >= 0, R[rows, np.maximum(anchor_idx, 0)], 0.0)
+            gap = np.log(np.maximum(dry[:, 0] - anchor_lvl, 1e-9) / (dry[:, 0] - z.threshold))
+            cross = row_searchsorted(R, R_a + np.maximum(gap, 1e-12))
+            cross = np.maximum(cross, anchor_idx + 1)
+            hit = seek & (cross < steps)
+            delay = np.round(rng.uniform(*REACTION_HOURS, n) * 3600.0 / period).astype(np.int64)
+            due = np.where(hit, cross + delay, due)
+            due_mark[hit, np.minimum(cross[hit], steps)] += 1
+            active &= ~(seek & ~hit)  # no crossing left in this chunk
+
+        # waterings scheduled inside this chunk
+        fire = active & (due >= 0) & (due < steps)
+        later = active & (due >= steps)
+        z_fire = rows[fire]
+        if len(z_fire):
+            e = due[fire]
+            R_a = np.where(anchor_idx[fire] >= 0, R[z_fire, np.maximum(anchor_idx[fire], 0)], 0.0)
+            lvl = dry[z_fire, 0] - (dry[z_fire, 0] - anchor_lvl[fire]) * np.exp(-(R[z_fire, e] - R_a))
+            want = 8.0 + 0.15 * (lvl - 460.0) + 0.6 * (temp[z_fire, e] - 18.0) + rng.normal(0.0, 2.0, len(z_fire))
+            sec = ALLOWED_SECONDS[np.argmin(np.abs(want[:, None] - ALLOWED_SECONDS), axis=1)]
+            ev_zone.append(z_fire)
+            ev_idx.append(e)
+            ev_sec.append(sec)
+            due_mark[z_fire, e] -= 1
+            anchor_idx[fire] = e
+            anchor_lvl[fire] = np.maximum(z.wet_floor[fire], lvl - z.gain[fire] * sec)
+            ev_post.append(anchor_lvl[fire])
+            due[fire] = -1
+        active &= ~later
+    z.due_in = np.where(due >= 0, due - steps, -1)
+
+    # true moisture for every sample from the most recent anchor
+    ev_zone, ev_idx, ev_sec, ev_post = (
+        np.concatenate(a) if a else np.zeros(0, dtype=d)
+        for a, d in ((ev_zone, np.int64), (ev_idx, np.int64), (ev_sec, float), (ev_post, float))
+    )
+    mark = np.full((n, steps), -1, dtype=np.int64)
+    mark[ev_zone, ev_idx] = ev_idx
+    last = np.maximum.accumulate(mark, axis=1)
+    post = np.zeros((n, steps))
+    post[ev_zone, ev_idx] = ev_post
+    has = last >= 0
+    li = np.maximum(last, 0)
+    R_anchor = np.where(has, np.take_along_axis(R, li, axis=1), 0.0)
+    L_anchor = np.where(has, np.take_along_axis(post, li, axis=1), z.level[:, None])
+    true = dry - (dry - L_anchor) * np.exp(-(R - R_anchor))
+    z.level = true[:, -1].copy()
+
+    # "watering due" flag: between a crossing and its watering
+    decision = (np.cumsum(due_mark[:, :steps], axis=1) > 0).astype(np.int8)
+
+    # --- probes: infiltration lag, offset, noise and spikes ---
+    probes = []
+    for p, sign in ((0, -0.5), (1, 0.5)):
+        alpha = 1.0 - np.exp(-period / z.lag_s[p])
+        y = lag(true, alpha, z.probe[p])
+        z.probe[p] = y[:, -1].copy()
+        y = y + sign * z.offset[:, None] + rng.normal(0.0, SENSOR_NOISE, (n, steps))
+        spikes = rng.random((n, steps)) < SPIKE_RATE
+        y[spikes] += rng.normal(0.0, SPIKE_SIZE, spikes.sum())
+        probes.append(np.round(np.clip(y, 0.0, 1023.0)))
+
+    # --- missing data: dropped samples, outages, NaN reads ---
+    keep = rng.random((n, steps)) >= args.drop_rate
+    p_start = args.outages_per_day * period / 86400.0
+    starts = rng.random((n, steps)) < p_start
+    length = rng.geometric(period / (60.0 * args.outage_minutes), starts.sum()) if starts.any() else np.zeros(0, dtype=np.int64)
+    ozone, oidx = np.nonzero(starts)
+    omark = np.zeros((n, steps + 1), dtype=np.int64)
+    np.add.at(omark, (ozone, oidx), 1)
+    np.add.at(omark, (ozone, np.minimum(oidx + length, steps)), -1)
+    carry = np.minimum(z.outage_left, steps)
+    np.add.at(omark, (rows, np.zeros(n, dtype=np.int64)), (carry > 0).astype(np.int64))
+    np.add.at(omark, (rows, carry), -(carry > 0).astype(np.int64))
+    keep &= np.cumsum(omark[:, :steps], axis=1) == 0
+    tail = np.zeros(n, dtype=np.int64)
+    np.maximum.at(tail, ozone, oidx + length - steps)
+    z.outage_left = np.maximum(z.outage_left - steps, tail)
+
+    fields = {
+        "soil1": probes[0],
+        "soil2": probes[1],
+        "temperature": np.round(temp + rng.normal(0.0, 0.1, (n, steps)), 1),
+        "humidity": np.round(humidity + rng.normal(0.0, 0.3, (n, steps)), 1),
+        "light": np.round(np.clip(light + rng.normal(0.0, 5.0, (n, steps)), 0.0, 1023.0)),
+    }
+    for name, values in fields.items():
+        values[rng.random((n, steps)) < args.nan_rate] = np.nan
+
+    return t, fields, decision, keep, (ev_zone, ev_idx, ev_sec)
+
+
+def iso(seconds, sep):
+    """Epoch seconds -> 'YYYY-MM-DD<sep>HH:MM:SS+00:00' strings."""
+    s = np.datetime_as_string(seconds.astype("datetime64[s]"), unit="s")
+    return np.char.add(np.char.replace(s, "T", sep), "+00:00")
+
+
+class ZoneWriter:
+    """Append-mode CSV writers of one zone directory."""
+
+    def __init__(self, out_dir, zone, events, thingspeak):
+        self.dir = os.path.join(out_dir, f"zone_{zone:03d}")
+        os.makedirs(self.dir, exist_ok=True)
+        self.files = {"dataset": open(os.path.join(self.dir, DATASET_FILE), "w", newline="", encoding="utf-8")}
+        self.files["dataset"].write(",".join(DATASET_COLS) + "\n")
+        if events:
+            self.files["events"] = open(os.path.join(self.dir, EVENTS_FILE), "w", newline="", encoding="utf-8")
+            self.files["events"].write("timestamp,irrigation_seconds,note\n")
+        if thingspeak:
+            self.files["thingspeak"] = open(os.path.join(self.dir, THINGSPEAK_FILE), "w", newline="", encoding="utf-8")
+            self.files["thingspeak"].write(",".join(THINGSPEAK_COLS) + "\n")
+
+    def write(self, t, entry_id, fields, decision, ev_t, ev_sec):
+        soil_avg = (fields["soil1"] + fields["soil2"]) / 2.0
+        df = pd.DataFrame(
+            {
+                "timestamp": iso(t, " "),
+                "entry_id": entry_id,
+                **fields,
+                "decision": decision,
+                "soil_avg": soil_avg,
+                "soil_diff": np.abs(fields["soil1"] - fields["soil2"]),
+            },
+            columns=DATASET_COLS,
+        )
+        df.to_csv(self.files["dataset"], header=False, index=False, na_rep="")
+
+        if "thingspeak" in self.files:
+            ts = pd.DataFrame(
+                {
+                    "created_at": iso(t, "T"),
+                    "entry_id": entry_id,
+                    "field1": fields["soil1"],
+                    "field2": fields["soil2"],
+                    "field3": fields["temperature"],
+                    "field4": fields["humidity"],
+                    "field5": fields["light"],
+                    "field6": decision,
+                },
+                columns=THINGSPEAK_COLS,
+            )
+            ts.to_csv(self.files["thingspeak"], header=False, index=False, na_rep="")
+
+        if "events" in self.files and len(ev_t):
+            notes = [DOSE_NOTES[int(s)] for s in ev_sec]
+            ev = pd.DataFrame({"timestamp": iso(ev_t, " "), "irrigation_seconds": ev_sec.astype(int), "note": notes})
+            ev.to_csv(self.files["events"], header=False, index=False)
+
+    def close(self):
+        for f in self.files.values():
+            f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zones", type=int, default=8)
+    parser.add_argument("--days", type=float, default=30.0)
+    parser.add_argument("--period", type=float, default=180.0, help="Seconds between samples")
+    parser.add_argument("--jitter", type=float, default=3.0, help="Std of the sampling period (s)")
+    parser.add_argument("--start", default="2025-11-25", help="UTC start date/time")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out-dir", default=OUT_DIR)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="Rows simulated per block")
+    parser.add_argument("--zone-batch", type=int, default=ZONE_BATCH, help="Zones simulated (and files open) at once")
+    parser.add_argument("--drop-rate", type=float, default=0.002, help="Share of samples lost")
+    parser.add_argument("--outages-per-day", type=float, default=0.2, help="Gateway outages per zone and day")
+    parser.add_argument("--outage-minutes", type=float, default=90.0, help="Mean outage length")
+    parser.add_argument("--nan-rate", type=float, default=0.0005, help="Share of individual NaN reads")
+    parser.add_argument("--no-events", action="store_true", help="Skip irrigation_events.csv")
+    parser.add_argument("--thingspeak", action="store_true", help="Also write the raw ThingSpeak export layout")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    start_s = pd.Timestamp(args.start, tz="UTC").timestamp()
+    total_steps = int(args.days * 86400.0 / args.period)
+    batch = max(1, min(args.zone_batch, args.zones))
+    steps_per_chunk = max(1, args.chunk_rows // batch)
+
+    t0 = time.perf_counter()
+    rows = events = 0
+    for first in range(0, args.zones, batch):
+        z = ZoneBatch(rng, first, min(batch, args.zones - first), start_s, args.period)
+        writers = [ZoneWriter(args.out_dir, int(i), not args.no_events, args.thingspeak) for i in z.ids]
+        try:
+            done = 0
+            while done < total_steps:
+                steps = min(steps_per_chunk, total_steps - done)
+                t, fields, decision, keep, (ev_zone, ev_idx, ev_sec) = simulate_chunk(z, steps, rng, args)
+                for i, w in enumerate(writers):
+                    m = keep[i]
+                    n_kept = int(m.sum())
+                    entry_id = z.entry_id[i] + 1 + np.arange(n_kept)
+                    z.entry_id[i] += n_kept
+                    sel = ev_zone == i
+                    order = np.argsort(ev_idx[sel])
+                    w.write(
+                        t[i, m],
+                        entry_id,
+                        {k: v[i, m] for k, v in fields.items()},
+                        decision[i, m],
+                        t[i, ev_idx[sel][order]],
+                        ev_sec[sel][order],
+                    )
+                    rows += n_kept
+                events += len(ev_zone)
+                done += steps
+        finally:
+            for w in writers:
+                w.close()
+        print(f"[SYNTH] zones {first}-{first + len(z.ids) - 1}: {rows:,} rows so far")
+
+    elapsed = time.perf_counter() - t0
+    size = sum(
+        os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(args.out_dir) for f in files
+    )
+    print(
+        f"✔ {rows:,} rows, {events:,} irrigation events, {args.zones} zone(s) -> {args.out_dir} "
+        f"({size / 1e6:.1f} MB, {elapsed:.1f} s, {rows / max(elapsed, 1e-9):,.0f} rows/s)"
+    )
+
+
+if __name__ == "__main__":
+    main()